@@ -28,46 +28,50 @@ import sys
 import os
 import platform
 import time
-from packaging import version
+from typing import List
+
+# NOTE: the startup profiler (--profile-startup) goes before the other local
+#       libraries, so it can time their imports.
+from src.startup import StartupProfiler
+_startup: StartupProfiler = StartupProfiler(imports=__name__ == "__main__" and "--profile-startup" in sys.argv)
 
 # Local libraries
 import src.ui as ui
+from src.context import Context
+from src.utils import Profiler, start_logging, stop_logging
 
 # Qt
-from PyQt5 import QtWidgets
+from PyQt5 import QtCore, QtWidgets
 
 
-_version: version = version.parse("0.1.0")
+_version: str     = "0.1.0"
 _name: str        = "CPV"
 _temp: str        = ".CPV"
 
 
-def update(incoming_version:version)->bool:
+def update(incoming_version:str)->bool:
     """
     Returns True or False depending on this version of the software
     needing an update.
     """
-    return incoming_version > _version
+    # NOTE: only needed to compare versions, not imported at startup.
+    from packaging import version
+    return version.parse(incoming_version) > version.parse(_version)
 
-def prepare_for_start(user_folder:str, print_to_file:bool=True) -> None:
+def prepare_for_start(user_folder:str, print_to_file:bool=True, level:str="INFO") -> None:
     """
-    Prepares the software for launch namely by printing the inital report
-    plus setting up the system to write log to file or console.
+    Prepares the software for launch namely by setting up the system to write
+    log to file or console. Everything logged or printed goes through a queue
+    to a writer thread (see `start_logging`), the log file is rotated (size
+    and age) into compressed files instead of being deleted.
     """
-    logfile = os.path.join(user_folder, "log.txt")
-
-    # NOTE: removing log file if too big.
-    if os.path.exists(logfile):
-        statinfo = os.stat(logfile)
-        if statinfo.st_size > 1024*1024*10:
-            os.remove(logfile)
-
-    # NOTE: making sure the log is written to file if requested.
-    if print_to_file:
-        sys.stdout = open(logfile, "a")
-        sys.stderr = sys.stdout
+    try:
+        start_logging(user_folder, level=level, to_file=print_to_file)
+    except ValueError as error:
+        start_logging(user_folder, to_file=print_to_file)
+        print("prepare_for_start : using the INFO log level ->", error)
 
-def create_user_folder(print_to_file:bool=True)->str:
+def create_user_folder(print_to_file:bool=True, level:str="INFO")->str:
     """
     Creates an user folder if one does not yet exist. Returns the
     string with the path to this folder.
@@ -79,7 +83,7 @@ def create_user_folder(print_to_file:bool=True)->str:
         os.mkdir(user_folder)
     
     # NOTE: preparing the software to either write to console or log file.
-    prepare_for_start(user_folder, print_to_file)
+    prepare_for_start(user_folder, print_to_file, level)
 
     # NOTE: returning the generated user folder.
     return user_folder
@@ -99,20 +103,84 @@ def initial_report(user_folder: str) -> None:
     print("+"*len(intro))
     print("\n")
 
+def command_option(arguments:List[str], name:str, default:str="") -> str:
+    """
+    The value of an option on the command line (e.g. `--profile cprofile,sampling`
+    or `--log-level=WARNING`), `default` if not given.
+    """
+    for i, argument in enumerate(arguments):
+        if argument.startswith(name + "="):
+            return argument[len(name) + 1:]
+        if argument == name and i + 1 < len(arguments):
+            return arguments[i + 1]
+    return default
+
+def recover_sessions(context: Context) -> None:
+    """
+    Recovers the sessions left unfinished by a crash (from their journals) so
+    they become normal sessions in the run catalog.
+    """
+    for folder in context.recorder.recover():
+        print("+ RECOVERED SESSION: ", folder)
+
+def profile_startup(startup:StartupProfiler, context:Context, user_folder:str) -> None:
+    """
+    Marks the first pass of the event loop and the first sample received,
+    where the startup report is written (to the Profiles folder of the user
+    folder, on quit if no sample arrives).
+    """
+    def first_sample(port:str, value:float) -> None:
+        context.devices.Signal.ValuePressureChanged.disconnect(first_sample)
+        startup.phase("first sample")
+        startup.save(os.path.join(user_folder, "Profiles"))
+
+    QtCore.QTimer.singleShot(0, lambda: startup.phase("first event loop pass"))
+    context.devices.Signal.ValuePressureChanged.connect(first_sample)
+
 
 if __name__ == "__main__":
+    _startup.phase("imports")
+
     # NOTE: Unique QApplication instance
     app = QtWidgets.QApplication(sys.argv)
+    _startup.phase("application")
 
     # NOTE: Creating an User folder where all preferences, configurations,
     #       and logs are stored.
-    user_folder = create_user_folder(print_to_file=False)
+    user_folder = create_user_folder(print_to_file=False, level=command_option(sys.argv[1:], "--log-level", "INFO"))
 
     # NOTE: initial report.
     initial_report(user_folder)
+    _startup.phase("user folder and log")
+
+    # NOTE: context (settings, devices, sessions, ...) shared with the window.
+    context = Context(user_folder, name=_name, version=str(_version))
+
+    # NOTE: profilers turned on from the start (they can also be toggled in Preferences).
+    profilers = command_option(sys.argv[1:], "--profile")
+    try:
+        Profiler.parse(profilers)
+        context.settings.setProperty(context.settings.Profilers, profilers)
+    except ValueError as error:
+        print("main : ignoring --profile ->", error)
+    _startup.phase("context")
+
+    # NOTE: recovering sessions interrupted by a crash.
+    recover_sessions(context)
+    _startup.phase("session recovery")
 
     # NOTE: Main Window
-    window = ui.MainWindow(_name, str(_version), user_folder)
+    window = ui.MainWindow(_name, str(_version), user_folder, context=context)
+    _startup.phase("main window")
+
+    # NOTE: startup report (--profile-startup), time to the first sample included.
+    if _startup.isProfiling():
+        profile_startup(_startup, context, user_folder)
 
     # NOTE: Event Loop
-    app.exec_()
\ No newline at end of file
+    app.exec_()
+    if _startup.isProfiling():
+        _startup.save(os.path.join(user_folder, "Profiles"))
+
+    # NOTE: writing what is still queued to the log.
+    stop_logging()
\ No newline at end of file
@@ -25,11 +25,18 @@ SOFTWARE.
 
 # Python libraries
 import os
-from typing import Dict
+from collections import OrderedDict
+from typing import Dict, Tuple
 
 # Qt libraries
 from PyQt5 import QtCore, QtGui
 
+# Optional libraries
+try:
+    from PyQt5 import QtSvg
+except ImportError:
+    QtSvg = None
+
 # Local libraries
 from src.utils import SingletonMetaClass
 
@@ -38,22 +45,124 @@ class Assets(metaclass=SingletonMetaClass):
     """
     The `Assets` is a singleton class (all instances point to the same reference).
 
-    The `Assets` that store graphical assets for this software.
+    The `Assets` that store graphical assets for this software. Only the
+    file names are listed at construction, every icon is loaded the first
+    time it is asked for.
+
+    Icons asked for at a given size are made of pixmaps rendered once per
+    (name, size, device pixel ratio) and kept in a cache of at most
+    `max_bytes` (the least recently used ones are dropped first), so Qt
+    doesn't rasterize the SVG again every time they are shown. With a
+    `cache_folder` the rendered pixmaps are also saved as PNG files and
+    loaded from there by the next runs (while newer than their SVG).
     """
-    def __init__(self) -> None:
+    def __init__(self, cache_folder:str=None, max_bytes:int=8*1024*1024) -> None:
         
+        self._paths: Dict[str, str] = {}
         self._icons: Dict[str, QtGui.QIcon] = {}
 
-        self._loadIcons()
-
-    def get(self, name:str) -> QtGui.QIcon:
-        return self._icons[name]
-
-    def _loadIcons(self) -> None:
+        self._cache_folder: str = cache_folder
+        self._max_bytes: int = max_bytes
+        self._bytes: int = 0
+        # NOTE: (name, size, ratio) -> pixmap, least recently used first.
+        self._pixmaps: OrderedDict = OrderedDict()
+        self._sized_icons: Dict[Tuple[str, int, float], QtGui.QIcon] = {}
+
+        self._findIcons()
+
+    def get(self, name:str, size:int=None) -> QtGui.QIcon:
+        """
+        The icon `name`, scalable or (with `size`, in pixels) made of a
+        pixmap pre-rendered at that size for this screen.
+        """
+        if size is not None:
+            return self._sizedIcon(name, size)
+        icon = self._icons.get(name)
+        if icon is None:
+            icon = QtGui.QIcon(self._paths[name])
+            self._icons[name] = icon
+        return icon
+
+    def pixmap(self, name:str, size:int, ratio:float=None) -> QtGui.QPixmap:
+        """
+        The icon `name` rendered at `size` x `size` (logical) pixels for a
+        device pixel ratio of `ratio` (the one of the application by default).
+        """
+        ratio = ratio if ratio is not None else self._ratio()
+        key = (name, size, ratio)
+        pixmap = self._pixmaps.get(key)
+        if pixmap is not None:
+            self._pixmaps.move_to_end(key)
+            return pixmap
+        pixmap = self._loadPixmap(name, size, ratio)
+        self._pixmaps[key] = pixmap
+        self._bytes += self._pixmapBytes(pixmap)
+        while self._bytes > self._max_bytes and len(self._pixmaps) > 1:
+            old_key, old = self._pixmaps.popitem(last=False)
+            self._bytes -= self._pixmapBytes(old)
+            self._sized_icons.pop(old_key, None)
+        return pixmap
+
+    def cacheBytes(self) -> int:
+        return self._bytes
+
+    def _sizedIcon(self, name:str, size:int) -> QtGui.QIcon:
+        ratio = self._ratio()
+        key = (name, size, ratio)
+        icon = self._sized_icons.get(key)
+        if icon is None or key not in self._pixmaps:
+            icon = QtGui.QIcon(self.pixmap(name, size, ratio))
+            self._sized_icons[key] = icon
+        else:
+            self._pixmaps.move_to_end(key)
+        return icon
+
+    def _ratio(self) -> float:
+        application = QtGui.QGuiApplication.instance()
+        return float(application.devicePixelRatio()) if application is not None else 1.0
+
+    def _loadPixmap(self, name:str, size:int, ratio:float) -> QtGui.QPixmap:
+        path = self._paths[name]
+        pixels = max(1, int(round(size*ratio)))
+        cached = None
+        if self._cache_folder is not None:
+            cached = os.path.join(self._cache_folder, "%s_%d@%g.png"%(name, size, ratio))
+            if os.path.exists(cached) and os.path.getmtime(cached) >= os.path.getmtime(path):
+                image = QtGui.QImage(cached)
+                if not image.isNull() and image.width() == pixels:
+                    return self._toPixmap(image, ratio)
+        if QtSvg is not None:
+            image = QtGui.QImage(pixels, pixels, QtGui.QImage.Format_ARGB32_Premultiplied)
+            image.fill(QtCore.Qt.transparent)
+            painter = QtGui.QPainter(image)
+            QtSvg.QSvgRenderer(path).render(painter)
+            painter.end()
+        else:
+            image = QtGui.QIcon(path).pixmap(pixels, pixels).toImage()
+        if cached is not None:
+            try:
+                if not os.path.exists(self._cache_folder):
+                    os.makedirs(self._cache_folder)
+                image.save(cached, "PNG")
+            except OSError as error:
+                print("Assets::_loadPixmap : unable to cache", cached, "->", error)
+        return self._toPixmap(image, ratio)
+
+    @staticmethod
+    def _toPixmap(image:QtGui.QImage, ratio:float) -> QtGui.QPixmap:
+        pixmap = QtGui.QPixmap.fromImage(image)
+        pixmap.setDevicePixelRatio(ratio)
+        return pixmap
+
+    @staticmethod
+    def _pixmapBytes(pixmap:QtGui.QPixmap) -> int:
+        return pixmap.width()*pixmap.height()*4
+
+    def _findIcons(self) -> None:
         folder = os.path.join(os.path.dirname(__file__), "svg")
         files = self._get_all_filepaths(folder, "svg")
         for fid in files:
-            self._icons[self._get_file_name(fid)] = QtGui.QIcon(fid)
+            self._paths[self._get_file_name(fid)] = fid
 
     def _get_file_name(self, path):
         if not os.path.isdir(path):
@@ -0,0 +1,263 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import json
+import time
+import shutil
+import tempfile
+from typing import Callable, Dict, List, Tuple
+
+# Third party libraries
+import numpy as np
+
+# Qt libraries
+from PyQt5 import QtCore
+
+# Local libraries
+from src.device import Device, LineParser, Calibration
+from src.settings import Settings, Observer
+from src.unit import Unit
+
+
+# NOTE: bumped whenever the benchmarks change, older baselines are not compared.
+BENCHMARK_VERSION: int = 1
+
+
+def measure(run:Callable[[], int], repeat:int=5) -> Dict[str, float]:
+    """
+    Times `run` (which does some operations and returns how many) `repeat`
+    times: `throughput` is the operations per second of the fastest round and
+    `latency` the median time of one operation (seconds).
+    """
+    times, ops = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ops = run()
+        times.append(time.perf_counter() - start)
+    return {"throughput": ops/min(times), "latency": float(np.median(times))/ops}
+
+
+def bench_parser(size:int) -> Callable[[], int]:
+    random = np.random.default_rng(0)
+    values = [("%.2f"%value).encode() + b"\r" for value in random.uniform(0, 1000, size)]
+    # NOTE: one limit message every 100 values, like a busy rig.
+    lines = [b"IC_H\r" if i%100 == 99 else line for i, line in enumerate(values)]
+
+    def run() -> int:
+        parse = LineParser.parse
+        for line in lines:
+            parse(line)
+        return len(lines)
+    return run
+
+
+def bench_calibration(size:int) -> Callable[[], int]:
+    raw = list(np.random.default_rng(0).uniform(0, 1000, size))
+    calibration = Calibration([0.0, 250.0, 500.0, 750.0, 1000.0], [0.0, 240.0, 505.0, 760.0, 990.0])
+
+    def run() -> int:
+        for value in raw:
+            calibration(value)
+        return len(raw)
+    return run
+
+
+def bench_calibration_vectorized(size:int) -> Callable[[], int]:
+    raw = np.random.default_rng(0).uniform(0, 1000, size*10)
+    calibration = Calibration([0.0, 250.0, 500.0, 750.0, 1000.0], [0.0, 240.0, 505.0, 760.0, 990.0])
+
+    def run() -> int:
+        calibration.evaluate(raw)
+        return len(raw)
+    return run
+
+
+def bench_unit(size:int, settings:Settings) -> Callable[[], int]:
+    unit = Unit.create(settings)
+    values = list(np.random.default_rng(0).uniform(0, 1000, size))
+
+    def run() -> int:
+        for value in values:
+            unit.get(value, Unit.UnitPressure)
+            unit.getAsString(value, Unit.UnitPressure)
+        return len(values)
+    return run
+
+
+def bench_observer(size:int, listeners:int=5) -> Callable[[], int]:
+    observer = Observer.create()
+    received = [0]
+
+    def slot(value:float) -> None:
+        received[0] += 1
+
+    for _ in range(listeners):
+        observer.Signal.ValuePressureChanged.connect(slot)
+
+    def run() -> int:
+        for i in range(size):
+            observer.setValue(float(i), Observer.UnitPressure)
+        return size
+    return run
+
+
+def bench_curves(settings:Settings) -> Callable[[], int]:
+    def run() -> int:
+        names = settings.calibrationCurves()
+        for name in names:
+            settings.loadCurve(name)
+        return len(names)
+    return run
+
+
+def bench_device(size:int, batch:int=100) -> Tuple[Callable[[], int], List[float]]:
+    """
+    Samples through the whole device path (serial port, parser, calibration,
+    filters, volume, buffer, callbacks) on the `loop://` transport, which
+    echoes what is written, so the values are sent as commands.
+    """
+    device = Device("loop://", Calibration([0.0, 500.0, 1000.0, 1500.0], [0.0, 495.0, 1010.0, 1490.0]), buffer_size=size)
+    device.open()
+    block = "".join("%.2f\r\n"%value for value in np.random.default_rng(0).uniform(0, 1000, batch))
+    delays = []
+
+    def run() -> int:
+        device.buffer.clear()
+        total = 0
+        while total < size:
+            start = time.perf_counter()
+            device.write(block)
+            while device.buffer.total() < total + batch:
+                device.poll()
+            delays.append(time.perf_counter() - start)
+            total += batch
+        return total
+    return run, delays
+
+
+def run_benchmarks(size:int=10000, curves:int=200, repeat:int=5, names:List[str]=None) -> Dict[str, Dict[str, float]]:
+    """
+    Runs the benchmarks (those in `names`, all by default) on fixed synthetic
+    inputs of `size` items (`curves` calibration files) and returns their
+    `throughput` (operations/s) and `latency` (s) by name.
+    """
+    if QtCore.QCoreApplication.instance() is None:
+        QtCore.QCoreApplication([])
+    folder = tempfile.mkdtemp(prefix="CPVbench")
+    try:
+        settings = Settings.create(folder, "CPV bench", "0")
+        x = list(np.linspace(0, 1000, 20))
+        for i in range(curves):
+            settings.saveCurve("curve" + str(i), (x, [value*(1.0 + i/1000.0) for value in x]))
+        device, delays = bench_device(size)
+        benchmarks = {
+            "parser": bench_parser(size),
+            "calibration": bench_calibration(size),
+            "calibration_vectorized": bench_calibration_vectorized(size),
+            "unit": bench_unit(size, settings),
+            "observer": bench_observer(size),
+            "curves": bench_curves(settings),
+            "device": device,
+        }
+        results = {}
+        for name, run in benchmarks.items():
+            if names is None or name in names:
+                results[name] = measure(run, repeat)
+        # NOTE: end to end, the latency is the time from writing a batch to its last sample published.
+        if "device" in results:
+            results["device"]["latency"] = float(np.median(delays))
+        return results
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def compare(results:Dict[str, Dict[str, float]], baseline:Dict[str, Dict[str, float]], tolerance:float=0.2) -> List[str]:
+    """
+    The regressions of `results` against `baseline`: throughput lower or
+    latency higher than the baseline by more than `tolerance` (relative).
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        if result["throughput"] < reference["throughput"]*(1.0 - tolerance):
+            regressions.append("%s throughput %.4g/s < %.4g/s"%(name, result["throughput"], reference["throughput"]))
+        if result["latency"] > reference["latency"]*(1.0 + tolerance):
+            regressions.append("%s latency %.4g s > %.4g s"%(name, result["latency"], reference["latency"]))
+    return regressions
+
+
+def load_baseline(path:str) -> Dict[str, Dict[str, float]]:
+    """
+    The stored baseline results (empty if missing or of another version).
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as fid:
+        data = json.load(fid)
+    if data.get("version") != BENCHMARK_VERSION:
+        return {}
+    return data.get("results", {})
+
+
+def save_baseline(path:str, results:Dict[str, Dict[str, float]]) -> None:
+    with open(path, "w") as fid:
+        json.dump({"version": BENCHMARK_VERSION, "time": time.time(), "results": results}, fid, indent=2)
+
+
+def main(arguments:List[str]=None) -> int:
+    """
+    Benchmark tool: runs the benchmarks, compares them with the stored
+    baseline and returns 1 (the exit code) if any regressed.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmarks of the acquisition pipeline, compared with a stored baseline.")
+    parser.add_argument("--baseline", default=os.path.join(os.path.expanduser("~"), ".CPV", "benchmark.json"), help="baseline results file")
+    parser.add_argument("--save", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    parser.add_argument("--size", type=int, default=10000, help="items per benchmark round")
+    parser.add_argument("--curves", type=int, default=200, help="calibration files")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per benchmark")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (all by default)")
+    options = parser.parse_args(arguments)
+
+    results = run_benchmarks(options.size, options.curves, options.repeat, options.names or None)
+    baseline = load_baseline(options.baseline)
+    for name, result in results.items():
+        reference = baseline.get(name)
+        change = "" if reference is None else " (%+.1f%%)"%(100.0*(result["throughput"]/reference["throughput"] - 1.0))
+        print("%-24s %14.1f /s %12.3f us%s"%(name, result["throughput"], result["latency"]*1e6, change))
+    regressions = compare(results, baseline, options.tolerance)
+    for regression in regressions:
+        print("REGRESSION :", regression)
+    if options.save:
+        folder = os.path.dirname(os.path.abspath(options.baseline))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        save_baseline(options.baseline, {**baseline, **results})
+    return 1 if regressions else 0
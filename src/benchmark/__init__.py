@@ -0,0 +1 @@
+from .Benchmark import main, run_benchmarks, measure, compare, load_baseline, save_baseline, BENCHMARK_VERSION
@@ -0,0 +1,230 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+from threading import RLock
+from typing import Any, Callable
+
+# Local libraries
+from src.settings import Settings, Observer
+from src.language import Language
+from src.unit     import Unit
+from src.assets   import Assets
+from src.device   import DeviceManager, SettlingMonitor, AlarmEngine, PistonGeometry, MetricsServer, load_rules
+from src.control  import HostController, ProfileRunner, HoldTest, parse_gains
+from src.session  import SessionRecorder, RunCatalog, CATALOG_FILENAME
+from src.utils    import Counters, Profiler, LagWatchdog
+
+
+class Context:
+    """
+    The `Context` owns one set of the application objects (`Settings`,
+    `Language`, `Unit`, `Observer`, `Assets`, the `DeviceManager`, its
+    `SessionRecorder`, `SettlingMonitor`, `AlarmEngine`, `HostController`,
+    `ProfileRunner` and `HoldTest`, the `RunCatalog`, the `Profiler`, the
+    interface `Counters`, the `MetricsServer` and the `LagWatchdog`).
+
+    Each object is built on first access (thread safe). A scoped context
+    (default) builds its own instances, so several configurations can live in
+    the same process (one per device, one per test, ...). A non scoped context
+    uses the global singletons instead.
+    """
+    def __init__(self, user_folder:str, name:str=None, version:str=None, scoped:bool=True) -> None:
+        self._user_folder: str = user_folder
+        self._name: str = name
+        self._version: str = version
+        self._scoped: bool = scoped
+
+        self._lock: RLock = RLock()
+        self._objects: dict = {}
+
+    def userFolder(self) -> str:
+        return self._user_folder
+
+    def isScoped(self) -> bool:
+        return self._scoped
+
+    @property
+    def settings(self) -> Settings:
+        return self._get("settings", lambda: self._build(Settings, user_folder=self._user_folder, name=self._name, version=self._version))
+
+    @property
+    def language(self) -> Language:
+        return self._get("language", lambda: self._build(Language, settings=self.settings))
+
+    @property
+    def unit(self) -> Unit:
+        return self._get("unit", lambda: self._build(Unit, settings=self.settings))
+
+    @property
+    def observer(self) -> Observer:
+        return self._get("observer", lambda: self._build(Observer))
+
+    @property
+    def assets(self) -> Assets:
+        return self._get("assets", lambda: self._build(Assets, cache_folder=os.path.join(self._user_folder, "Cache", "icons")))
+
+    @property
+    def devices(self) -> DeviceManager:
+        return self._get("devices", self._buildDevices)
+
+    @property
+    def settling(self) -> SettlingMonitor:
+        return self._get("settling", lambda: SettlingMonitor(self.devices, self.observer))
+
+    @property
+    def alarms(self) -> AlarmEngine:
+        return self._get("alarms", self._buildAlarms)
+
+    @property
+    def controller(self) -> HostController:
+        return self._get("controller", self._buildController)
+
+    @property
+    def profiles(self) -> ProfileRunner:
+        return self._get("profiles", ProfileRunner)
+
+    @property
+    def holdtest(self) -> HoldTest:
+        return self._get("holdtest", HoldTest)
+
+    @property
+    def catalog(self) -> RunCatalog:
+        return self._get("catalog", lambda: RunCatalog(os.path.join(self._user_folder, CATALOG_FILENAME)))
+
+    @property
+    def recorder(self) -> SessionRecorder:
+        return self._get("recorder", lambda: SessionRecorder(self.devices, self.settings.sessionsFolder(), catalog=self.catalog, metadata=self._sessionMetadata))
+
+    @property
+    def profiler(self) -> Profiler:
+        return self._get("profiler", self._buildProfiler)
+
+    @property
+    def counters(self) -> Counters:
+        return self._get("counters", lambda: self._build(Counters))
+
+    @property
+    def metrics(self) -> MetricsServer:
+        return self._get("metrics", self._buildMetrics)
+
+    @property
+    def watchdog(self) -> LagWatchdog:
+        return self._get("watchdog", self._buildWatchdog)
+
+    def _buildDevices(self) -> DeviceManager:
+        devices = DeviceManager()
+        self._setFilter(devices, self.settings.getProperty(self.settings.Filter))
+        self.settings.Signal.FilterChanged.connect(lambda spec: self._setFilter(devices, spec))
+        self._setGeometry(devices, self.settings.getProperty(self.settings.PistonGeometry))
+        self.settings.Signal.PistonGeometryChanged.connect(lambda spec: self._setGeometry(devices, spec))
+        return devices
+
+    def _setFilter(self, devices:DeviceManager, spec:str) -> None:
+        try:
+            devices.setFilter(spec)
+        except ValueError as error:
+            print("Context::_setFilter : ignoring filter setting ->", error)
+
+    def _setGeometry(self, devices:DeviceManager, spec:str) -> None:
+        try:
+            devices.setGeometry(PistonGeometry.fromSpec(spec))
+        except ValueError as error:
+            print("Context::_setGeometry : ignoring piston geometry ->", error)
+
+    def _buildAlarms(self) -> AlarmEngine:
+        alarms = AlarmEngine(self.devices, self.observer)
+        try:
+            alarms.setRules(load_rules(self.settings.alarmsFile()))
+        except (OSError, ValueError, TypeError) as error:
+            print("Context::_buildAlarms : using the default alarm rules ->", error)
+        return alarms
+
+    def _buildController(self) -> HostController:
+        settings = self.settings
+        controller = HostController(self.devices, rate=settings.getProperty(settings.ControllerRate), enabled=settings.getProperty(settings.HostControl))
+        self._setGains(controller, settings.getProperty(settings.ControllerGains))
+        settings.Signal.HostControlChanged.connect(controller.setEnabled)
+        settings.Signal.ControllerGainsChanged.connect(lambda spec: self._setGains(controller, spec))
+        settings.Signal.ControllerRateChanged.connect(controller.setRate)
+        return controller
+
+    def _setGains(self, controller:HostController, spec:str) -> None:
+        try:
+            controller.setGains(parse_gains(spec))
+        except ValueError as error:
+            print("Context::_setGains : ignoring controller gains ->", error)
+
+    def _buildProfiler(self) -> Profiler:
+        profiler = Profiler(os.path.join(self._user_folder, "Profiles"))
+        self._setProfilers(profiler, self.settings.getProperty(self.settings.Profilers))
+        self.settings.Signal.ProfilersChanged.connect(lambda spec: self._setProfilers(profiler, spec))
+        return profiler
+
+    def _setProfilers(self, profiler:Profiler, spec:str) -> None:
+        try:
+            profiler.setActive(Profiler.parse(spec))
+        except ValueError as error:
+            print("Context::_setProfilers : ignoring profilers ->", error)
+
+    def _buildMetrics(self) -> MetricsServer:
+        metrics = MetricsServer(self.devices, counters=self.counters, gauges={
+            "writer_queue_depth": ("Session chunks waiting to be written.", self.recorder.pending),
+            "event_loop_lag_seconds": ("Lateness of the last interface heartbeat.", self.watchdog.lag),
+        })
+        self._setMetricsPort(metrics, self.settings.getProperty(self.settings.MetricsPort))
+        self.settings.Signal.MetricsPortChanged.connect(lambda port: self._setMetricsPort(metrics, port))
+        return metrics
+
+    def _setMetricsPort(self, metrics:MetricsServer, port:int) -> None:
+        try:
+            metrics.start(port)
+        except OSError as error:
+            print("Context::_setMetricsPort : unable to serve the metrics on port", port, "->", error)
+
+    def _buildWatchdog(self) -> LagWatchdog:
+        watchdog = LagWatchdog(os.path.join(self._user_folder, "stalls.log"), counters=self.counters)
+        watchdog.start(self.settings.getProperty(self.settings.StallThreshold)/1000.0)
+        self.settings.Signal.StallThresholdChanged.connect(lambda threshold: watchdog.start(threshold/1000.0))
+        return watchdog
+
+    def _sessionMetadata(self) -> dict:
+        return {"operator": self.settings.getProperty(self.settings.Operator)}
+
+    def _get(self, key:str, factory:Callable[[], Any]) -> Any:
+        obj = self._objects.get(key)
+        if obj is None:
+            with self._lock:
+                obj = self._objects.get(key)
+                if obj is None:
+                    obj = factory()
+                    self._objects[key] = obj
+        return obj
+
+    def _build(self, cls:type, **kwargs) -> Any:
+        if self._scoped:
+            return cls.create(**kwargs)
+        return cls(**kwargs)
@@ -0,0 +1 @@
+from .Context import Context
\ No newline at end of file
@@ -0,0 +1,222 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+# Python libraries
+import sys
+from statistics import NormalDist
+from threading import Lock
+from typing import NamedTuple
+
+# Qt libraries
+from PyQt5 import QtCore
+
+# Local libraries
+from src.device import Device, Sample, SettlingDetector, RollingRegression
+
+
+def t_quantile(probability:float, dof:int) -> float:
+    """
+    Quantile of the Student t distribution (Cornish-Fisher expansion around
+    the normal one, good to about 1e-3 from 3 degrees of freedom on).
+    """
+    z = NormalDist().inv_cdf(probability)
+    v = float(dof)
+    g1 = (z**3 + z)/4.0
+    g2 = (5*z**5 + 16*z**3 + 3*z)/96.0
+    g3 = (3*z**7 + 19*z**5 + 17*z**3 - 15*z)/384.0
+    g4 = (79*z**9 + 776*z**7 + 1482*z**5 - 1920*z**3 - 945*z)/92160.0
+    return z + g1/v + g2/v**2 + g3/v**3 + g4/v**4
+
+
+class HoldTestResult(NamedTuple):
+    port: str
+    target: float
+    pressure: float
+    leak_rate: float
+    half_width: float
+    confidence: float
+    duration: float
+    samples: int
+    converged: bool
+
+
+class HoldTestSignal(QtCore.QObject):
+    # NOTE: one of the `HoldTest` phases
+    Phase: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    # NOTE: hold duration (s), leak rate and its confidence half width (units/s)
+    Progress: QtCore.pyqtSignal = QtCore.pyqtSignal(float, float, float)
+    # NOTE: a `HoldTestResult` (None if stopped before the hold started)
+    Finished: QtCore.pyqtSignal = QtCore.pyqtSignal(object)
+
+    def __init__(self):
+        QtCore.QObject.__init__(self)
+
+
+class HoldTest:
+    """
+    Automated leak (hold) test on one device.
+
+    The test sends the target and waits for the response to settle (see
+    `SettlingDetector`), then sends a 0 target so the firmware stops moving
+    the piston and, `delay` seconds later, starts fitting the pressure decay
+    (least squares line, updated in O(1) per sample). It ends as soon as the
+    `confidence` interval of the leak rate is within ±`precision` units/s
+    (after at least `min_duration` seconds), or after `max_duration` seconds
+    of hold (not converged). The interval assumes independent noise, so the
+    minimum duration also guards against a correlated start of the decay.
+
+    Everything runs in the device sample callback (I/O worker), the signals
+    are queued to the GUI thread.
+    """
+    Idle: str = "idle"
+    Settling: str = "settling"
+    Holding: str = "holding"
+    Driver: str = "hold test"
+
+    def __init__(self, precision:float=0.01, confidence:float=0.95, min_duration:float=10.0, max_duration:float=600.0, settle_timeout:float=300.0, delay:float=1.0, min_samples:int=10, **settling) -> None:
+        # NOTE: signal class (emitted from the I/O worker, queued to the GUI thread)
+        self.Signal: HoldTestSignal = HoldTestSignal()
+
+        self.precision: float = precision
+        self.confidence: float = confidence
+        self.min_duration: float = min_duration
+        self.max_duration: float = max_duration
+        self.settle_timeout: float = settle_timeout
+        self.delay: float = delay
+        self.min_samples: int = min_samples
+        self._settling: dict = settling
+
+        self._lock: Lock = Lock()
+        self._device: Device = None
+        self._phase: str = self.Idle
+        self._target: float = 0.0
+        self._start: float = None
+        self._pressure: float = None
+        self._last: float = None
+        self._detector: SettlingDetector = None
+        self._fit: RollingRegression = None
+        self._result: HoldTestResult = None
+
+    def isRunning(self) -> bool:
+        return self._phase != self.Idle
+
+    def phase(self) -> str:
+        return self._phase
+
+    def result(self) -> HoldTestResult:
+        return self._result
+
+    def start(self, device:Device, target:float) -> bool:
+        """
+        Starts a test on `device` at `target`. Returns False (nothing started)
+        if something else already drives the device (see `Device.claim`).
+        """
+        self.stop()
+        if not device.claim(self.Driver):
+            return False
+        with self._lock:
+            self._device = device
+            self._target = float(target)
+            self._start = None
+            self._result = None
+            self._detector = SettlingDetector(device.port, **self._settling)
+            self._fit = RollingRegression(sys.maxsize)
+            self._setPhase(self.Settling)
+            device.addSampleCallback(self._onSample)
+            device.sendTarget(self._target)
+        return True
+
+    def stop(self) -> None:
+        """
+        Aborts a running test (emits `Finished` with the fit so far).
+        """
+        with self._lock:
+            if self._phase != self.Idle:
+                self._finish(False)
+
+    def _setPhase(self, phase:str) -> None:
+        self._phase = phase
+        self.Signal.Phase.emit(phase)
+
+    def _halfWidth(self) -> float:
+        n = len(self._fit)
+        if n < 3:
+            return float("inf")
+        return t_quantile(0.5 + self.confidence/2.0, n - 2)*self._fit.slopeError()
+
+    def _finish(self, converged:bool) -> None:
+        self._device.removeSampleCallback(self._onSample)
+        self._device.release(self.Driver)
+        result = None
+        if self._phase == self.Holding and len(self._fit) > 0:
+            fit = self._fit
+            result = HoldTestResult(self._device.port, self._target, self._pressure, -fit.slope(), self._halfWidth(), self.confidence, self._last - fit.first(), len(fit), converged)
+        self._result = result
+        self._setPhase(self.Idle)
+        self.Signal.Finished.emit(result)
+
+    def _onSample(self, device:Device, sample:Sample) -> None:
+        with self._lock:
+            if self._phase == self.Settling:
+                self._settle(device, sample)
+            elif self._phase == self.Holding:
+                self._hold(sample)
+
+    def _settle(self, device:Device, sample:Sample) -> None:
+        if sample.setpoint != self._target:
+            # NOTE: samples read before the target was sent.
+            return
+        if self._start is None:
+            self._start = sample.time
+            self._detector.step(self._target, sample.time)
+        if self._detector.update(sample.time, sample.value, sample.setpoint) is not None:
+            self._start = None
+            self._setPhase(self.Holding)
+            device.sendTarget(0)
+        elif sample.time - self._start > self.settle_timeout:
+            print("HoldTest::_settle :", device.port, "did not settle in", self.settle_timeout, "s")
+            self._finish(False)
+
+    def _hold(self, sample:Sample) -> None:
+        if sample.setpoint != 0:
+            return
+        if self._start is None:
+            self._start = sample.time
+        if sample.time - self._start < self.delay:
+            # NOTE: the firmware may still finish the move of its current cycle.
+            return
+        fit = self._fit
+        if len(fit) == 0:
+            self._pressure = sample.value
+        fit.append(sample.time, sample.value)
+        self._last = sample.time
+        elapsed = sample.time - self._start - self.delay
+        half_width = self._halfWidth()
+        self.Signal.Progress.emit(elapsed, -fit.slope(), half_width)
+        if elapsed >= self.min_duration and len(fit) >= self.min_samples and half_width <= self.precision:
+            self._finish(True)
+        elif elapsed >= self.max_duration:
+            self._finish(False)
@@ -0,0 +1,141 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Python libraries
+from typing import Dict, List, Tuple
+
+# Local libraries
+from src.device import Device
+from .PID import PIDController
+
+
+def parse_gains(spec:str) -> List[float]:
+    """
+    Parses "kp, ki, kd[, feedforward]" (feed forward defaults to 1). Raises
+    `ValueError` if the text isn't 3 or 4 numbers.
+    """
+    gains = [float(item) for item in spec.replace(";", ",").split(",") if item.strip()]
+    if len(gains) == 3:
+        gains.append(1.0)
+    if len(gains) != 4:
+        raise ValueError("Expected kp, ki, kd[, feedforward]: " + spec)
+    return gains
+
+
+class HostController:
+    """
+    Optional host side closed loop control. When enabled, every device with a
+    setpoint gets its own `PIDController` fed by the sample batches (on the
+    I/O worker) and the controller output is sent as the firmware target at
+    most `rate` times per second (`Device.writeTarget`, so never faster than
+    the firmware cycle) and clamped to `limits`. The device setpoint (what
+    the operator asked for) is left untouched, only the command sent changes.
+    A device is claimed (`Device.claim`) while controlled and skipped while
+    something else (a profile, a hold test) drives it.
+
+    Gains are best found offline with `src.control.Tuning` (`CPVtune.py`).
+    """
+    # NOTE: a 0 target stops the firmware loop, the output never goes below 1.
+    Limits: Tuple[float, float] = (1.0, Device.TargetRange[1])
+    Driver: str = "host controller"
+
+    def __init__(self, devices, gains:List[float]=None, rate:float=2.0, enabled:bool=False, limits:Tuple[float, float]=None) -> None:
+        self._devices = devices
+        self._limits: Tuple[float, float] = limits if limits is not None else self.Limits
+        self._gains: List[float] = list(gains) if gains is not None else [-0.2, 0.0, 0.5, 1.0]
+        self._rate: float = rate
+        self._enabled: bool = enabled
+        self._controllers: Dict[str, PIDController] = {}
+        self._sent: Dict[str, float] = {}
+        for device in self._devices.devices():
+            self._attach(device.port)
+        self._devices.Signal.DeviceAdded.connect(self._attach)
+        self._devices.Signal.DeviceRemoved.connect(self._detach)
+
+    def isEnabled(self) -> bool:
+        return self._enabled
+
+    def setEnabled(self, flag:bool) -> None:
+        if flag != self._enabled:
+            self._enabled = bool(flag)
+            self._reset()
+            # NOTE: back to the built-in loop, the firmware must see the real setpoint again.
+            if not self._enabled:
+                for device in self._devices.devices():
+                    if device.driver() != self.Driver:
+                        continue
+                    device.release(self.Driver)
+                    if device.isOpen() and device.setpoint() != 0:
+                        device.writeTarget(device.setpoint())
+
+    def gains(self) -> List[float]:
+        return list(self._gains)
+
+    def setGains(self, gains:List[float]) -> None:
+        self._gains = list(gains)
+        self._reset()
+
+    def rate(self) -> float:
+        return self._rate
+
+    def setRate(self, rate:float) -> None:
+        if rate <= 0:
+            raise ValueError("Controller rate must be positive: " + str(rate))
+        self._rate = rate
+
+    def controller(self, port:str) -> PIDController:
+        return self._controllers.get(port)
+
+    def _reset(self) -> None:
+        # NOTE: fresh controllers are built on the next batch (the worker never sees a half updated one).
+        self._controllers = {}
+        self._sent = {}
+
+    def _attach(self, port:str) -> None:
+        device = self._devices.device(port)
+        if device is not None:
+            device.addBatchCallback(self._onBatch)
+
+    def _detach(self, port:str) -> None:
+        self._controllers.pop(port, None)
+        self._sent.pop(port, None)
+
+    def _onBatch(self, device:Device, count:int) -> None:
+        sample = device.last()
+        # NOTE: a zero target means "stopped" to the firmware, nothing to control.
+        if not self._enabled or sample is None or sample.setpoint == 0:
+            device.release(self.Driver)
+            return
+        if not device.claim(self.Driver):
+            return
+        if sample.time - self._sent.get(device.port, float("-inf")) < 1.0/self._rate:
+            return
+        controller = self._controllers.get(device.port)
+        if controller is None:
+            kp, ki, kd, feedforward = self._gains
+            controller = PIDController(kp, ki, kd, feedforward, limits=self._limits)
+            self._controllers[device.port] = controller
+        output = controller.update(sample.setpoint, sample.value, sample.time)
+        self._sent[device.port] = sample.time
+        device.writeTarget(round(output))
@@ -0,0 +1,267 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import json
+from typing import Dict, List, NamedTuple, Tuple
+
+# Third party libraries
+import numpy as np
+
+# Local libraries
+from src.device import PistonGeometry
+from src.session import Session, RunCatalog, CATALOG_FILENAME
+from src.session.Analysis import directions
+from .Plant import FirmwarePlant
+from .Tuning import score, tune
+
+
+# NOTE: directions of the piston, in the order of the statistics arrays.
+DIRECTIONS: Tuple[int, int] = (1, -1)
+# NOTE: step counts a derived speed table may use (the firmware ones included).
+SPEED_LEVELS: Tuple[int, ...] = (20000, 10000, 5000, 2000, 1000, 500, 200, 100, 50)
+
+
+class StepModel(NamedTuple):
+    """
+    First order plus dead time model of one pump direction: the pressure
+    settles at `gain` units per injected cm3 with a `tau` seconds lag,
+    `dead_time` seconds after the piston moves.
+    """
+    direction: int
+    gain: float
+    tau: float
+    dead_time: float
+    rmse: float
+    samples: int
+
+    def gainPerStep(self, geometry:PistonGeometry) -> float:
+        return self.gain*geometry.volumePerStep()
+
+
+def session_statistics(folder:str, max_delay:int=5, max_gap:float=5.0) -> Dict[str, np.ndarray]:
+    """
+    Least squares sums of one recorded session for the model
+
+        (p[k+1] - p[k])/dt = a·f[k+1-d] + e·r[k+1-d] + b·(p[k] + p[k+1])/2 + c
+
+    (p pressure, f and r the volume injected filling and emptying so far, so
+    each direction has its own gain) for every delay d = 0..`max_delay` and
+    both directions (the one of the last piston move). Intervals longer than
+    `max_gap` times the median one (pauses, reconnections) are left out. The
+    intercept is partialled out here, so the sums of several sessions (each
+    with its own pressure offset) add up to one fixed effects fit.
+    """
+    session = Session(folder)
+    chunks = sorted(session.manifest["chunks"], key=lambda chunk: chunk.get("row", 0))
+    shape = (max_delay + 1, len(DIRECTIONS))
+    result = {"xx": np.zeros(shape + (3, 3)), "xy": np.zeros(shape + (3,)), "yy": np.zeros(shape), "n": np.zeros(shape), "dt": 0.0}
+    if "volume" not in session.columns() or len(chunks) == 0:
+        return result
+    time, pressure, volume = (np.concatenate([session.chunk(chunk["index"], column) for chunk in chunks]) for column in ("time", "value", "volume"))
+    if len(time) < max_delay + 3:
+        return result
+
+    dt = np.diff(time)
+    median = float(np.median(dt))
+    result["dt"] = median
+    target = np.diff(pressure)
+    np.divide(target, dt, out=target, where=dt > 0)
+    level = (pressure[1:] + pressure[:-1])/2.0
+    direction = directions(volume)[1:]
+    # NOTE: rows k = max_delay..n-2 so every delay has its input in range.
+    rows = slice(max_delay, len(dt))
+    keep = ((dt > 0) & (dt <= max_gap*median))[rows]
+    moves = np.diff(volume, prepend=volume[0])
+    fill, empty = np.cumsum(np.maximum(moves, 0.0)), np.cumsum(np.minimum(moves, 0.0))
+    # NOTE: regressors of all the delays at once (delays, rows, [f, r, p]).
+    delayed = [slice(max_delay + 1 - d, len(volume) - d) for d in range(max_delay + 1)]
+    inputs = np.stack([fill[span] for span in delayed]), np.stack([empty[span] for span in delayed])
+    x = np.stack(inputs + (np.broadcast_to(level[rows], inputs[0].shape),), axis=-1)
+    y = target[rows]
+    for column, sign in enumerate(DIRECTIONS):
+        mask = keep & (direction[rows] == sign)
+        n = int(np.count_nonzero(mask))
+        if n < 3:
+            continue
+        xs, ys = x[:, mask, :], y[mask]
+        mean_x, mean_y = xs.mean(axis=1, keepdims=True), ys.mean()
+        xs, ys = xs - mean_x, ys - mean_y
+        result["xx"][:, column] = np.einsum("dki,dkj->dij", xs, xs)
+        result["xy"][:, column] = np.einsum("dki,k->di", xs, ys)
+        result["yy"][:, column] = ys @ ys
+        result["n"][:, column] = n
+    return result
+
+
+def _statistics(arguments:tuple) -> tuple:
+    # NOTE: runs in the pool processes (must be picklable, hence module level).
+    folder, options = arguments
+    try:
+        return folder, session_statistics(folder, **options), None
+    except (OSError, ValueError, KeyError) as error:
+        return folder, None, str(error)
+
+
+def identify(folders:List[str], workers:int=None, max_delay:int=5, max_gap:float=5.0) -> Dict[int, StepModel]:
+    """
+    Fits the fill (+1) and empty (-1) models on the recorded sessions in
+    `folders`. The per session sums are computed on a process pool of
+    `workers` processes (CPU count by default), then every (delay, direction)
+    fit is solved in one batch and the delay with the smallest residual (and
+    a stable, positive time constant) is kept. Directions without a valid fit
+    are missing from the result.
+    """
+    todo = [(folder, {"max_delay": max_delay, "max_gap": max_gap}) for folder in folders]
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers <= 1 or len(todo) <= 1:
+        outcomes = [_statistics(arguments) for arguments in todo]
+    else:
+        # NOTE: imported here, the process pool machinery is not needed to start the application.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            outcomes = list(pool.map(_statistics, todo))
+
+    shape = (max_delay + 1, len(DIRECTIONS))
+    xx, xy, yy, n = np.zeros(shape + (3, 3)), np.zeros(shape + (3,)), np.zeros(shape), np.zeros(shape)
+    dt, weight = 0.0, 0.0
+    for folder, statistics, error in outcomes:
+        if error is not None:
+            print("identify : unable to read", folder, "->", error)
+            continue
+        xx += statistics["xx"]
+        xy += statistics["xy"]
+        yy += statistics["yy"]
+        n += statistics["n"]
+        rows = float(statistics["n"][0].sum())
+        dt += statistics["dt"]*rows
+        weight += rows
+    dt = dt/weight if weight > 0 else 0.0
+
+    # NOTE: singular systems (no data, piston never moved) are left as NaN.
+    solvable = np.abs(np.linalg.det(xx)) > 1e-12
+    theta = np.full(shape + (3,), np.nan)
+    theta[solvable] = np.linalg.solve(xx[solvable], xy[solvable][..., None])[..., 0]
+    sse = yy - np.einsum("...i,...i->...", theta, xy)
+    # NOTE: the gain of a direction comes from the fit on its own rows.
+    a, b = np.where(np.array(DIRECTIONS) > 0, theta[..., 0], theta[..., 1]), theta[..., 2]
+    valid = solvable & (b < 0) & (a*b < 0) & (n > 4)
+    sse = np.where(valid, sse, np.inf)
+
+    models = {}
+    for column, sign in enumerate(DIRECTIONS):
+        delay = int(np.argmin(sse[:, column]))
+        if not np.isfinite(sse[delay, column]):
+            continue
+        alpha, beta, count = a[delay, column], b[delay, column], int(n[delay, column])
+        rmse = float(np.sqrt(max(sse[delay, column], 0.0)/max(count - 4, 1)))
+        models[sign] = StepModel(sign, float(-alpha/beta), float(-1.0/beta), delay*dt, rmse, count)
+    return models
+
+
+def plant_from_models(models:Dict[int, StepModel], geometry:PistonGeometry=None, **options) -> FirmwarePlant:
+    """
+    The simulated firmware plant of the identified models (the empty model
+    falls back to the fill one and vice versa).
+    """
+    geometry = geometry if geometry is not None else PistonGeometry()
+    fill = models.get(1, models.get(-1))
+    empty = models.get(-1, fill)
+    return FirmwarePlant(gain=fill.gainPerStep(geometry), tau=fill.tau, reverse_gain=empty.gainPerStep(geometry), reverse_tau=empty.tau,
+                         dead_time=max(fill.dead_time, empty.dead_time), **options)
+
+
+def speed_table(gain:float, tau:float=1.0, delay:float=0.5, step_time:float=200e-6, fraction:float=0.8, levels:Tuple[int, ...]=SPEED_LEVELS) -> List[Tuple[float, int]]:
+    """
+    Speed table (see `firmware_speed`) for a plant moving `gain` units per
+    step: every step count is used once the distance is large enough for the
+    pressure it adds, plus the part of the previous move the sensor didn't
+    show yet when sampled (`tau` lag, `delay` sleep), to stay within
+    `fraction` of it. Largest distance first, like `firmware_speed` expects.
+    """
+    table = []
+    for steps in sorted(levels, reverse=True):
+        # NOTE: share of a move still to come when the next cycle reads the sensor.
+        pending = np.exp(-(delay + steps*step_time)/tau) if tau > 0 else 0.0
+        table.append((float(steps*gain*(1.0 + pending)/fraction), int(steps)))
+    return table
+
+
+def speed_table_code(table:List[Tuple[float, int]]) -> str:
+    """
+    `estima_velocidade` for the firmware with the thresholds of `table`.
+    """
+    lines = ["long estima_velocidade(float a, float b) {", "  float diff = b - a;"]
+    for distance, steps in table:
+        lines.append("  if (diff >= " + format(distance, ".3f") + ") return " + str(steps) + ";")
+    lines.append("  return 0;")
+    lines.append("}")
+    return "\n".join(lines)
+
+
+def main(arguments:List[str]=None) -> None:
+    """
+    System identification tool: fits the plant models on the recorded runs,
+    then tunes the host controller and derives a speed table for them.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Identify the pressure plant from the recorded runs and derive controller gains and a firmware speed table.")
+    parser.add_argument("--folder", default=os.path.join(os.path.expanduser("~"), ".CPV"), help="user folder (with the Sessions folder and the run catalog)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (CPU count by default)")
+    parser.add_argument("--max-delay", type=int, default=5, help="longest dead time tried (samples)")
+    parser.add_argument("--geometry", default=PistonGeometry().spec(), help="piston diameter (mm), screw lead (mm) and steps per turn")
+    parser.add_argument("--band", type=float, default=3.0, help="settling band (±units)")
+    parser.add_argument("--output", default=None, help="JSON file for the results")
+    options = parser.parse_args(arguments)
+
+    catalog = RunCatalog(os.path.join(options.folder, CATALOG_FILENAME))
+    catalog.scan(os.path.join(options.folder, "Sessions"))
+    folders = [run["folder"] for run in catalog.find()]
+    catalog.close()
+    models = identify(folders, options.workers, options.max_delay)
+    if len(models) == 0:
+        print("identify : not enough data (no piston moves recorded)")
+        return
+    for model in models.values():
+        print(model)
+
+    geometry = PistonGeometry.fromSpec(options.geometry)
+    plant = plant_from_models(models, geometry)
+    steps = [(0.0, 50.0), (0.0, 300.0), (100.0, 500.0), (400.0, 150.0)]
+    builtin = score(plant, None, steps, options.band, 60.0, 2.0)
+    controller, tuned = tune(plant, steps, options.band)
+    table = speed_table(max(plant.gain, plant.reverse_gain), plant.tau, plant.delay, plant.step_time)
+    plant.speeds = table
+    derived = score(plant, None, steps, options.band, 60.0, 2.0)
+    print("built-in loop :", builtin)
+    print("speed table   :", derived)
+    print("host control  :", tuned)
+    print("gains         :", controller)
+    print(speed_table_code(table))
+    if options.output is not None:
+        with open(options.output, "w") as fid:
+            json.dump({"models": [model._asdict() for model in models.values()], "gains": [controller.kp, controller.ki, controller.kd],
+                       "speeds": table, "builtin": builtin, "table": derived, "host": tuned}, fid, indent=2)
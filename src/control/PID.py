@@ -0,0 +1,72 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Python libraries
+from typing import Tuple
+
+
+class PIDController:
+    """
+    PID with setpoint feed forward: the output is the target sent to the
+    firmware, `feedforward*setpoint + kp*e + ki*∫e - kd*d(value)/dt`.
+
+    The derivative acts on the (low pass filtered) measurement so setpoint
+    steps don't kick the output, and the integral is clamped (anti windup)
+    so the output stays within `limits`.
+    """
+    def __init__(self, kp:float=0.0, ki:float=0.0, kd:float=0.0, feedforward:float=1.0, limits:Tuple[float, float]=(-1e9, 1e9), smoothing:float=0.5) -> None:
+        self.kp: float = kp
+        self.ki: float = ki
+        self.kd: float = kd
+        self.feedforward: float = feedforward
+        self.limits: Tuple[float, float] = limits
+        self.smoothing: float = smoothing
+        self.reset()
+
+    def __repr__(self) -> str:
+        return "PIDController(kp=%g, ki=%g, kd=%g, feedforward=%g)"%(self.kp, self.ki, self.kd, self.feedforward)
+
+    def reset(self) -> None:
+        self._integral: float = 0.0
+        self._time: float = None
+        self._value: float = None
+        self._derivative: float = 0.0
+        self._setpoint: float = None
+
+    def update(self, setpoint:float, value:float, time:float) -> float:
+        if setpoint != self._setpoint:
+            # NOTE: a new setpoint starts a new integral (the old one belongs to another operating point).
+            self._integral = 0.0
+            self._setpoint = setpoint
+        error = setpoint - value
+        if self._time is not None and time > self._time:
+            dt = time - self._time
+            rate = (value - self._value)/dt
+            self._derivative += self.smoothing*(rate - self._derivative)
+            self._integral += self.ki*error*dt
+        self._time, self._value = time, value
+        low, high = self.limits
+        base = self.feedforward*setpoint + self.kp*error - self.kd*self._derivative
+        self._integral = min(max(self._integral, low - base), high - base)
+        return min(max(base + self._integral, low), high)
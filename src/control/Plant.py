@@ -0,0 +1,189 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Python libraries
+import math
+from collections import deque
+from typing import Callable, Dict, List, Tuple
+
+# Third party libraries
+import numpy as np
+
+# Local libraries
+from src.device import firmware_speed, firmware_steps
+
+
+def parse_int(buffer:str) -> Tuple[int, str, bool]:
+    """
+    What the firmware's `Serial.parseInt()` reads from `buffer`: the number
+    (0 without digits), what is left and whether it waited its timeout (no
+    number, or nothing after the digits so it waits for more).
+    """
+    i = 0
+    while i < len(buffer) and not (buffer[i].isdigit() or buffer[i] == "-"):
+        i += 1
+    if i == len(buffer):
+        return 0, "", True
+    negative = buffer[i] == "-"
+    start = i + 1 if negative else i
+    i = start
+    while i < len(buffer) and buffer[i].isdigit():
+        i += 1
+    value = int(buffer[start:i]) if i > start else 0
+    return (-value if negative else value), buffer[i:], i == len(buffer)
+
+
+class FirmwarePlant:
+    """
+    Simulation of the controller firmware (`NANO_19-6-2021.ino`) driving the
+    piston and of the pressure it produces.
+
+    Every firmware cycle reads a target from what was sent over serial (see
+    `parse_int`: commands not ended by `terminator` merge, and the read
+    blocks the loop `parse_timeout` seconds when nothing follows the digits),
+    samples the sensor (and prints it), moves the stepper by `estima_velocidade` steps
+    (20000 when more than 100 units off the ±`band` window, 1000 when inside
+    100, none when inside the band, or the given `speeds` table), each step
+    taking `step_time` seconds, and then sleeps `delay` seconds. Every step
+    moves the equilibrium pressure by `gain` units (`reverse_gain` when
+    emptying), which the pressure follows after `dead_time` seconds through a
+    first order lag of `tau` (`reverse_tau`) seconds.
+    """
+    FastSteps: int = 20000
+    SlowSteps: int = 1000
+
+    def __init__(self, gain:float=0.01, tau:float=1.0, band:float=1.5, delay:float=0.5, step_time:float=200e-6, noise:float=0.0, dt:float=0.01,
+                 reverse_gain:float=None, reverse_tau:float=None, dead_time:float=0.0, speeds:List[Tuple[float, int]]=None,
+                 terminator:str="\n", parse_timeout:float=1.0) -> None:
+        self.gain: float = gain
+        self.tau: float = tau
+        self.band: float = band
+        self.delay: float = delay
+        self.step_time: float = step_time
+        self.noise: float = noise
+        self.dt: float = dt
+        self.reverse_gain: float = reverse_gain if reverse_gain is not None else gain
+        self.reverse_tau: float = reverse_tau if reverse_tau is not None else tau
+        self.dead_time: float = dead_time
+        self.speeds: List[Tuple[float, int]] = speeds
+        self.terminator: str = terminator or ""
+        self.parse_timeout: float = parse_timeout
+
+    @staticmethod
+    def estimateSpeed(a:float, b:float) -> int:
+        return firmware_speed(a, b)
+
+    def steps(self, value:float, target:float) -> int:
+        """
+        Signed steps of one firmware cycle (0 when the target is 0, like the firmware).
+        """
+        return firmware_steps(value, target, self.band, self.speeds)
+
+    def simulate(self, command:Callable[[float, float], float], duration:float=60.0, initial:float=0.0, seed:int=0) -> Dict[str, np.ndarray]:
+        """
+        Runs the firmware loop for `duration` seconds. `command(time, value)`
+        is called with every printed sample and returns the target the host
+        sends back (None to send nothing), read by the next cycle. Returns the samples as
+        arrays (`time`, `value`, `target` and `position`, the piston steps
+        from the start before the move of that cycle).
+        """
+        random = np.random.default_rng(seed)
+        decays = {1: math.exp(-self.dt/self.tau), -1: math.exp(-self.dt/self.reverse_tau)}
+        gains = {1: self.gain, -1: self.reverse_gain}
+        t, pressure, equilibrium, position, direction = 0.0, initial, initial, 0, 1
+        # NOTE: equilibrium pressures still on their way (dead time).
+        delayed = deque([initial]*int(round(self.dead_time/self.dt)))
+        target = 0.0
+        # NOTE: serial receive buffer of the firmware.
+        pending = ""
+        times, values, targets, positions = [], [], [], []
+        while t < duration:
+            if pending:
+                parsed, pending, waited = parse_int(pending)
+                target = float(parsed)
+                # NOTE: the loop is blocked (the piston doesn't move) while parseInt waits.
+                elapsed = 0.0
+                while waited and elapsed < self.parse_timeout:
+                    delayed.append(equilibrium)
+                    effective = delayed.popleft()
+                    pressure = effective + (pressure - effective)*decays[direction]
+                    elapsed += self.dt
+                t += elapsed
+            value = pressure + (random.normal(0.0, self.noise) if self.noise > 0 else 0.0)
+            times.append(t)
+            values.append(value)
+            positions.append(position)
+            new_target = command(t, value)
+            if new_target is not None:
+                pending += str(int(new_target)) + self.terminator
+            targets.append(target)
+            steps = self.steps(value, target)
+            position += steps
+            if steps != 0:
+                direction = 1 if steps > 0 else -1
+            # NOTE: the piston moves during the motor loop, then the firmware sleeps.
+            move_time = abs(steps)*self.step_time
+            speed = steps*gains[direction]/move_time if move_time > 0 else 0.0
+            decay = decays[direction]
+            elapsed = 0.0
+            while elapsed < move_time + self.delay:
+                dt = self.dt
+                if elapsed < move_time:
+                    equilibrium += speed*min(dt, move_time - elapsed)
+                delayed.append(equilibrium)
+                effective = delayed.popleft()
+                pressure = effective + (pressure - effective)*decay
+                elapsed += dt
+            t += elapsed
+        return {"time": np.array(times), "value": np.array(values), "target": np.array(targets), "position": np.array(positions)}
+
+
+def settling_time(times:np.ndarray, values:np.ndarray, setpoint:float, band:float) -> float:
+    """
+    Time after which the response stays within ±`band` of `setpoint` (inf if
+    it never does).
+    """
+    outside = np.nonzero(np.abs(values - setpoint) > band)[0]
+    if len(outside) == 0:
+        return float(times[0])
+    if outside[-1] == len(values) - 1:
+        return math.inf
+    return float(times[outside[-1] + 1])
+
+
+def response_metrics(times:np.ndarray, values:np.ndarray, setpoint:float, initial:float, band:float) -> Dict[str, float]:
+    """
+    Settling time, overshoot (% of the step), steady state error (mean of
+    the last 10 % of the response) and integral of absolute error.
+    """
+    size = abs(setpoint - initial)
+    direction = 1.0 if setpoint >= initial else -1.0
+    peak = np.max(direction*(values - setpoint))
+    tail = values[int(len(values)*0.9):]
+    return {
+        "settling_time": settling_time(times, values, setpoint, band),
+        "overshoot": max(float(peak), 0.0)/size*100.0 if size > 0 else 0.0,
+        "error": float(np.mean(tail) - setpoint) if len(tail) > 0 else 0.0,
+        "iae": float(np.sum(np.abs(values[:-1] - setpoint)*np.diff(times))) if len(values) > 1 else 0.0,
+    }
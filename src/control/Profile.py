@@ -0,0 +1,290 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Python libraries
+import json
+import time
+import logging
+from bisect import bisect_right
+from threading import Event, Thread
+from typing import Dict, List, NamedTuple, Tuple
+
+# Qt libraries
+from PyQt5 import QtCore
+
+# Local libraries
+from src.device import Device
+
+
+_log: logging.Logger = logging.getLogger(__name__)
+
+
+class Piece(NamedTuple):
+    start: float
+    stop: float
+    begin: float
+    end: float
+
+
+class Profile:
+    """
+    A setpoint profile: a sequence of linear pieces (value from `begin` to
+    `end` between `start` and `stop` seconds) built from the segments of a
+    profile file (JSON):
+
+        {"name": "Staircase", "initial": 0, "repeat": 2, "segments": [
+            {"type": "step", "value": 50, "duration": 10},
+            {"type": "ramp", "value": 200, "duration": 30},
+            {"type": "hold", "duration": 15},
+            {"type": "cycle", "repeat": 3, "segments": [...]}]}
+
+    A step jumps to `value` and holds it, a ramp goes linearly from the
+    previous value to `value`, a hold keeps the previous value and a cycle
+    repeats its own segments. Values are pressures in kPa.
+    """
+    Types: List[str] = ["step", "ramp", "hold", "cycle"]
+
+    def __init__(self, pieces:List[Piece], name:str=None) -> None:
+        self.name: str = name
+        self._pieces: List[Piece] = pieces
+        self._starts: List[float] = [piece.start for piece in pieces]
+
+    def __len__(self) -> int:
+        return len(self._pieces)
+
+    def pieces(self) -> List[Piece]:
+        return list(self._pieces)
+
+    def duration(self) -> float:
+        return self._pieces[-1].stop if self._pieces else 0.0
+
+    def index(self, elapsed:float) -> int:
+        return max(bisect_right(self._starts, elapsed) - 1, 0)
+
+    def value(self, elapsed:float) -> float:
+        piece = self._pieces[self.index(elapsed)]
+        if piece.stop <= piece.start or elapsed >= piece.stop:
+            return piece.end
+        fraction = max(elapsed - piece.start, 0.0)/(piece.stop - piece.start)
+        return piece.begin + (piece.end - piece.begin)*fraction
+
+    def schedule(self, period:float=0.1) -> List[Tuple[float, float]]:
+        """
+        The (time, value) pairs to send: the start of every piece plus one
+        every `period` seconds along ramps, and the final value.
+        """
+        events = []
+        for piece in self._pieces:
+            events.append((piece.start, piece.begin))
+            if piece.begin != piece.end:
+                t = piece.start + period
+                while t < piece.stop:
+                    events.append((t, self.value(t)))
+                    t += period
+        if self._pieces:
+            events.append((self.duration(), self._pieces[-1].end))
+        return events
+
+    @staticmethod
+    def fromDict(data:Dict) -> "Profile":
+        """
+        Builds a profile from its (file) description. Raises `ValueError` if it
+        isn't valid.
+        """
+        pieces = []
+        try:
+            value = float(data.get("initial", 0.0))
+            for _ in range(int(data.get("repeat", 1))):
+                value = Profile._build(data["segments"], pieces, value)
+        except (KeyError, TypeError) as error:
+            raise ValueError("Invalid profile: " + repr(error))
+        if len(pieces) == 0:
+            raise ValueError("Empty profile")
+        return Profile(pieces, data.get("name"))
+
+    @staticmethod
+    def load(path:str) -> "Profile":
+        with open(path, "r") as fid:
+            try:
+                data = json.loads(fid.read())
+            except json.JSONDecodeError as error:
+                raise ValueError("Invalid profile file: " + str(error))
+        return Profile.fromDict(data)
+
+    @staticmethod
+    def _build(segments:List[Dict], pieces:List[Piece], value:float) -> float:
+        for segment in segments:
+            kind = segment["type"]
+            start = pieces[-1].stop if pieces else 0.0
+            if kind == "cycle":
+                for _ in range(int(segment.get("repeat", 1))):
+                    value = Profile._build(segment["segments"], pieces, value)
+                continue
+            if kind not in Profile.Types:
+                raise ValueError("Unknown profile segment: " + str(kind))
+            duration = float(segment.get("duration", 0.0))
+            if duration < 0:
+                raise ValueError("Negative segment duration: " + str(duration))
+            begin = value
+            if kind == "step":
+                begin = value = float(segment["value"])
+            elif kind == "ramp":
+                value = float(segment["value"])
+            pieces.append(Piece(start, start + duration, begin, value))
+        return value
+
+
+class ProfileSignal(QtCore.QObject):
+    Progress: QtCore.pyqtSignal = QtCore.pyqtSignal(float, float)
+    Finished: QtCore.pyqtSignal = QtCore.pyqtSignal(bool)
+
+    def __init__(self):
+        QtCore.QObject.__init__(self)
+
+
+class ProfileRunner:
+    """
+    Plays a `Profile` on its own thread, sending the targets to a `Device`
+    (`Device.sendTarget`) at the scheduled times.
+
+    Every event time is relative to the monotonic clock reading taken at the
+    start (so lateness never accumulates, a late event just makes the next
+    wait shorter). The thread sleeps until `spin` seconds before each event
+    and busy waits the rest. Ramps are ticked every `period` seconds, never
+    faster than the firmware cycle (`Device.CyclePeriod`) since the firmware
+    reads one target per cycle. Ramp ticks that are already more than one
+    period late are dropped instead of sent in a burst.
+
+    The lateness of an event is measured when the I/O worker actually writes
+    its target to the port (a command callback), so it includes the worker
+    interval and the wait for the next firmware cycle.
+
+    The runner claims the device (`Device.claim`) while it plays, so it never
+    fights a hold test or the host controller over the targets.
+    """
+    Driver: str = "profile"
+
+    def __init__(self, period:float=Device.CyclePeriod, spin:float=0.002) -> None:
+        # NOTE: signal class (emitted from the runner thread, queued to the GUI thread)
+        self.Signal: ProfileSignal = ProfileSignal()
+
+        self._period: float = max(period, Device.CyclePeriod)
+        self._spin: float = spin
+        self._thread: Thread = None
+        self._event: Event = Event()
+        self._profile: Profile = None
+        self._lateness: List[float] = []
+        # NOTE: deadline of the last target sent and not written yet (set by the runner, cleared by the I/O worker).
+        self._deadline: float = None
+
+    def isRunning(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def profile(self) -> Profile:
+        return self._profile
+
+    def jitter(self) -> Dict[str, float]:
+        """
+        Lateness statistics (seconds) of the targets written by the last run,
+        from their scheduled time to their write to the port.
+        """
+        lateness = list(self._lateness)
+        if len(lateness) == 0:
+            return {"count": 0, "mean": 0.0, "max": 0.0}
+        return {"count": len(lateness), "mean": sum(lateness)/len(lateness), "max": max(lateness)}
+
+    def start(self, profile:Profile, device:Device) -> bool:
+        """
+        Plays `profile` on `device`. Returns False (nothing started) if
+        something else already drives the device.
+        """
+        self.stop()
+        if not device.claim(self.Driver):
+            return False
+        self._profile = profile
+        self._lateness = []
+        self._deadline = None
+        self._event = Event()
+        self._thread = Thread(target=self._run, args=(profile, device, self._event), name="ProfileRunner", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._event.set()
+            self._thread.join()
+            self._thread = None
+
+    def _onCommand(self, device:Device, stamp:float, text:str) -> None:
+        # NOTE: called from the I/O worker right after the write, only targets (digits) are timed.
+        deadline = self._deadline
+        if deadline is not None and text.isdigit():
+            self._deadline = None
+            self._lateness.append(time.perf_counter() - deadline)
+
+    def _run(self, profile:Profile, device:Device, event:Event) -> None:
+        completed = False
+        device.addCommandCallback(self._onCommand)
+        try:
+            completed = self._play(profile, device, event)
+            # NOTE: give the last target a firmware cycle to be written (and timed).
+            limit = time.perf_counter() + 2.0*Device.CyclePeriod
+            while completed and self._deadline is not None and time.perf_counter() < limit and not event.wait(0.005):
+                pass
+        except Exception:
+            completed = False
+            _log.exception("ProfileRunner::_run : %s profile aborted", device.port)
+        finally:
+            device.removeCommandCallback(self._onCommand)
+            device.release(self.Driver)
+            self.Signal.Finished.emit(completed)
+
+    def _play(self, profile:Profile, device:Device, event:Event) -> bool:
+        schedule = profile.schedule(self._period)
+        duration = profile.duration()
+        origin = time.perf_counter()
+        last_progress = -1.0
+        last_value = None
+        for i, (when, value) in enumerate(schedule):
+            deadline = origin + when
+            remaining = deadline - time.perf_counter()
+            if remaining > self._spin and event.wait(remaining - self._spin):
+                return False
+            while time.perf_counter() < deadline:
+                pass
+            now = time.perf_counter()
+            # NOTE: drop ramp ticks we are too late for (the next one is already due).
+            if i + 1 < len(schedule) and origin + schedule[i + 1][0] <= now and schedule[i + 1][0] - when <= self._period:
+                continue
+            # NOTE: holds (and a ramp starting where the previous piece ended) don't resend the same target.
+            if value != last_value:
+                # NOTE: a target replaced before it was written is timed from the newer deadline.
+                self._deadline = deadline
+                device.sendTarget(value)
+                last_value = value
+            if now - last_progress >= 0.1:
+                last_progress = now
+                self.Signal.Progress.emit(now - origin, duration)
+        self.Signal.Progress.emit(duration, duration)
+        return not event.is_set()
@@ -0,0 +1,114 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+# Python libraries
+import itertools
+import math
+from typing import Dict, List, Tuple
+
+# Local libraries
+from .PID import PIDController
+from .Plant import FirmwarePlant, response_metrics
+from .HostController import HostController
+
+
+def simulate(plant:FirmwarePlant, controller:PIDController=None, setpoint:float=300.0, initial:float=0.0, duration:float=60.0, rate:float=2.0) -> Dict:
+    """
+    Step response of `plant` to `setpoint`. Without a controller the setpoint
+    is sent after every printed value like `Device` does (the built-in
+    firmware loop), otherwise the controller output is sent at most `rate`
+    times per second.
+    """
+    state = {"last": -math.inf}
+    if controller is not None:
+        controller.reset()
+
+    def command(t:float, value:float) -> float:
+        if controller is None:
+            return setpoint
+        if t - state["last"] < 1.0/rate:
+            return None
+        state["last"] = t
+        return controller.update(setpoint, value, t)
+
+    return plant.simulate(command, duration, initial)
+
+
+def score(plant:FirmwarePlant, controller:PIDController, steps:List[Tuple[float, float]], band:float, duration:float, rate:float) -> Dict[str, float]:
+    """
+    Worst settling time and mean IAE over a few (initial, setpoint) steps.
+    """
+    worst, iae, overshoot = 0.0, 0.0, 0.0
+    for initial, setpoint in steps:
+        result = simulate(plant, controller, setpoint, initial, duration, rate)
+        metrics = response_metrics(result["time"], result["value"], setpoint, initial, band)
+        worst = max(worst, metrics["settling_time"])
+        overshoot = max(overshoot, metrics["overshoot"])
+        iae += metrics["iae"]/len(steps)
+    return {"settling_time": worst, "overshoot": overshoot, "iae": iae}
+
+
+def tune(plant:FirmwarePlant, steps:List[Tuple[float, float]]=None, band:float=3.0, duration:float=60.0, rate:float=2.0,
+         kp:List[float]=None, ki:List[float]=None, kd:List[float]=None) -> Tuple[PIDController, Dict[str, float]]:
+    """
+    Grid search of the controller gains on the simulated plant, minimizing
+    the worst settling time (then IAE). The built-in loop (feed forward only)
+    is part of the grid, so the result is never worse than it.
+    """
+    steps = steps if steps is not None else [(0.0, 50.0), (0.0, 300.0), (100.0, 500.0), (400.0, 150.0)]
+    kp = kp if kp is not None else [0.0, -0.2, -0.4, 0.2, 0.5]
+    ki = ki if ki is not None else [0.0, 0.05, 0.2]
+    kd = kd if kd is not None else [0.0, 0.5, 1.0, 2.0, 4.0]
+    best, best_score = None, None
+    for p, i, d in itertools.product(kp, ki, kd):
+        controller = PIDController(p, i, d, limits=HostController.Limits)
+        result = score(plant, controller, steps, band, duration, rate)
+        if best_score is None or (result["settling_time"], result["iae"]) < (best_score["settling_time"], best_score["iae"]):
+            best, best_score = controller, result
+    return best, best_score
+
+
+def main(arguments:List[str]=None) -> None:
+    """
+    Offline tuning tool: tunes the host controller on the simulated firmware
+    plant and compares it with the built-in loop.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Tune the host side pressure controller on a simulated plant.")
+    parser.add_argument("--gain", type=float, default=0.01, help="pressure units per motor step")
+    parser.add_argument("--tau", type=float, default=1.0, help="pressure time constant (s)")
+    parser.add_argument("--noise", type=float, default=0.0, help="sensor noise (std)")
+    parser.add_argument("--rate", type=float, default=2.0, help="controller output rate (Hz)")
+    parser.add_argument("--band", type=float, default=3.0, help="settling band (±units)")
+    parser.add_argument("--duration", type=float, default=60.0, help="simulated time per step (s)")
+    parser.add_argument("--unterminated", action="store_true", help="send the targets without terminator (older hosts, parseInt waits 1 s per target)")
+    options = parser.parse_args(arguments)
+
+    plant = FirmwarePlant(gain=options.gain, tau=options.tau, noise=options.noise, terminator="" if options.unterminated else "\n")
+    steps = [(0.0, 50.0), (0.0, 300.0), (100.0, 500.0), (400.0, 150.0)]
+    builtin = score(plant, None, steps, options.band, options.duration, options.rate)
+    controller, tuned = tune(plant, steps, options.band, options.duration, options.rate)
+    print("built-in loop :", builtin)
+    print("host control  :", tuned)
+    print("gains         :", controller)
@@ -0,0 +1,7 @@
+from .PID import PIDController
+from .Plant import FirmwarePlant, settling_time, response_metrics
+from .Tuning import simulate, tune
+from .HostController import HostController, parse_gains
+from .Profile import Profile, ProfileRunner, Piece
+from .HoldTest import HoldTest, HoldTestResult, t_quantile
+from .Identification import StepModel, identify, plant_from_models, speed_table, speed_table_code
@@ -0,0 +1,294 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+# Python libraries
+import json
+import os
+import time
+import logging
+from threading import Lock
+from typing import Dict, List, NamedTuple
+
+# Third party libraries
+import numpy as np
+
+# Qt libraries
+from PyQt5 import QtCore
+
+# Local libraries
+from .Device import Device
+from .Parser import LineParser
+
+
+_log: logging.Logger = logging.getLogger(__name__)
+
+
+class AlarmRule(NamedTuple):
+    """
+    `metric` is one of `AlarmEngine.Metrics`. The alarm is raised once the
+    metric has been beyond `on` for `debounce` seconds and cleared when it goes
+    back past `off` (hysteresis, `off` defaults to `on`). For `under` both
+    thresholds are pressures the value must drop below (and rise above).
+    `action` is an optional device command to run when raised (`empty`, `fill`).
+    """
+    name: str
+    metric: str
+    on: float
+    off: float = None
+    debounce: float = 0.0
+    action: str = None
+
+
+class AlarmEvent(NamedTuple):
+    port: str
+    rule: str
+    active: bool
+    time: float
+    value: float
+
+
+DEFAULT_RULES: List[AlarmRule] = [
+    AlarmRule("Over-pressure", "over", 200.0, 190.0, 0.1, "empty"),
+    AlarmRule("Under-pressure", "under", -80.0, -70.0, 0.1, "fill"),
+    AlarmRule("Pressure rate", "rate", 100.0, 50.0, 0.2),
+    AlarmRule("Stalled sensor", "stall", 5.0),
+    AlarmRule("Limit beginning dwell", "dwell_beginning", 10.0),
+    AlarmRule("Limit end dwell", "dwell_end", 10.0),
+]
+
+
+def load_rules(path:str) -> List[AlarmRule]:
+    """
+    Reads the rules from a JSON file (a list of objects with the `AlarmRule`
+    fields). Writes the default rules first if the file doesn't exist.
+    """
+    if not os.path.exists(path):
+        save_rules(path, DEFAULT_RULES)
+    with open(path, "r") as fid:
+        return [AlarmRule(**item) for item in json.loads(fid.read())]
+
+
+def save_rules(path:str, rules:List[AlarmRule]) -> None:
+    with open(path, "w") as fid:
+        fid.write(json.dumps([rule._asdict() for rule in rules], indent=4))
+
+
+def _run_start(mask:np.ndarray, times:np.ndarray, carry:np.ndarray) -> np.ndarray:
+    """
+    For every (sample, column) inside a run of True in `mask` (n, c) returns
+    the time the run started. Runs still open at the end of the previous batch
+    started at `carry` (NaN where there was none).
+    """
+    n = len(times)
+    index = np.arange(n)[:, None]
+    last_false = np.maximum.accumulate(np.where(mask, -1, index), axis=0)
+    start = times[np.minimum(last_false + 1, n - 1)]
+    return np.where((last_false < 0) & ~np.isnan(carry)[None, :], carry[None, :], start)
+
+
+class _DeviceState:
+    """
+    What the evaluation of one batch needs from the previous one.
+    """
+    def __init__(self, rules:int) -> None:
+        self.time: float = None
+        self.value: float = 0.0
+        self.limits: np.ndarray = np.full(2, np.nan)
+        self.above: np.ndarray = np.full(rules, np.nan)
+        self.active: np.ndarray = np.zeros(rules, dtype=bool)
+
+
+class AlarmEngine:
+    """
+    Evaluates a set of `AlarmRule` on every batch of samples read from each
+    device (from the I/O workers).
+
+    The rules are compiled into arrays: per batch a fixed set of metrics is
+    computed (value, rate of change, time each limit switch has been active)
+    and all rules are checked at once as a (samples x rules) comparison, with
+    debounce and hysteresis resolved by cumulative maxima instead of Python
+    loops. Transitions are emitted as `Alarm` on the `Observer`, printed, and
+    raised alarms with an `action` queue that command on the device.
+
+    A stalled sensor sends no batch at all, so the `stall` rules are checked
+    by a timer (every `interval` seconds, see `check`) against the age of the
+    last sample of each open device. A new sample brings the age back to 0.
+    """
+    Metrics: List[str] = ["over", "under", "rate", "stall", "dwell_beginning", "dwell_end"]
+    Actions: Dict[str, str] = {"empty": Device.EmptyTankCommand, "fill": Device.FillTankCommand}
+
+    def __init__(self, devices, observer=None, rules:List[AlarmRule]=None, interval:float=0.5) -> None:
+        self._devices = devices
+        self._observer = observer
+        self._lock: Lock = Lock()
+        self._states: Dict[str, _DeviceState] = {}
+        self.setRules(rules if rules is not None else DEFAULT_RULES)
+        for device in self._devices.devices():
+            self._attach(device.port)
+        self._devices.Signal.DeviceAdded.connect(self._attach)
+        self._devices.Signal.DeviceRemoved.connect(self._detach)
+        # NOTE: stall checks (GUI thread)
+        self._timer: QtCore.QTimer = QtCore.QTimer()
+        self._timer.timeout.connect(self._onTimer)
+        self._timer.start(int(interval*1000))
+
+    def rules(self) -> List[AlarmRule]:
+        return list(self._rules)
+
+    def setRules(self, rules:List[AlarmRule]) -> None:
+        """
+        Compiles `rules` (raises `ValueError` on unknown metrics or actions).
+        Alarm states start over.
+        """
+        for rule in rules:
+            if rule.metric not in self.Metrics:
+                raise ValueError("Unknown alarm metric: " + str(rule.metric))
+            if rule.action is not None and rule.action not in self.Actions:
+                raise ValueError("Unknown alarm action: " + str(rule.action))
+        # NOTE: `under` compares the negated value so every rule is "metric above threshold".
+        sign = np.array([-1.0 if rule.metric == "under" else 1.0 for rule in rules])
+        with self._lock:
+            self._rules: List[AlarmRule] = list(rules)
+            self._metric: np.ndarray = np.array([self.Metrics.index(rule.metric) for rule in rules], dtype=np.int64)
+            self._on: np.ndarray = sign*np.array([rule.on for rule in rules], dtype=np.float64)
+            self._off: np.ndarray = sign*np.array([rule.on if rule.off is None else rule.off for rule in rules], dtype=np.float64)
+            self._debounce: np.ndarray = np.array([rule.debounce for rule in rules], dtype=np.float64)
+            self._states = {port: _DeviceState(len(rules)) for port in self._states}
+
+    def active(self, port:str) -> List[str]:
+        """
+        Names of the alarms currently raised on `port`.
+        """
+        state = self._states.get(port)
+        if state is None:
+            return []
+        return [rule.name for rule, flag in zip(self._rules, state.active) if flag]
+
+    def _attach(self, port:str) -> None:
+        device = self._devices.device(port)
+        with self._lock:
+            if device is None or port in self._states:
+                return
+            self._states[port] = _DeviceState(len(self._rules))
+        device.addBatchCallback(self._onBatch)
+
+    def _detach(self, port:str) -> None:
+        with self._lock:
+            self._states.pop(port, None)
+
+    def _metrics(self, state:_DeviceState, batch:Dict[str, np.ndarray]) -> np.ndarray:
+        times, values = batch["time"], batch["value"]
+        if state.time is None:
+            state.time, state.value = times[0], values[0]
+        metrics = np.empty((len(times), len(self.Metrics)), dtype=np.float64)
+        metrics[:, 0] = values
+        metrics[:, 1] = -values
+        # NOTE: rate of change against the previous sample (the last one of the previous batch for the first).
+        dt = np.diff(times, prepend=state.time)
+        metrics[:, 2] = np.abs(np.diff(values, prepend=state.value))/np.where(dt > 0.0, dt, np.inf)
+        # NOTE: age of the last sample, 0 as one just came (see `check`).
+        metrics[:, 3] = 0.0
+        # NOTE: time each limit switch has been active.
+        flags = batch["limits"][:, None] & np.array([LineParser.LimitBeginning, LineParser.LimitEnd]) != 0
+        start = _run_start(flags, times, state.limits)
+        metrics[:, 4:6] = np.where(flags, times[:, None] - start, 0.0)
+        state.time, state.value = times[-1], values[-1]
+        state.limits = np.where(flags[-1], start[-1], np.nan)
+        return metrics
+
+    def evaluate(self, port:str, batch:Dict[str, np.ndarray]) -> List[AlarmEvent]:
+        """
+        Evaluates all rules on a batch of samples (`SampleBuffer` columns) of
+        `port` and returns the alarms raised or cleared in it.
+        """
+        with self._lock:
+            state = self._states.get(port)
+            if state is None or len(batch["time"]) == 0 or len(self._rules) == 0:
+                return []
+            values = self._metrics(state, batch)[:, self._metric]
+            return self._update(port, state, np.ones(len(self._rules), dtype=bool), batch["time"], values, batch["value"])
+
+    def check(self, now:float=None) -> List[AlarmEvent]:
+        """
+        Evaluates the `stall` rules of every open device against the age of
+        its last sample at `now` (the current time by default) and returns the
+        alarms raised or cleared.
+        """
+        now = time.time() if now is None else now
+        events = []
+        with self._lock:
+            columns = self._metric == self.Metrics.index("stall")
+            if not columns.any():
+                return []
+            for port, state in self._states.items():
+                device = self._devices.device(port)
+                last = device.last() if device is not None and device.isOpen() else None
+                if last is None:
+                    continue
+                values = np.full((1, int(columns.sum())), now - last.time)
+                events += self._update(port, state, columns, np.array([now]), values, np.array([last.value]))
+        return events
+
+    def _update(self, port:str, state:_DeviceState, columns:np.ndarray, times:np.ndarray, values:np.ndarray, samples:np.ndarray) -> List[AlarmEvent]:
+        """
+        Steps the rules selected by `columns` through the metric `values`
+        (samples x selected rules) and returns their transitions.
+        """
+        above = values > self._on[columns]
+        below = values < self._off[columns]
+        # NOTE: debounce, raised only once the metric has been above `on` long enough.
+        start = _run_start(above, times, state.above[columns])
+        raise_ = above & (times[:, None] - start >= self._debounce[columns])
+        # NOTE: hysteresis, the state is the one set by the last raise/clear sample.
+        event = np.where(raise_, 1, np.where(below, 0, -1))
+        index = np.arange(len(times))[:, None]
+        last = np.maximum.accumulate(np.where(event >= 0, index, -1), axis=0)
+        rules = [self._rules[j] for j in np.flatnonzero(columns)]
+        previous = state.active[columns]
+        active = np.where(last < 0, previous[None, :], event[np.maximum(last, 0), np.arange(len(rules))[None, :]] == 1)
+        state.above[columns] = np.where(above[-1], start[-1], np.nan)
+        previous = np.vstack([previous[None, :], active[:-1]])
+        state.active[columns] = active[-1]
+        rows, indices = np.nonzero(active != previous)
+        return [AlarmEvent(port, rules[j].name, bool(active[i, j]), float(times[i]), float(samples[i])) for i, j in zip(rows, indices)]
+
+    def _onTimer(self) -> None:
+        events = self.check()
+        for event in events:
+            self._handle(self._devices.device(event.port), event)
+
+    def _onBatch(self, device:Device, count:int) -> None:
+        events = self.evaluate(device.port, device.buffer.latest(count))
+        for event in events:
+            self._handle(device, event)
+
+    def _handle(self, device:Device, event:AlarmEvent) -> None:
+        _log.warning("AlarmEngine::_handle : %s %s", "raised" if event.active else "cleared", event)
+        rule = next(rule for rule in self._rules if rule.name == event.rule)
+        if event.active and rule.action is not None and device is not None:
+            device.write(self.Actions[rule.action])
+        if self._observer is not None:
+            self._observer.Signal.Alarm.emit(event)
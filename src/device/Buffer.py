@@ -0,0 +1,92 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+from threading import Lock
+from typing import Dict
+
+# Third party libraries
+import numpy as np
+
+
+class SampleBuffer:
+    """
+    Fixed size ring buffer holding the most recent samples of one device in
+    preallocated columns (so appending never allocates).
+    """
+    Columns: Dict[str, type] = {
+        "time": np.float64,
+        "raw": np.float64,
+        "value": np.float64,
+        "setpoint": np.float64,
+        "limits": np.uint8,
+        "volume": np.float64,
+    }
+
+    def __init__(self, capacity:int=100000) -> None:
+        self._capacity: int = capacity
+        self._columns: Dict[str, np.ndarray] = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.Columns.items()}
+        self._count: int = 0
+        self._lock: Lock = Lock()
+
+    def __len__(self) -> int:
+        return min(self._count, self._capacity)
+
+    def capacity(self) -> int:
+        return self._capacity
+
+    def total(self) -> int:
+        """
+        Number of samples appended since creation (including overwritten ones).
+        """
+        return self._count
+
+    def append(self, time:float, raw:float, value:float, setpoint:float, limits:int, volume:float=0.0) -> None:
+        with self._lock:
+            i = self._count % self._capacity
+            self._columns["time"][i] = time
+            self._columns["raw"][i] = raw
+            self._columns["value"][i] = value
+            self._columns["setpoint"][i] = setpoint
+            self._columns["limits"][i] = limits
+            self._columns["volume"][i] = volume
+            self._count += 1
+
+    def latest(self, count:int=None) -> Dict[str, np.ndarray]:
+        """
+        Returns a copy of the last `count` samples (all by default) in
+        chronological order.
+        """
+        with self._lock:
+            size = len(self)
+            if count is None or count > size:
+                count = size
+            end = self._count % self._capacity
+            index = np.arange(end - count, end) % self._capacity
+            return {name: column[index] for name, column in self._columns.items()}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._count = 0
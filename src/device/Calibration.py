@@ -0,0 +1,62 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+from typing import List
+
+# Third party libraries
+import numpy as np
+
+
+class Calibration:
+    """
+    Converts raw readings into calibrated pressure using a second degree
+    polynomial fitted to a calibration curve. With fewer than three points
+    the raw value is returned as is.
+    """
+    Degree: int = 2
+
+    def __init__(self, x:List[float]=None, y:List[float]=None, name:str=None) -> None:
+        self.name: str = name
+        self._poly: np.poly1d = None
+        if x is not None and len(x) > self.Degree:
+            self._poly = np.poly1d(np.polyfit(x, y, self.Degree))
+
+    def isIdentity(self) -> bool:
+        return self._poly is None
+
+    def __call__(self, raw:float) -> float:
+        if self._poly is None:
+            return raw
+        return float(self._poly(raw))
+
+    def evaluate(self, raw:np.ndarray) -> np.ndarray:
+        """
+        Vectorized version (for replaying recorded raw data).
+        """
+        raw = np.asarray(raw, dtype=np.float64)
+        if self._poly is None:
+            return raw.copy()
+        return self._poly(raw)
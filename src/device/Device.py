@@ -0,0 +1,371 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import time
+import logging
+from collections import deque
+from threading import Lock
+from typing import Callable, List, NamedTuple, Tuple
+
+# COM port communication library
+import serial
+
+# Qt libraries
+from PyQt5 import QtCore
+
+# Local libraries
+from src.utils import Counters
+from .Parser import LineParser
+from .Buffer import SampleBuffer
+from .Calibration import Calibration
+from .Filters import FilterPipeline, RollingStatistics
+from .Volume import VolumeEstimator, PVCurve
+from .Latency import LatencyTracker
+
+
+# NOTE: the I/O workers log (queued, see `start_logging`) instead of printing.
+_log: logging.Logger = logging.getLogger(__name__)
+
+
+class Sample(NamedTuple):
+    time: float
+    raw: float
+    value: float
+    setpoint: float
+    limits: int
+    volume: float = 0.0
+
+
+class DeviceSignal(QtCore.QObject):
+    ValuePressureChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(float)
+    ValueVolumeChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(float)
+    LimitsChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(int)
+    StateChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(bool)
+    Error: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+
+    def __init__(self):
+        QtCore.QObject.__init__(self)
+
+
+class Device:
+    """
+    A `Device` is one pressure volume controller connected on a COM port. It
+    owns its own serial connection, calibration, filter pipeline, volume
+    estimator, pressure-volume curve, latency histograms, state and sample
+    buffer.
+
+    A `Device` does no I/O on its own: the `DeviceManager` workers call `poll`
+    which writes queued commands, reads whatever is available and publishes
+    the parsed samples.
+
+    The firmware reads its target with `Serial.parseInt()` once per cycle:
+    digits written back to back merge into one number, and a number without
+    a terminator (or a lone terminator) blocks the firmware for 1 s. So every
+    command is terminated, and the target is paced to the firmware: the latest
+    one (see `writeTarget`) is written once after every printed value, which
+    also keeps the terminator of the previous one from being read alone.
+    """
+    EmptyTankCommand: str = "X"
+    FillTankCommand: str = "Y"
+    Terminator: str = "\n"
+    # NOTE: the firmware waits 500 ms after every printed value.
+    CyclePeriod: float = 0.5
+    # NOTE: the firmware compares the target with the raw reading (10 bit ADC minus its 106 offset), 0 stops it.
+    TargetRange: Tuple[float, float] = (0.0, 917.0)
+
+    def __init__(self, port:str, calibration:Calibration=None, baudrate:int=9600, buffer_size:int=100000, filter:FilterPipeline=None, volume:VolumeEstimator=None) -> None:
+        # NOTE: signal class (emitted from the I/O worker, queued to the GUI thread)
+        self.Signal: DeviceSignal = DeviceSignal()
+
+        self.port: str = port
+        self.baudrate: int = baudrate
+        self.calibration: Calibration = calibration if calibration is not None else Calibration()
+        self.buffer: SampleBuffer = SampleBuffer(buffer_size)
+        # NOTE: applied to the calibrated values (replaced, never mutated, so the worker always sees a whole pipeline).
+        self.filter: FilterPipeline = filter if filter is not None else FilterPipeline()
+        # NOTE: rolling std/min/max of the filtered values (published next to them, never applied).
+        self.statistics: RollingStatistics = RollingStatistics()
+        # NOTE: injected volume (replays the firmware steps, see `VolumeEstimator`) and the P-V curve it draws.
+        self.volume: VolumeEstimator = volume if volume is not None else VolumeEstimator()
+        self.curve: PVCurve = PVCurve()
+        # NOTE: per stage latencies, from the port read to the widgets (None to turn them off).
+        self.latency: LatencyTracker = LatencyTracker()
+        # NOTE: hot path counters of this device only (lines read, parse errors, samples, emits, drops).
+        self.counters: Counters = Counters.create()
+
+        self._serial: serial.Serial = None
+        self._incoming: bytes = b""
+        self._commands: deque = deque()
+        self._setpoint: float = 0.0
+        # NOTE: target to keep writing once per firmware cycle (None when there is none) and the last one written.
+        self._target: str = None
+        self._written: str = None
+        self._cycle_written: bool = False
+        self._limits: int = LineParser.LimitNone
+        self._last: Sample = None
+        self._connections: int = 0
+        # NOTE: what sets the targets besides the operator (profile, hold test, host controller), one at a time.
+        self._driver: str = None
+        self._driver_lock: Lock = Lock()
+
+        # NOTE: callbacks called from the I/O worker for every sample/command (must be fast).
+        self._sample_callbacks: List[Callable[["Device", Sample], None]] = []
+        self._command_callbacks: List[Callable[["Device", float, str], None]] = []
+        # NOTE: called once per poll with the number of samples it published (read them from the buffer).
+        self._batch_callbacks: List[Callable[["Device", int], None]] = []
+
+    def __repr__(self) -> str:
+        return "Device(" + self.port + ")"
+
+    def isOpen(self) -> bool:
+        return self._serial is not None
+
+    def setpoint(self) -> float:
+        return self._setpoint
+
+    def limits(self) -> int:
+        return self._limits
+
+    def last(self) -> Sample:
+        return self._last
+
+    def pending(self) -> int:
+        """
+        Commands queued and not written yet.
+        """
+        return len(self._commands)
+
+    def connections(self) -> int:
+        """
+        Times the port was opened.
+        """
+        return self._connections
+
+    # NOTE: the callback lists are replaced (never mutated), so a callback can remove itself while the worker iterates.
+    def addSampleCallback(self, callback:Callable[["Device", Sample], None]) -> None:
+        self._sample_callbacks = self._sample_callbacks + [callback]
+
+    def removeSampleCallback(self, callback:Callable[["Device", Sample], None]) -> None:
+        self._sample_callbacks = [c for c in self._sample_callbacks if c != callback]
+
+    def addCommandCallback(self, callback:Callable[["Device", float, str], None]) -> None:
+        self._command_callbacks = self._command_callbacks + [callback]
+
+    def removeCommandCallback(self, callback:Callable[["Device", float, str], None]) -> None:
+        self._command_callbacks = [c for c in self._command_callbacks if c != callback]
+
+    def addBatchCallback(self, callback:Callable[["Device", int], None]) -> None:
+        self._batch_callbacks = self._batch_callbacks + [callback]
+
+    def removeBatchCallback(self, callback:Callable[["Device", int], None]) -> None:
+        self._batch_callbacks = [c for c in self._batch_callbacks if c != callback]
+
+    def open(self) -> None:
+        """
+        Opens the serial connection (non blocking reads). The port may also be
+        a pyserial URL (e.g. `loop://`). Raises `OSError` (`serial.SerialException`
+        included) if the port can't be opened.
+        """
+        if self._serial is None:
+            self._serial = serial.serial_for_url(self.port, self.baudrate, timeout=0)
+            self._incoming = b""
+            self._target, self._written, self._cycle_written = None, None, False
+            self._connections += 1
+            # NOTE: opening the port resets the Arduino, so its target is back to 0.
+            self.volume.command("0")
+            self.Signal.StateChanged.emit(True)
+
+    def close(self) -> None:
+        if self._serial is not None:
+            try:
+                self._serial.close()
+            except OSError as error:
+                _log.error("Device::close : %s %s", self.port, error)
+            self._serial = None
+            self.Signal.StateChanged.emit(False)
+
+    def write(self, command:str) -> None:
+        """
+        Queues a command (terminated if it isn't), it will be written by the
+        I/O worker (so the GUI thread never blocks on the serial port). A
+        command replaces the target the firmware had, so the target is no
+        longer written (see `writeTarget`).
+        """
+        if not command.endswith(self.Terminator):
+            command += self.Terminator
+        self._target = None
+        self._commands.append(command.encode())
+
+    def driver(self) -> str:
+        """
+        Name of what drives the targets of the device (None when nothing does).
+        """
+        return self._driver
+
+    def claim(self, driver:str) -> bool:
+        """
+        Makes `driver` the one driving the targets of the device. Returns False
+        (nothing changes) if another one already does. Thread safe.
+        """
+        with self._driver_lock:
+            if self._driver is not None and self._driver != driver:
+                return False
+            self._driver = driver
+            return True
+
+    def release(self, driver:str) -> None:
+        with self._driver_lock:
+            if self._driver == driver:
+                self._driver = None
+
+    def sendTarget(self, value:float) -> None:
+        """
+        Sets the setpoint (what the operator asked for) and writes it as the
+        target.
+        """
+        self._setpoint = float(value)
+        self.writeTarget(value)
+
+    def writeTarget(self, value:float) -> None:
+        """
+        Sets the target written to the firmware (clamped to `TargetRange`)
+        without changing the setpoint (e.g. the host controller output). It is
+        written by the I/O worker once per firmware cycle, a newer target
+        replaces one not written yet.
+        """
+        low, high = self.TargetRange
+        self._target = str(int(min(max(value, low), high)))
+
+    def emptyTank(self) -> None:
+        self.write(self.EmptyTankCommand)
+
+    def fillTank(self) -> None:
+        self.write(self.FillTankCommand)
+
+    def poll(self) -> bool:
+        """
+        Writes pending commands and processes all complete lines available.
+        Returns True if any work was done. Called from the I/O worker only.
+        """
+        port = self._serial
+        if port is None:
+            return False
+        busy = False
+        read = None
+        try:
+            while self._commands:
+                command = self._commands.popleft()
+                port.write(command)
+                # NOTE: the command replaced the target, the next one is new even if it is the same.
+                self._written = None
+                self._commandWritten(command.decode().strip())
+                busy = True
+            target = self._target
+            if target is not None and not self._cycle_written:
+                port.write((target + self.Terminator).encode())
+                self._cycle_written = True
+                # NOTE: the same target written again (every cycle) is not a new command.
+                if target != self._written:
+                    self._written = target
+                    self._commandWritten(target)
+                busy = True
+            waiting = port.in_waiting
+            if waiting:
+                self._incoming += port.read(waiting)
+                read = time.perf_counter()
+                busy = True
+        except (OSError, serial.SerialException) as error:
+            _log.error("Device::poll : %s %s", self.port, error)
+            self.Signal.Error.emit(str(error))
+            self.close()
+            return False
+        if busy and b"\n" in self._incoming:
+            lines = self._incoming.split(b"\n")
+            self._incoming = lines.pop()
+            self.counters.add(Counters.LinesRead, len(lines))
+            total = self.buffer.total()
+            for line in lines:
+                self.processLine(line, read)
+            count = self.buffer.total() - total
+            if count:
+                self.counters.add(Counters.SamplesPublished, count)
+                for callback in self._batch_callbacks:
+                    callback(self, count)
+        return busy
+
+    def _commandWritten(self, text:str) -> None:
+        self.volume.command(text)
+        if self.latency is not None:
+            self.latency.command(text, time.perf_counter())
+        for callback in self._command_callbacks:
+            callback(self, time.time(), text)
+
+    def processLine(self, line:bytes, read:float=None) -> None:
+        kind, content = LineParser.parse(line)
+        if kind == LineParser.Value:
+            # NOTE: a printed value ends a firmware cycle, the next one reads a new target.
+            self._cycle_written = False
+            parsed = time.perf_counter()
+            value = self.filter(self.calibration(content))
+            self.statistics(value)
+            calibrated = time.perf_counter()
+            sample = Sample(time.time(), content, value, self._setpoint, self._limits, self.volume.update(content, self._limits))
+            self.publish(sample, (parsed if read is None else read, parsed, calibrated))
+        elif kind == LineParser.Steps:
+            self.volume.counter(content)
+        elif kind == LineParser.Limit:
+            limits = LineParser.updateLimits(self._limits, content)
+            if limits != self._limits:
+                self._limits = limits
+                self.Signal.LimitsChanged.emit(limits)
+        elif content:
+            self.counters.add(Counters.ParseErrors)
+            _log.warning("Device::processLine : %s unable to parse -> %s", self.port, content)
+
+    def publish(self, sample:Sample, stamps:tuple=None) -> None:
+        """
+        Stores and hands out a sample. `stamps` are the (read, parse,
+        calibrate) `time.perf_counter` stamps of it (now when not given).
+        """
+        last = self._last
+        self._last = sample
+        self.buffer.append(*sample)
+        self.curve.update(sample.volume, sample.value)
+        for callback in self._sample_callbacks:
+            callback(self, sample)
+        latency = self.latency
+        if latency is not None:
+            # NOTE: before the signal, the GUI takes the stamps back when it is delivered.
+            now = time.perf_counter()
+            stamps = stamps if stamps is not None else (now, now, now)
+            latency.record(*stamps, now)
+            latency.sample(sample.value, stamps[0])
+        self.Signal.ValuePressureChanged.emit(sample.value)
+        emits = 1
+        if last is None or last.volume != sample.volume:
+            self.Signal.ValueVolumeChanged.emit(sample.volume)
+            emits = 2
+        self.counters.add(Counters.SignalEmits, emits)
@@ -0,0 +1,209 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+from threading import Thread, Event, Lock, current_thread
+from typing import Dict, List
+
+# Qt libraries
+from PyQt5 import QtCore
+
+# Local libraries
+from .Device import Device
+from .Calibration import Calibration
+from .Filters import FilterPipeline
+from .Volume import VolumeEstimator, PistonGeometry
+
+
+class DeviceManagerSignal(QtCore.QObject):
+    DeviceAdded: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    DeviceRemoved: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    DeviceStateChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str, bool)
+    ValuePressureChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str, float)
+    ValueVolumeChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str, float)
+    LimitsChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str, int)
+
+    def __init__(self):
+        QtCore.QObject.__init__(self)
+
+
+class IOWorker:
+    """
+    A thread polling a group of devices. When none of them had anything to do
+    it sleeps for `interval` seconds (so an idle worker costs close to nothing).
+    """
+    def __init__(self, name:str, interval:float=0.005) -> None:
+        self._name: str = name
+        self._interval: float = interval
+        self._devices: List[Device] = []
+        self._lock: Lock = Lock()
+        self._event: Event = Event()
+        self._thread: Thread = None
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def add(self, device:Device) -> None:
+        with self._lock:
+            self._devices = self._devices + [device]
+        if self._thread is None:
+            self._event = Event()
+            self._thread = Thread(target=self._run, args=(self._event,), name=self._name, daemon=True)
+            self._thread.start()
+
+    def remove(self, device:Device) -> None:
+        with self._lock:
+            self._devices = [d for d in self._devices if d is not device]
+            stop = len(self._devices) == 0
+        if stop:
+            self.stop()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._event.set()
+            # NOTE: a device closing itself from the worker can't join its own thread.
+            if self._thread is not current_thread():
+                self._thread.join()
+            self._thread = None
+
+    def _run(self, event:Event) -> None:
+        while not event.is_set():
+            busy = False
+            # NOTE: the list is replaced (never mutated) so iterating a reference is safe.
+            for device in self._devices:
+                busy = device.poll() or busy
+            if not busy:
+                event.wait(self._interval)
+
+
+class DeviceManager:
+    """
+    The `DeviceManager` keeps all the devices (controllers) of this process,
+    one per COM port, and shares a small pool of I/O workers between the open
+    ones (so the number of threads doesn't grow with the number of rigs).
+    """
+    def __init__(self, workers:int=1, interval:float=0.005) -> None:
+        # NOTE: signal class (emitted when devices are added, removed or publish data)
+        self.Signal: DeviceManagerSignal = DeviceManagerSignal()
+
+        self._devices: Dict[str, Device] = {}
+        self._workers: List[IOWorker] = [IOWorker("IOWorker-" + str(i), interval) for i in range(max(1, workers))]
+        self._assignment: Dict[str, IOWorker] = {}
+        self._filter: str = ""
+        self._geometry: PistonGeometry = PistonGeometry()
+
+    def ports(self) -> List[str]:
+        return list(self._devices.keys())
+
+    def devices(self) -> List[Device]:
+        return list(self._devices.values())
+
+    def device(self, port:str) -> Device:
+        return self._devices.get(port)
+
+    def addDevice(self, port:str, calibration:Calibration=None, baudrate:int=9600) -> Device:
+        """
+        Registers a device on `port` (returns the existing one if already registered).
+        """
+        if port in self._devices:
+            return self._devices[port]
+        device = Device(port, calibration=calibration, baudrate=baudrate, filter=FilterPipeline.fromSpec(self._filter), volume=VolumeEstimator(self._geometry))
+        device.Signal.ValuePressureChanged.connect(lambda value, port=port: self._onValuePressureChanged(port, value))
+        device.Signal.ValueVolumeChanged.connect(lambda value, port=port: self.Signal.ValueVolumeChanged.emit(port, value))
+        device.Signal.LimitsChanged.connect(lambda limits, port=port: self.Signal.LimitsChanged.emit(port, limits))
+        device.Signal.StateChanged.connect(lambda flag, port=port: self._onStateChanged(port, flag))
+        self._devices[port] = device
+        self.Signal.DeviceAdded.emit(port)
+        return device
+
+    def filter(self) -> str:
+        return self._filter
+
+    def setFilter(self, spec:str) -> None:
+        """
+        Sets the filter pipeline (see `FilterPipeline.fromSpec`) of all devices,
+        each one gets its own (fresh) filter state. Raises `ValueError` if the
+        spec is invalid (nothing is changed then).
+        """
+        FilterPipeline.fromSpec(spec)
+        self._filter = spec or ""
+        for device in self.devices():
+            device.filter = FilterPipeline.fromSpec(self._filter)
+
+    def geometry(self) -> PistonGeometry:
+        return self._geometry
+
+    def setGeometry(self, geometry:PistonGeometry) -> None:
+        """
+        Sets the piston geometry used to turn steps into volume (all devices).
+        """
+        self._geometry = geometry
+        for device in self.devices():
+            device.volume.setGeometry(geometry)
+
+    def removeDevice(self, port:str) -> None:
+        if port in self._devices:
+            self.close(port)
+            del self._devices[port]
+            self.Signal.DeviceRemoved.emit(port)
+
+    def open(self, port:str) -> Device:
+        """
+        Opens the device on `port` and hands it to the least busy worker.
+        Raises `OSError` if the port can't be opened.
+        """
+        device = self._devices[port]
+        if not device.isOpen():
+            device.open()
+            worker = min(self._workers, key=len)
+            self._assignment[port] = worker
+            worker.add(device)
+        return device
+
+    def close(self, port:str) -> None:
+        device = self._devices.get(port)
+        if device is None:
+            return
+        worker = self._assignment.pop(port, None)
+        if worker is not None:
+            worker.remove(device)
+        device.close()
+
+    def closeAll(self) -> None:
+        for port in self.ports():
+            self.close(port)
+
+    def _onValuePressureChanged(self, port:str, value:float) -> None:
+        self.Signal.ValuePressureChanged.emit(port, value)
+        # NOTE: the widgets (connected directly) have taken the value by now.
+        device = self._devices.get(port)
+        if device is not None and device.latency is not None:
+            device.latency.displayed()
+
+    def _onStateChanged(self, port:str, flag:bool) -> None:
+        # NOTE: a device closed by its worker (e.g. cable unplugged) must leave the pool too.
+        if not flag and port in self._assignment:
+            self._assignment.pop(port).remove(self._devices[port])
+        self.Signal.DeviceStateChanged.emit(port, flag)
@@ -0,0 +1,403 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+# Python libraries
+from bisect import bisect_left, insort
+from collections import deque
+from typing import Dict, List
+
+# Third party libraries
+import numpy as np
+
+
+def _first_order(x:np.ndarray, alpha:float, y0:float) -> np.ndarray:
+    """
+    Vectorized y[k] = alpha*x[k] + (1 - alpha)*y[k - 1] (y[-1] = y0). The
+    recursion is solved in blocks with a small triangular matrix, so numpy does
+    the work and the powers of (1 - alpha) never underflow across a block.
+    """
+    size, block = len(x), 64
+    y = np.empty(size, dtype=np.float64)
+    decay = 1.0 - alpha
+    k = np.arange(block)
+    powers = decay**(k + 1)
+    with np.errstate(under="ignore"):
+        matrix = np.tril(alpha*decay**np.subtract.outer(k, k).clip(0))
+    for start in range(0, size, block):
+        stop = min(start + block, size)
+        n = stop - start
+        y[start:stop] = matrix[:n, :n] @ x[start:stop] + powers[:n]*y0
+        y0 = y[stop - 1]
+    return y
+
+
+class Filter:
+    """
+    A streaming filter stage. Calling it with one value returns the filtered
+    value in O(1) (amortized) and `evaluate` is the vectorized equivalent for
+    a whole array, as if the stage had just been reset.
+    """
+    Name: str = None
+
+    def reset(self) -> None:
+        pass
+
+    def __call__(self, value:float) -> float:
+        return value
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        return np.asarray(values, dtype=np.float64).copy()
+
+    def spec(self) -> str:
+        return self.Name
+
+
+class _WindowFilter(Filter):
+    def __init__(self, window:int=5) -> None:
+        if int(window) < 1:
+            raise ValueError("Filter window must be at least 1: " + str(window))
+        self._window: int = int(window)
+        self.reset()
+
+    def spec(self) -> str:
+        return self.Name + ":" + str(self._window)
+
+    def _rolling(self, values:np.ndarray, function, nanfunction) -> np.ndarray:
+        """
+        Applies `function` to every (full) window of `values`. The first
+        samples see a shorter window, like the streaming version, so they are
+        padded with NaN and go through the (slower) `nanfunction`.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        size, window = len(values), self._window
+        result = np.empty(size, dtype=np.float64)
+        head = min(window - 1, size)
+        if head > 0:
+            padded = np.concatenate([np.full(window - 1, np.nan), values[:head]])
+            result[:head] = nanfunction(np.lib.stride_tricks.sliding_window_view(padded, window), axis=1)
+        if size >= window:
+            result[head:] = function(np.lib.stride_tricks.sliding_window_view(values, window), axis=1)
+        return result
+
+
+class MovingAverage(_WindowFilter):
+    Name: str = "average"
+
+    def reset(self) -> None:
+        self._values: deque = deque()
+        self._sum: float = 0.0
+
+    def __call__(self, value:float) -> float:
+        self._values.append(value)
+        self._sum += value
+        if len(self._values) > self._window:
+            self._sum -= self._values.popleft()
+        return self._sum/len(self._values)
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        total = np.concatenate([[0.0], np.cumsum(values)])
+        index = np.arange(1, len(values) + 1)
+        lower = np.maximum(index - self._window, 0)
+        return (total[index] - total[lower])/(index - lower)
+
+
+class MovingMedian(_WindowFilter):
+    """
+    Median of the last `window` samples. Keeps the window sorted, so each
+    sample costs a binary search plus a (tiny, for the usual 3 to 15 samples)
+    memory move.
+    """
+    Name: str = "median"
+
+    def reset(self) -> None:
+        self._values: deque = deque()
+        self._sorted: List[float] = []
+
+    def __call__(self, value:float) -> float:
+        self._values.append(value)
+        insort(self._sorted, value)
+        if len(self._values) > self._window:
+            del self._sorted[bisect_left(self._sorted, self._values.popleft())]
+        size = len(self._sorted)
+        middle = size//2
+        if size%2:
+            return self._sorted[middle]
+        return (self._sorted[middle - 1] + self._sorted[middle])/2
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        return self._rolling(values, np.median, np.nanmedian)
+
+
+class ExponentialAverage(Filter):
+    Name: str = "ema"
+
+    def __init__(self, alpha:float=0.2) -> None:
+        if not 0.0 < float(alpha) <= 1.0:
+            raise ValueError("EMA alpha must be in ]0, 1]: " + str(alpha))
+        self._alpha: float = float(alpha)
+        self.reset()
+
+    def reset(self) -> None:
+        self._value: float = None
+
+    def spec(self) -> str:
+        return self.Name + ":" + str(self._alpha)
+
+    def __call__(self, value:float) -> float:
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self._alpha*(value - self._value)
+        return self._value
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return values.copy()
+        return _first_order(values, self._alpha, values[0])
+
+
+class Kalman(Filter):
+    """
+    Scalar Kalman filter for a slowly varying pressure (random walk model)
+    with `process` and `measurement` noise variances.
+    """
+    Name: str = "kalman"
+
+    def __init__(self, process:float=0.01, measurement:float=1.0) -> None:
+        if float(process) <= 0.0 or float(measurement) <= 0.0:
+            raise ValueError("Kalman noise variances must be positive: " + str(process) + ", " + str(measurement))
+        self._process: float = float(process)
+        self._measurement: float = float(measurement)
+        self.reset()
+
+    def reset(self) -> None:
+        self._value: float = None
+        self._variance: float = self._measurement
+
+    def spec(self) -> str:
+        return self.Name + ":" + str(self._process) + ":" + str(self._measurement)
+
+    def __call__(self, value:float) -> float:
+        if self._value is None:
+            self._value = value
+            return value
+        variance = self._variance + self._process
+        gain = variance/(variance + self._measurement)
+        self._value += gain*(value - self._value)
+        self._variance = (1.0 - gain)*variance
+        return self._value
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        result = np.empty(len(values), dtype=np.float64)
+        if len(values) == 0:
+            return result
+        # NOTE: the gain doesn't depend on the data and converges in a few
+        # samples, after that the filter is a plain first order recursion.
+        state = Kalman(self._process, self._measurement)
+        i, gain = 0, None
+        while i < len(values):
+            before = state._variance
+            result[i] = state(values[i])
+            i += 1
+            if i > 1 and abs(state._variance - before) <= 1e-12*before:
+                variance = state._variance + self._process
+                gain = variance/(variance + self._measurement)
+                break
+        if i < len(values):
+            result[i:] = _first_order(values[i:], gain, result[i - 1])
+        return result
+
+
+class RollingStd(_WindowFilter):
+    """
+    Standard deviation of the last `window` samples (Welford update with the
+    oldest sample removed, so it doesn't drift like a sum of squares).
+    """
+    Name: str = "std"
+
+    def reset(self) -> None:
+        self._values: deque = deque()
+        self._mean: float = 0.0
+        self._m2: float = 0.0
+
+    def __call__(self, value:float) -> float:
+        self._values.append(value)
+        count = len(self._values)
+        delta = value - self._mean
+        self._mean += delta/count
+        self._m2 += delta*(value - self._mean)
+        if count > self._window:
+            old = self._values.popleft()
+            count -= 1
+            delta = old - self._mean
+            self._mean -= delta/count
+            self._m2 -= delta*(old - self._mean)
+        return (max(self._m2, 0.0)/count)**0.5
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        return self._rolling(values, np.std, np.nanstd)
+
+
+class RollingMin(_WindowFilter):
+    """
+    Minimum of the last `window` samples (monotonic queue, amortized O(1)).
+    """
+    Name: str = "min"
+
+    def reset(self) -> None:
+        self._queue: deque = deque()
+        self._count: int = 0
+
+    def _better(self, a:float, b:float) -> bool:
+        return a <= b
+
+    def __call__(self, value:float) -> float:
+        while self._queue and self._better(value, self._queue[-1][1]):
+            self._queue.pop()
+        self._queue.append((self._count, value))
+        if self._queue[0][0] <= self._count - self._window:
+            self._queue.popleft()
+        self._count += 1
+        return self._queue[0][1]
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        return self._rolling(values, np.min, np.nanmin)
+
+
+class RollingMax(RollingMin):
+    """
+    Maximum of the last `window` samples (monotonic queue, amortized O(1)).
+    """
+    Name: str = "max"
+
+    def _better(self, a:float, b:float) -> bool:
+        return a >= b
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        return self._rolling(values, np.max, np.nanmax)
+
+
+FILTERS: Dict[str, type] = {cls.Name: cls for cls in [MovingAverage, MovingMedian, ExponentialAverage, Kalman]}
+# NOTE: rolling statistics describe the value, they never replace it (see `RollingStatistics`).
+STATISTICS: Dict[str, type] = {cls.Name: cls for cls in [RollingStd, RollingMin, RollingMax]}
+
+
+class RollingStatistics:
+    """
+    Rolling std, min and max of the last `window` (filtered) values, published
+    next to the value (see `Device.statistics`) rather than as filter stages.
+    """
+    def __init__(self, window:int=20) -> None:
+        self._stages: List[Filter] = [cls(window) for cls in STATISTICS.values()]
+        self._values: Dict[str, float] = {}
+
+    def reset(self) -> None:
+        for stage in self._stages:
+            stage.reset()
+        self._values = {}
+
+    def __call__(self, value:float) -> None:
+        self._values = {stage.Name: stage(value) for stage in self._stages}
+
+    def values(self) -> Dict[str, float]:
+        """
+        The latest statistics by name (empty before the first value).
+        """
+        return self._values
+
+    def evaluate(self, values:np.ndarray) -> Dict[str, np.ndarray]:
+        """
+        Vectorized version (for replaying recorded data).
+        """
+        return {stage.Name: stage.evaluate(values) for stage in self._stages}
+
+
+class FilterPipeline:
+    """
+    A chain of filter stages applied to every calibrated value before it's
+    published (an empty pipeline returns the value untouched).
+
+    Pipelines are described by a spec string, stages separated by commas and
+    parameters by colons, e.g. `median:5, ema:0.2` or `kalman:0.01:1`.
+    """
+    def __init__(self, stages:List[Filter]=None) -> None:
+        self._stages: List[Filter] = list(stages) if stages is not None else []
+
+    def __len__(self) -> int:
+        return len(self._stages)
+
+    def stages(self) -> List[Filter]:
+        return list(self._stages)
+
+    def spec(self) -> str:
+        return ", ".join(stage.spec() for stage in self._stages)
+
+    def reset(self) -> None:
+        for stage in self._stages:
+            stage.reset()
+
+    def __call__(self, value:float) -> float:
+        for stage in self._stages:
+            value = stage(value)
+        return value
+
+    def evaluate(self, values:np.ndarray) -> np.ndarray:
+        """
+        Vectorized version (for replaying recorded data).
+        """
+        values = np.asarray(values, dtype=np.float64)
+        for stage in self._stages:
+            values = stage.evaluate(values)
+        return values
+
+    @staticmethod
+    def fromSpec(spec:str) -> "FilterPipeline":
+        """
+        Builds a pipeline from its spec string. Raises `ValueError` on unknown
+        stages or bad parameters.
+        """
+        stages = []
+        for item in (spec or "").split(","):
+            item = item.strip()
+            if not item or item.lower() == "none":
+                continue
+            name, *params = [part.strip() for part in item.split(":")]
+            if name.lower() in STATISTICS:
+                raise ValueError("Not a filter (published as a statistic next to the value): " + name)
+            if name.lower() not in FILTERS:
+                raise ValueError("Unknown filter: " + name)
+            try:
+                params = [float(param) for param in params]
+            except ValueError:
+                raise ValueError("Invalid filter parameters: " + item)
+            try:
+                stages.append(FILTERS[name.lower()](*params))
+            except TypeError:
+                raise ValueError("Invalid filter parameters: " + item)
+        return FilterPipeline(stages)
@@ -0,0 +1,236 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import json
+import time
+from collections import deque
+from typing import Dict, List, Tuple
+
+# Third party libraries
+import numpy as np
+
+# Local libraries
+from .Volume import parse_target
+
+
+class LatencyHistogram:
+    """
+    HDR style histogram of latencies in fixed memory: microsecond counts are
+    exact below 2**(`bits` + 1), above that every power of two is split in
+    2**`bits` buckets (so about 3 % precision with the default 5 bits), up to
+    2**`top` microseconds (larger ones go to the last bucket).
+
+    Meant for one writer thread (the counts are a plain list), any thread
+    may read.
+    """
+    def __init__(self, bits:int=5, top:int=36) -> None:
+        self._bits: int = bits
+        self._half: int = 1 << bits
+        self._linear: int = 2 << bits
+        self._size: int = self._linear + (top - bits)*self._half
+        self._counts: List[int] = [0]*self._size
+        self._total: int = 0
+        self._sum: float = 0.0
+        self._max: float = 0.0
+
+    def __len__(self) -> int:
+        return self._total
+
+    def index(self, microseconds:int) -> int:
+        if microseconds < self._linear:
+            return max(microseconds, 0)
+        shift = microseconds.bit_length() - self._bits - 1
+        return min(self._linear + (shift - 1)*self._half + (microseconds >> shift) - self._half, self._size - 1)
+
+    def lower(self, index:int) -> int:
+        """
+        Smallest value (microseconds) of bucket `index`.
+        """
+        if index < self._linear:
+            return index
+        shift, offset = divmod(index - self._linear, self._half)
+        return (self._half + offset) << (shift + 1)
+
+    def record(self, seconds:float) -> None:
+        self._counts[self.index(int(seconds*1e6))] += 1
+        self._total += 1
+        self._sum += seconds
+        if seconds > self._max:
+            self._max = seconds
+
+    def reset(self) -> None:
+        self._counts = [0]*self._size
+        self._total = 0
+        self._sum = 0.0
+        self._max = 0.0
+
+    def mean(self) -> float:
+        return self._sum/self._total if self._total > 0 else 0.0
+
+    def maximum(self) -> float:
+        return self._max
+
+    def percentiles(self, percents:List[float]) -> List[float]:
+        """
+        Latencies (seconds, at the middle of their bucket) below which the
+        given percentages of the records fall.
+        """
+        counts = np.array(self._counts, dtype=np.int64)
+        total = int(counts.sum())
+        if total == 0:
+            return [0.0 for _ in percents]
+        cumulative = np.cumsum(counts)
+        result = []
+        for percent in percents:
+            index = int(np.searchsorted(cumulative, max(1, int(np.ceil(percent/100.0*total)))))
+            low, high = self.lower(index), self.lower(index + 1) if index + 1 < self._size else self.lower(index)
+            result.append(min((low + high)/2.0*1e-6, self._max))
+        return result
+
+    def summary(self, percents:Tuple[float, ...]=(50.0, 90.0, 99.0, 99.9)) -> Dict[str, float]:
+        summary = {"count": self._total, "mean": float(self.mean()), "max": float(self._max)}
+        for percent, value in zip(percents, self.percentiles(list(percents))):
+            summary["p" + format(percent, "g")] = value
+        return summary
+
+
+class LatencyTracker:
+    """
+    Per stage latencies of the samples of one device. Each sample is stamped
+    (`time.perf_counter`) when read from the port, parsed, calibrated (and
+    filtered), published (buffer and callbacks) and shown by the widgets;
+    every stage keeps the histogram of the time since the previous one, and
+    `total` the one from read to display.
+
+    The I/O worker records the first stages, the GUI thread the display one:
+    `record` queues the read stamp of every sample emitted to the GUI and
+    `displayed` takes them back in the same (queued signal) order.
+
+    Commands are followed too: the time from writing one to the first sample
+    that moved more than `response` units (`<kind> response`) and, for
+    targets, to the first sample within ±`band` of it (`target settled`).
+    The last `commands` written are followed at once (a FIFO, so a new target
+    from continuous control doesn't hide the response to the previous ones);
+    a command without response after `timeout` seconds (or pushed out of the
+    FIFO) is dropped.
+    """
+    Stages: Tuple[str, ...] = ("parse", "calibrate", "publish", "display", "total")
+    Responses: Tuple[str, ...] = ("target response", "target settled", "fill response", "empty response")
+    # NOTE: command -> kind (any other one is a target, 0 stops the motor).
+    Commands: Dict[str, str] = {"X": "empty", "Y": "fill"}
+
+    def __init__(self, pending:int=4096, response:float=1.0, band:float=1.5, timeout:float=120.0, commands:int=8) -> None:
+        self.histograms: Dict[str, LatencyHistogram] = {name: LatencyHistogram() for name in self.Stages + self.Responses}
+        self._pending: deque = deque(maxlen=pending)
+        self._last: Tuple[float, float] = None
+        self._response: float = response
+        self._band: float = band
+        self._timeout: float = timeout
+        # NOTE: oldest first, each one [kind, written, target, value when written, responded]
+        self._commands: deque = deque(maxlen=commands)
+        self._value: float = None
+
+    def record(self, read:float, parse:float, calibrate:float, publish:float) -> None:
+        """
+        Stamps of one sample (called from the I/O worker).
+        """
+        histograms = self.histograms
+        histograms["parse"].record(parse - read)
+        histograms["calibrate"].record(calibrate - parse)
+        histograms["publish"].record(publish - calibrate)
+        self._pending.append((read, publish))
+
+    def command(self, text:str, written:float) -> None:
+        """
+        A command was written to the port (called from the I/O worker).
+        """
+        kind = self.Commands.get(text.strip())
+        target = None
+        if kind is None:
+            kind, target = "target", parse_target(text)
+            if target == 0:
+                return
+        self._commands.append([kind, written, target, self._value, False])
+
+    def sample(self, value:float, read:float) -> None:
+        """
+        A sample read at `read` was published (called from the I/O worker).
+        """
+        self._value = value
+        commands = self._commands
+        if not commands:
+            return
+        done = []
+        for command in commands:
+            kind, written, target, start, responded = command
+            elapsed = read - written
+            if elapsed > self._timeout:
+                done.append(command)
+                continue
+            if not responded and start is not None and abs(value - start) > self._response:
+                self.histograms[kind + " response"].record(elapsed)
+                command[4] = True
+                if target is None:
+                    done.append(command)
+            if target is not None and abs(value - target) <= self._band:
+                self.histograms["target settled"].record(elapsed)
+                done.append(command)
+        for command in done:
+            commands.remove(command)
+
+    def displayed(self) -> None:
+        """
+        The widgets have shown the oldest published sample (GUI thread).
+        """
+        if self._pending:
+            read, publish = self._pending.popleft()
+            now = time.perf_counter()
+            self.histograms["display"].record(now - publish)
+            self.histograms["total"].record(now - read)
+            self._last = (read, now)
+
+    def staleness(self) -> float:
+        """
+        Age (seconds) of the reading shown right now (from the port read), 0
+        if nothing was shown yet.
+        """
+        if self._last is None:
+            return 0.0
+        return time.perf_counter() - self._last[0]
+
+    def reset(self) -> None:
+        for histogram in self.histograms.values():
+            histogram.reset()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {stage: histogram.summary() for stage, histogram in self.histograms.items()}
+
+    def dump(self, path:str, name:str=None) -> None:
+        """
+        Writes the summary of every stage (seconds) to a JSON file.
+        """
+        with open(path, "w") as fid:
+            json.dump({"name": name, "time": time.time(), "stages": self.summary()}, fid, indent=2)
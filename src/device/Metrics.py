@@ -0,0 +1,206 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import time
+from threading import Thread
+from typing import TYPE_CHECKING, Callable, Dict, List, Tuple
+if TYPE_CHECKING:
+    # NOTE: imported when the endpoint is turned on (see `MetricsServer.start`).
+    from http.server import ThreadingHTTPServer
+
+# Optional libraries
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Local libraries
+from src.utils import Counters
+from .DeviceManager import DeviceManager
+
+
+def resident_memory() -> float:
+    """
+    Resident memory of this process (bytes), None if it can't be known.
+    """
+    if psutil is not None:
+        return float(psutil.Process().memory_info().rss)
+    try:
+        with open("/proc/self/statm", "r") as fid:
+            return float(fid.read().split()[1])*os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError, IndexError):
+        return None
+
+
+def _label(value:str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+class MetricsWriter:
+    """
+    Builds a page in the Prometheus text exposition format.
+    """
+    def __init__(self, prefix:str="cpv_") -> None:
+        self._prefix: str = prefix
+        self._lines: List[str] = []
+
+    def add(self, name:str, kind:str, text:str, values:List[Tuple[Dict[str, str], float]]) -> None:
+        """
+        One metric (`kind` is counter or gauge) with its (labels, value)
+        samples, samples with a None value are left out.
+        """
+        name = self._prefix + name
+        self._lines.append("# HELP " + name + " " + text)
+        self._lines.append("# TYPE " + name + " " + kind)
+        for labels, value in values:
+            if value is None:
+                continue
+            label = ",".join(key + "=\"" + _label(item) + "\"" for key, item in labels.items())
+            self._lines.append(name + ("{" + label + "}" if label else "") + " " + repr(float(value)))
+
+    def text(self) -> str:
+        return "\n".join(self._lines) + "\n"
+
+
+class MetricsServer:
+    """
+    Tiny HTTP endpoint (`/metrics`, served from a background thread) with
+    the acquisition health of all the devices in the Prometheus text format:
+    samples and sample rate, command queue depth, lines read and parse
+    errors, connections, last sample age, setpoint, pressure and volume,
+    and the hot path counters of each device (all labelled by port), plus
+    the process memory, the interface `counters` and the extra `gauges`
+    given (name -> (help, callable)).
+
+    Bound to `host` (this machine only by default).
+    """
+    DeviceCounters: Tuple[str, ...] = (Counters.LinesRead, Counters.ParseErrors, Counters.SamplesDropped, Counters.CommandsDropped, Counters.SignalEmits)
+    InterfaceCounters: Tuple[str, ...] = (Counters.WidgetRepaints, Counters.GuiStalls)
+
+    def __init__(self, devices:DeviceManager, gauges:Dict[str, Tuple[str, Callable[[], float]]]=None, host:str="127.0.0.1", window:int=50, counters:Counters=None) -> None:
+        self._devices: DeviceManager = devices
+        self._counters: Counters = counters if counters is not None else Counters()
+        self._gauges: Dict[str, Tuple[str, Callable[[], float]]] = gauges if gauges is not None else {}
+        self._host: str = host
+        self._window: int = window
+        self._server: "ThreadingHTTPServer" = None
+        self._thread: Thread = None
+
+    def port(self) -> int:
+        return self._server.server_address[1] if self._server is not None else 0
+
+    def start(self, port:int) -> None:
+        """
+        Serves on `port` (0 stops the endpoint). Raises `OSError` if the port
+        can't be bound.
+        """
+        self.stop()
+        if port <= 0:
+            return
+        # NOTE: imported when turned on (it is off by default and http.server is slow to import).
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                if self.path.split("?")[0] not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = metrics.text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format:str, *args) -> None:
+                # NOTE: scrapes every few seconds, the log doesn't need them.
+                pass
+
+        self._server = ThreadingHTTPServer((self._host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True)
+        self._thread.start()
+        print("MetricsServer::start : serving on http://" + self._host + ":" + str(self.port()) + "/metrics")
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
+
+    def text(self) -> str:
+        """
+        The current metrics page (called from the server threads).
+        """
+        now = time.time()
+        devices = self._devices.devices()
+        samples, rates, queues, connections, states, ages, setpoints, pressures, volumes = [], [], [], [], [], [], [], [], []
+        statistics = {"std": [], "min": [], "max": []}
+        counters = {name: [] for name in self.DeviceCounters}
+        for device in devices:
+            labels = {"port": device.port}
+            samples.append((labels, device.buffer.total()))
+            times = device.buffer.latest(self._window)["time"]
+            span = times[-1] - times[0] if len(times) > 1 else 0.0
+            rates.append((labels, (len(times) - 1)/span if span > 0 and now - times[-1] < span else 0.0))
+            queues.append((labels, device.pending()))
+            connections.append((labels, device.connections()))
+            states.append((labels, 1.0 if device.isOpen() else 0.0))
+            last = device.last()
+            if last is not None:
+                ages.append((labels, now - last.time))
+                pressures.append((labels, last.value))
+                volumes.append((labels, last.volume))
+            for name, value in device.statistics.values().items():
+                statistics[name].append((labels, value))
+            setpoints.append((labels, device.setpoint()))
+            for name in self.DeviceCounters:
+                counters[name].append((labels, device.counters.get(name)))
+
+        writer = MetricsWriter()
+        writer.add("samples_total", "counter", "Samples published.", samples)
+        writer.add("sample_rate_hz", "gauge", "Samples per second over the last samples (0 when stalled).", rates)
+        writer.add("command_queue_depth", "gauge", "Commands waiting to be written to the port.", queues)
+        writer.add("connections_total", "counter", "Times the port was opened (reconnections are this minus one).", connections)
+        writer.add("connected", "gauge", "1 while the port is open.", states)
+        writer.add("last_sample_age_seconds", "gauge", "Time since the last sample.", ages)
+        writer.add("setpoint", "gauge", "Last target sent.", setpoints)
+        writer.add("pressure", "gauge", "Last calibrated pressure.", pressures)
+        writer.add("volume_cm3", "gauge", "Injected volume.", volumes)
+        for name, values in statistics.items():
+            writer.add("pressure_" + name, "gauge", "Rolling " + name + " of the calibrated pressure.", values)
+        for name, values in counters.items():
+            writer.add(name.replace(" ", "_") + "_total", "counter", "Hot path counter (" + name + ").", values)
+        for name in self.InterfaceCounters:
+            writer.add(name.replace(" ", "_") + "_total", "counter", "Interface counter (" + name + ").", [({}, self._counters.get(name))])
+        for name, (text, gauge) in self._gauges.items():
+            writer.add(name, "gauge", text, [({}, gauge())])
+        writer.add("process_resident_memory_bytes", "gauge", "Resident memory of the process.", [({}, resident_memory())])
+        return writer.text()
@@ -0,0 +1,87 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+from typing import Tuple
+
+
+class LineParser:
+    """
+    Parses the lines sent by the controller firmware.
+
+    Every line is either a (raw) pressure reading, one of the limit switch
+    messages (`IC_H`, `IC_L`, `FC_H`, `FC_L`) or, on firmware that counts
+    them, the stepper position (`S:<steps>`).
+    """
+    Value: int = 0
+    Limit: int = 1
+    Invalid: int = 2
+    Steps: int = 3
+
+    StepsPrefix: str = "S:"
+
+    # NOTE: limit switch flags (bitwise, so both can be active at once)
+    LimitNone: int = 0
+    LimitBeginning: int = 1
+    LimitEnd: int = 2
+
+    # NOTE: message -> (flag, active)
+    _limits: dict = {
+        "IC_H": (LimitBeginning, True),
+        "IC_L": (LimitBeginning, False),
+        "FC_H": (LimitEnd, True),
+        "FC_L": (LimitEnd, False),
+    }
+
+    @staticmethod
+    def parse(line:bytes) -> Tuple[int, object]:
+        """
+        Returns a tuple with the kind of line and its content. For values the
+        content is a float, for limits a tuple (flag, active), for steps an int
+        and for invalid lines the decoded text.
+        """
+        text = line.strip().decode("ascii", "replace")
+        limit = LineParser._limits.get(text)
+        if limit is not None:
+            return LineParser.Limit, limit
+        if text.startswith(LineParser.StepsPrefix):
+            try:
+                return LineParser.Steps, int(text[len(LineParser.StepsPrefix):])
+            except ValueError:
+                return LineParser.Invalid, text
+        try:
+            return LineParser.Value, float(text)
+        except ValueError:
+            return LineParser.Invalid, text
+
+    @staticmethod
+    def updateLimits(limits:int, content:Tuple[int, bool]) -> int:
+        """
+        Returns the new limit switch flags given a parsed limit message.
+        """
+        flag, active = content
+        if active:
+            return limits | flag
+        return limits & ~flag
@@ -0,0 +1,275 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+# Python libraries
+import math
+from collections import deque
+from threading import Condition
+from typing import Dict, NamedTuple
+
+# Local libraries
+from .Device import Device, Sample
+
+
+class RollingRegression:
+    """
+    Least squares line over the last `window` (time, value) points, or over
+    the points covering the last `span` seconds when given, updated in O(1)
+    per point from running sums. The sums are rebuilt from the window every
+    now and then (moving the time origin to the oldest point) so rounding
+    errors can't pile up.
+    """
+    def __init__(self, window:int=50, span:float=None) -> None:
+        self._window: int = window
+        self._span: float = span
+        self.reset()
+
+    def reset(self, origin:float=None) -> None:
+        self._origin: float = origin
+        self._points: deque = deque()
+        self._updates: int = 0
+        self._sums: list = [0.0]*5
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def isFull(self) -> bool:
+        if self._span is None:
+            return len(self._points) >= self._window
+        return len(self._points) >= 3 and self._points[-1][0] - self._points[0][0] >= self._span
+
+    def first(self) -> float:
+        return self._points[0][0] + self._origin
+
+    def append(self, time:float, value:float) -> None:
+        # NOTE: times relative to the origin (absolute epoch times would cancel out in the sums).
+        if self._origin is None:
+            self._origin = time
+        t = time - self._origin
+        self._points.append((t, value))
+        self._add(t, value, 1.0)
+        if self._span is None:
+            if len(self._points) > self._window:
+                self._add(*self._points.popleft(), -1.0)
+        else:
+            # NOTE: keeps the newest point at least `span` seconds old, the window always covers `span`.
+            while len(self._points) > 2 and t - self._points[1][0] >= self._span:
+                self._add(*self._points.popleft(), -1.0)
+        self._updates += 1
+        if self._updates >= 16*max(len(self._points), 1):
+            self._updates = 0
+            self._sums = [0.0]*5
+            shift = self._points[0][0]
+            self._origin += shift
+            self._points = deque((t - shift, value) for t, value in self._points)
+            for point in self._points:
+                self._add(*point, 1.0)
+
+    def _add(self, t:float, value:float, sign:float) -> None:
+        sums = self._sums
+        sums[0] += sign*t
+        sums[1] += sign*value
+        sums[2] += sign*t*t
+        sums[3] += sign*t*value
+        sums[4] += sign*value*value
+
+    def mean(self) -> float:
+        return self._sums[1]/len(self._points) if self._points else 0.0
+
+    def slope(self) -> float:
+        n = len(self._points)
+        st, sy, stt, sty, _ = self._sums
+        denominator = n*stt - st*st
+        if n < 2 or denominator <= 0.0:
+            return 0.0
+        return (n*sty - st*sy)/denominator
+
+    def slopeError(self) -> float:
+        """
+        Standard error of the slope (0 with fewer than three points).
+        """
+        n = len(self._points)
+        if n < 3:
+            return 0.0
+        st, _, stt, _, _ = self._sums
+        stt_c = stt - st*st/n
+        return self.residual()/math.sqrt(stt_c) if stt_c > 0.0 else 0.0
+
+    def residual(self) -> float:
+        """
+        Standard deviation of the values around the fitted line.
+        """
+        n = len(self._points)
+        if n < 3:
+            return 0.0
+        st, sy, stt, sty, syy = self._sums
+        syy_c = syy - sy*sy/n
+        stt_c = stt - st*st/n
+        sty_c = sty - st*sy/n
+        explained = sty_c*sty_c/stt_c if stt_c > 0.0 else 0.0
+        return math.sqrt(max(syy_c - explained, 0.0)/(n - 2))
+
+
+class SettlingResult(NamedTuple):
+    port: str
+    setpoint: float
+    settling_time: float
+    overshoot: float
+    error: float
+
+
+class SettlingDetector:
+    """
+    Follows the response of one device to its setpoint changes.
+
+    A new step starts whenever the setpoint of the samples changes. The
+    response is considered settled when the regression line over the last
+    `window` seconds is flat (|slope| <= `slope` units/s) and the values around
+    it are quiet (residual deviation <= `noise` units). Then `update` returns
+    the settling time (from the step to the first sample of the stable window),
+    the overshoot (percentage of the step size) and the steady state error
+    (mean of the stable window minus the setpoint), once per step.
+    """
+    def __init__(self, port:str=None, window:float=10.0, slope:float=0.05, noise:float=0.5) -> None:
+        self._port: str = port
+        self._slope: float = slope
+        self._noise: float = noise
+        # NOTE: a time window, the sample rate depends on the firmware cycle and the link.
+        self._regression: RollingRegression = RollingRegression(span=window)
+        self._setpoint: float = None
+        self._start: float = None
+        self._initial: float = None
+        self._peak: float = None
+        self._last: float = None
+        self._settled: bool = False
+
+    def isSettled(self) -> bool:
+        return self._settled
+
+    def setpoint(self) -> float:
+        return self._setpoint
+
+    def step(self, setpoint:float, time:float) -> None:
+        self._setpoint = setpoint
+        self._start = time
+        self._initial = self._last
+        self._peak = None
+        self._settled = False
+        self._regression.reset(time)
+
+    def update(self, time:float, value:float, setpoint:float) -> SettlingResult:
+        if self._setpoint is None:
+            # NOTE: the setpoint found on the first sample isn't a step (nothing to report).
+            self._setpoint, self._last, self._settled = setpoint, value, True
+            return None
+        if setpoint != self._setpoint:
+            self.step(setpoint, time)
+        self._last = value
+        if self._settled:
+            return None
+        if self._initial is None:
+            self._initial = value
+        # NOTE: the peak is the farthest point in the direction of the step.
+        direction = 1.0 if self._setpoint >= self._initial else -1.0
+        if self._peak is None or direction*(value - self._peak) > 0.0:
+            self._peak = value
+        regression = self._regression
+        regression.append(time, value)
+        if not regression.isFull() or abs(regression.slope()) > self._slope or regression.residual() > self._noise:
+            return None
+        self._settled = True
+        size = abs(self._setpoint - self._initial)
+        overshoot = max(direction*(self._peak - self._setpoint), 0.0)/size*100.0 if size > 0.0 else 0.0
+        return SettlingResult(self._port, self._setpoint, regression.first() - self._start, overshoot, regression.mean() - self._setpoint)
+
+
+class SettlingMonitor:
+    """
+    Runs a `SettlingDetector` on every sample of every device (from the I/O
+    workers) and emits `Settled` on the `Observer` when a response settles.
+    Scripts can block on `wait` to chain steps as soon as the system is stable.
+    """
+    def __init__(self, devices, observer=None, **options) -> None:
+        self._devices = devices
+        self._observer = observer
+        self._options: dict = options
+        self._detectors: Dict[str, SettlingDetector] = {}
+        # NOTE: devices with the callback (the manager no longer has them when they are removed).
+        self._attached: Dict[str, Device] = {}
+        self._results: Dict[str, SettlingResult] = {}
+        self._condition: Condition = Condition()
+        for device in self._devices.devices():
+            self._attach(device.port)
+        self._devices.Signal.DeviceAdded.connect(self._attach)
+        self._devices.Signal.DeviceRemoved.connect(self._detach)
+
+    def detector(self, port:str) -> SettlingDetector:
+        return self._detectors.get(port)
+
+    def result(self, port:str) -> SettlingResult:
+        """
+        Result of the last settled step of `port` (None while settling).
+        """
+        return self._results.get(port)
+
+    def wait(self, port:str, timeout:float=None) -> SettlingResult:
+        """
+        Blocks until the current step of `port` settles (or `timeout` seconds
+        pass, returning None). Don't call it from the GUI thread.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: port in self._results, timeout)
+            return self._results.get(port)
+
+    def _attach(self, port:str) -> None:
+        device = self._devices.device(port)
+        if device is not None and port not in self._detectors:
+            self._detectors[port] = SettlingDetector(port, **self._options)
+            self._attached[port] = device
+            device.addSampleCallback(self._onSample)
+
+    def _detach(self, port:str) -> None:
+        device = self._attached.pop(port, None)
+        if device is not None:
+            device.removeSampleCallback(self._onSample)
+        self._detectors.pop(port, None)
+        with self._condition:
+            self._results.pop(port, None)
+
+    def _onSample(self, device:Device, sample:Sample) -> None:
+        detector = self._detectors.get(device.port)
+        if detector is None:
+            return
+        if sample.setpoint != detector.setpoint():
+            with self._condition:
+                self._results.pop(device.port, None)
+        result = detector.update(sample.time, sample.value, sample.setpoint)
+        if result is not None:
+            with self._condition:
+                self._results[device.port] = result
+                self._condition.notify_all()
+            if self._observer is not None:
+                self._observer.Signal.Settled.emit(result)
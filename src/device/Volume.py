@@ -0,0 +1,250 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+# Python libraries
+import math
+import re
+from threading import Lock
+from typing import Dict, List, NamedTuple, Tuple
+
+# Third party libraries
+import numpy as np
+
+# Local libraries
+from .Parser import LineParser
+
+
+class PistonGeometry(NamedTuple):
+    """
+    Piston diameter (mm), lead of the screw driving it (mm per revolution)
+    and steps per revolution of the stepper (microstepping included).
+    """
+    diameter: float = 50.0
+    lead: float = 2.0
+    steps: int = 3200
+
+    @staticmethod
+    def fromSpec(spec:str) -> "PistonGeometry":
+        """
+        Parses "diameter, lead, steps" (e.g. "50, 2, 3200"). Raises `ValueError`
+        if the spec is invalid.
+        """
+        parts = [part.strip() for part in (spec or "").split(",")]
+        if len(parts) != 3:
+            raise ValueError("expected diameter, lead and steps per revolution -> " + str(spec))
+        geometry = PistonGeometry(float(parts[0]), float(parts[1]), int(parts[2]))
+        if geometry.diameter <= 0 or geometry.lead <= 0 or geometry.steps <= 0:
+            raise ValueError("the piston geometry must be positive -> " + str(spec))
+        return geometry
+
+    def spec(self) -> str:
+        return ", ".join([str(self.diameter), str(self.lead), str(self.steps)])
+
+    def volumePerStep(self) -> float:
+        """
+        Volume (cm3) displaced by one step.
+        """
+        return math.pi*(self.diameter/2.0)**2*self.lead/self.steps/1000.0
+
+
+def firmware_speed(a:float, b:float, speeds:List[Tuple[float, int]]=None) -> int:
+    """
+    `estima_velocidade` of the firmware: steps of one cycle for the distance
+    `b - a`. A `speeds` table of (distance, steps) pairs, largest distance
+    first, replaces the built-in thresholds (the steps of the first distance
+    reached, 0 below the last one).
+    """
+    diff = b - a
+    if speeds is not None:
+        for distance, steps in speeds:
+            if diff >= distance:
+                return steps
+        return 0
+    if diff > 100:
+        return 20000
+    elif diff < 1.5:
+        return 0
+    return 1000
+
+
+def firmware_steps(value:float, target:float, band:float=1.5, speeds:List[Tuple[float, int]]=None) -> int:
+    """
+    Signed steps the firmware moves after printing `value` with `target` as
+    its setpoint (positive towards higher pressure, 0 when the target is 0).
+    """
+    if target == 0:
+        return 0
+    if value < target - band:
+        return firmware_speed(value, target - band, speeds)
+    if value > target + band:
+        return -firmware_speed(target - band, value, speeds)
+    return 0
+
+
+_integer: re.Pattern = re.compile(r"-?\d+")
+
+
+def parse_target(command:str) -> float:
+    """
+    The target the firmware reads from `command` (`Serial.parseInt`, so 0
+    when it has no digits).
+    """
+    match = _integer.search(command)
+    return float(match.group()) if match is not None else 0.0
+
+
+class VolumeEstimator:
+    """
+    Tracks the injected volume of one device (cm3, relative to the beginning
+    of stroke).
+
+    The firmware only prints the pressure, so by default the steps it moves
+    are replayed on the host: after every printed value the piston moves
+    `firmware_steps(raw, target)` where the target is the last number written
+    to the device. Moves into an active limit switch are dropped and the
+    beginning of stroke resets the position. Once the device reports its own
+    step counter (`S:<steps>` lines) the counter is used instead.
+    """
+    def __init__(self, geometry:PistonGeometry=None, band:float=1.5) -> None:
+        self._geometry: PistonGeometry = geometry if geometry is not None else PistonGeometry()
+        self._per_step: float = self._geometry.volumePerStep()
+        self._band: float = band
+        self._target: float = 0.0
+        self._position: int = 0
+        self._counted: bool = False
+
+    def geometry(self) -> PistonGeometry:
+        return self._geometry
+
+    def setGeometry(self, geometry:PistonGeometry) -> None:
+        # NOTE: the position is kept in steps, only the volume of a step changes.
+        self._geometry = geometry
+        self._per_step = geometry.volumePerStep()
+
+    def position(self) -> int:
+        return self._position
+
+    def volume(self) -> float:
+        return self._position*self._per_step
+
+    def reset(self, position:int=0) -> None:
+        self._position = position
+
+    def command(self, command:str) -> None:
+        """
+        Called with every command written to the device.
+        """
+        self._target = parse_target(command)
+
+    def counter(self, steps:int) -> None:
+        """
+        Called with every step counter reported by the device.
+        """
+        self._position = int(steps)
+        self._counted = True
+
+    def update(self, raw:float, limits:int) -> float:
+        """
+        Called with every printed value, returns the volume at that sample.
+        """
+        if self._counted:
+            return self._position*self._per_step
+        if limits & LineParser.LimitBeginning:
+            self._position = 0
+        volume = self._position*self._per_step
+        steps = firmware_steps(raw, self._target, self._band)
+        if (steps > 0 and limits & LineParser.LimitEnd) or (steps < 0 and limits & LineParser.LimitBeginning):
+            steps = 0
+        self._position += steps
+        return volume
+
+
+class PVCurve:
+    """
+    Pressure-volume curve built incrementally from the samples: one point per
+    piston position visited (the mean pressure while it stayed there), flagged
+    as loading (+1) or unloading (-1) by the direction it was reached from.
+
+    Only the last point is still changing (see `closed`), so a plot can draw
+    every other point once.
+    """
+    def __init__(self, capacity:int=1024) -> None:
+        self._lock: Lock = Lock()
+        self._volume: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self._pressure: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self._count: np.ndarray = np.zeros(capacity, dtype=np.int64)
+        self._direction: np.ndarray = np.zeros(capacity, dtype=np.int8)
+        self._size: int = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def closed(self) -> int:
+        """
+        Number of points that won't change anymore.
+        """
+        return max(self._size - 1, 0)
+
+    def update(self, volume:float, pressure:float) -> None:
+        with self._lock:
+            i = self._size - 1
+            if i >= 0 and self._volume[i] == volume:
+                self._count[i] += 1
+                self._pressure[i] += (pressure - self._pressure[i])/self._count[i]
+                return
+            if self._size == len(self._volume):
+                self._grow()
+            i += 1
+            self._volume[i] = volume
+            self._pressure[i] = pressure
+            self._count[i] = 1
+            self._direction[i] = 0 if i == 0 else (1 if volume > self._volume[i - 1] else -1)
+            self._size = i + 1
+
+    def points(self, start:int=0) -> Dict[str, np.ndarray]:
+        """
+        Copy of the points from `start` on (`volume`, `pressure`, `count`, `direction`).
+        """
+        with self._lock:
+            end = self._size
+            return {
+                "volume": self._volume[start:end].copy(),
+                "pressure": self._pressure[start:end].copy(),
+                "count": self._count[start:end].copy(),
+                "direction": self._direction[start:end].copy(),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._size = 0
+
+    def _grow(self) -> None:
+        size = 2*len(self._volume)
+        for name in ("_volume", "_pressure", "_count", "_direction"):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
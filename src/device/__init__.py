@@ -0,0 +1,11 @@
+from .Device import Device, Sample
+from .DeviceManager import DeviceManager
+from .Calibration import Calibration
+from .Parser import LineParser
+from .Buffer import SampleBuffer
+from .Filters import FilterPipeline, Filter, RollingStatistics, FILTERS, STATISTICS
+from .Settling import SettlingDetector, SettlingMonitor, SettlingResult, RollingRegression
+from .Alarms import AlarmEngine, AlarmRule, AlarmEvent, load_rules, save_rules
+from .Volume import VolumeEstimator, PistonGeometry, PVCurve, firmware_steps, firmware_speed
+from .Latency import LatencyTracker, LatencyHistogram
+from .Metrics import MetricsServer, MetricsWriter
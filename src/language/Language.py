@@ -108,12 +108,68 @@ class Language(metaclass=SingletonMetaClass):
     FillinTank: str = "Filling Tank"
     NoConnection: str = "No Connection"
     YouMustOpenAConnection: str = "You must open a connection first."
+    DeviceBusy: str = "Device Busy"
+    DeviceDrivenBy: str = "The device is already driven by the {}."
 
     FileProblem: str = "Problem with File"
     UnableToOpenFile: str = "Unable to open File. Please check the format."
     ReachedBeginning: str = "Reached beginning for course."
     ReachedEnd: str = "Reached end for course."
 
+    DevicesTitle: str = "Devices"
+    AddDevice: str = "Add device"
+    AddDeviceTooltip: str = "Add a new device (controller)."
+    RemoveDeviceTooltip: str = "Remove the selected device."
+    ConnectDeviceTooltip: str = "Connect or disconnect the selected device."
+    Connected: str = "connected"
+    Disconnected: str = "disconnected"
+    Operator: str = "Operator"
+    OpenRun: str = "Open run..."
+    Run: str = "Run"
+    NoRuns: str = "There are no recorded runs yet."
+    Filter: str = "Filter"
+    FilterTooltip: str = "Filter stages applied to the pressure, separated by commas (e.g. median:5, ema:0.2). Available: average:window, median:window, ema:alpha, kalman:process:measurement."
+    InvalidFilter: str = "Invalid filter"
+    SettledMessage: str = "Stable after {0:.1f} s (overshoot {1:.1f} %, error {2})."
+    AlarmRaised: str = "ALARM: {0} on {1} ({2})."
+    AlarmCleared: str = "Alarm cleared: {0} on {1} ({2})."
+    HostControl: str = "Host side control"
+    HostControlTooltip: str = "Closed loop (PID) control on this computer, sending targets to the controller instead of relying only on its built-in loop."
+    ControllerGains: str = "Controller gains"
+    ControllerGainsTooltip: str = "kp, ki, kd and optionally feed forward (tune them with CPVtune.py)."
+    ControllerRate: str = "Controller rate (Hz)"
+    InvalidGains: str = "Invalid controller gains"
+    ProfileTitle: str = "Profile"
+    LoadProfileTooltip: str = "Load a setpoint profile (steps, ramps, holds and cycles)."
+    RunProfileTooltip: str = "Run or stop the setpoint profile on the connected device."
+    PistonGeometry: str = "Piston geometry"
+    PistonGeometryTooltip: str = "Piston diameter (mm), screw lead (mm per revolution) and motor steps per revolution, used to compute the injected volume."
+    InvalidGeometry: str = "Invalid piston geometry"
+    HoldTestTitle: str = "Hold test"
+    HoldTestTooltip: str = "Reach the target pressure, stop the piston and measure the leak rate (stops as soon as it is known to the given precision)."
+    LeakPrecision: str = "Precision"
+    LeakPrecisionTooltip: str = "Half width of the 95 % confidence interval of the leak rate at which the test stops."
+    HoldSettling: str = "Reaching the target pressure..."
+    HoldProgress: str = "Hold {0:.0f} s: leak {1} ± {2}"
+    HoldConverged: str = "Leak rate {0} ± {1} ({2:.0f} s hold)."
+    HoldNotConverged: str = "Leak rate {0} ± {1} ({2:.0f} s hold, precision not reached)."
+    HoldAborted: str = "Hold test stopped."
+    Diagnostics: str = "Diagnostics"
+    LatencyCount: str = "Samples"
+    LatencyMean: str = "Mean"
+    LatencyMax: str = "Max"
+    LatencyUnits: str = "Latency of every stage since the previous one (ms), total from the port read to the display, and time from every command to the first response and to the target band."
+    LatencyReset: str = "Reset"
+    LatencySave: str = "Save..."
+    ShownValueAge: str = "Age of the value shown: {0:.1f} ms"
+    Profiling: str = "Profiling"
+    MetricsPort: str = "Metrics port"
+    MetricsPortTooltip: str = "Local HTTP port serving the acquisition health (sample rate, queues, errors, pressure, memory, ...) in the Prometheus format at /metrics."
+    Off: str = "Off"
+    StallThreshold: str = "Freeze log"
+    StallThresholdTooltip: str = "When the interface freezes for longer than this, what it was doing is written to stalls.log in the user folder."
+    ProfilingTooltip: str = "Profilers running now (cProfile of the interface thread, stack sampling of all threads, memory allocations). Their results are saved to the Profiles folder of the user folder when turned off or on quit."
+
     OPTION_PORTUGUESE: str = "Portuguese"
     OPTION_ENGLISH: str = "English"
     def __init__(self, settings: Settings) -> None:
@@ -162,6 +218,8 @@ class Language(metaclass=SingletonMetaClass):
             self.FillinTank: "A encher tanque.",
             self.NoConnection: "Sem conexão",
             self.YouMustOpenAConnection: "Tem de abrir uma conexão primeiro.",
+            self.DeviceBusy: "Dispositivo ocupado",
+            self.DeviceDrivenBy: "O dispositivo já é controlado por: {}.",
             self.FileProblem: "Problema com ficheiro",
             self.UnableToOpenFile: "Não foi possível abrir o ficheiro. Verifique a formatação.",
             self.EditCurve: "Editar curva de calibração",
@@ -184,7 +242,60 @@ class Language(metaclass=SingletonMetaClass):
             self.ExportCalibrationCurveTooltip: "Exportar curva de calibração.",
             self.ImportCalibrationCurveTooltip: "Importar curva de calibração.",
             self.EditCalibrationCurveTooltip: "Editar curva de calibração.",
-            self.AsteriskRestartNeeded: "* Necessita relançar o programa para esta opção ficar em efeito."
+            self.AsteriskRestartNeeded: "* Necessita relançar o programa para esta opção ficar em efeito.",
+            self.DevicesTitle: "Aparelhos",
+            self.AddDevice: "Adicionar aparelho",
+            self.AddDeviceTooltip: "Adicionar novo aparelho (controlador).",
+            self.RemoveDeviceTooltip: "Remover aparelho selecionado.",
+            self.ConnectDeviceTooltip: "Conectar ou desconectar aparelho selecionado.",
+            self.Connected: "conectado",
+            self.Disconnected: "desconectado",
+            self.Operator: "Operador",
+            self.OpenRun: "Abrir ensaio...",
+            self.Run: "Ensaio",
+            self.NoRuns: "Ainda não existem ensaios gravados.",
+            self.Filter: "Filtro",
+            self.FilterTooltip: "Filtros aplicados à pressão, separados por vírgulas (p.ex. median:5, ema:0.2). Disponíveis: average:janela, median:janela, ema:alfa, kalman:processo:medição.",
+            self.InvalidFilter: "Filtro inválido",
+            self.SettledMessage: "Estável após {0:.1f} s (sobre-elevação {1:.1f} %, erro {2}).",
+            self.AlarmRaised: "ALARME: {0} em {1} ({2}).",
+            self.AlarmCleared: "Alarme terminado: {0} em {1} ({2}).",
+            self.HostControl: "Controlo no computador",
+            self.HostControlTooltip: "Controlo em malha fechada (PID) neste computador, enviando alvos ao controlador em vez de depender apenas do seu ciclo interno.",
+            self.ControllerGains: "Ganhos do controlador",
+            self.ControllerGainsTooltip: "kp, ki, kd e opcionalmente feed forward (afinar com CPVtune.py).",
+            self.ControllerRate: "Frequência do controlador (Hz)",
+            self.InvalidGains: "Ganhos do controlador inválidos",
+            self.ProfileTitle: "Perfil",
+            self.LoadProfileTooltip: "Carregar perfil de pressão (degraus, rampas, patamares e ciclos).",
+            self.RunProfileTooltip: "Correr ou parar o perfil de pressão no aparelho conectado.",
+            self.PistonGeometry: "Geometria do pistão",
+            self.PistonGeometryTooltip: "Diâmetro do pistão (mm), passo do fuso (mm por rotação) e passos do motor por rotação, usados para calcular o volume injetado.",
+            self.InvalidGeometry: "Geometria do pistão inválida",
+            self.HoldTestTitle: "Ensaio de estanquidade",
+            self.HoldTestTooltip: "Atingir a pressão alvo, parar o pistão e medir a taxa de fuga (termina assim que esta for conhecida com a precisão indicada).",
+            self.LeakPrecision: "Precisão",
+            self.LeakPrecisionTooltip: "Meia largura do intervalo de confiança a 95 % da taxa de fuga com a qual o ensaio termina.",
+            self.HoldSettling: "A atingir a pressão alvo...",
+            self.HoldProgress: "Patamar {0:.0f} s: fuga {1} ± {2}",
+            self.HoldConverged: "Taxa de fuga {0} ± {1} (patamar de {2:.0f} s).",
+            self.HoldNotConverged: "Taxa de fuga {0} ± {1} (patamar de {2:.0f} s, precisão não atingida).",
+            self.HoldAborted: "Ensaio de estanquidade parado.",
+            self.Diagnostics: "Diagnóstico",
+            self.LatencyCount: "Amostras",
+            self.LatencyMean: "Média",
+            self.LatencyMax: "Máximo",
+            self.LatencyUnits: "Latência de cada etapa desde a anterior (ms), total desde a leitura da porta até à apresentação, e tempo de cada comando até à primeira resposta e até à banda do alvo.",
+            self.LatencyReset: "Reiniciar",
+            self.LatencySave: "Guardar...",
+            self.ShownValueAge: "Idade do valor apresentado: {0:.1f} ms",
+            self.Profiling: "Perfilagem",
+            self.MetricsPort: "Porta de métricas",
+            self.MetricsPortTooltip: "Porta HTTP local que serve o estado da aquisição (frequência de amostragem, filas, erros, pressão, memória, ...) no formato Prometheus em /metrics.",
+            self.Off: "Desligado",
+            self.StallThreshold: "Registo de bloqueios",
+            self.StallThresholdTooltip: "Quando a interface bloqueia durante mais do que isto, o que estava a fazer é escrito em stalls.log na pasta do utilizador.",
+            self.ProfilingTooltip: "Perfiladores em execução (cProfile da thread da interface, amostragem das pilhas de todas as threads, alocações de memória). Os resultados são guardados na pasta Profiles da pasta do utilizador quando desligados ou ao sair."
         }
 
     def get(self, key:str) -> str:
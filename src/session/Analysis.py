@@ -0,0 +1,255 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+
+# Python libraries
+import os
+import math
+from typing import Dict, List
+
+# Third party libraries
+import numpy as np
+
+# Local libraries
+from .Session import Session
+from .Catalog import RunCatalog, CATALOG_FILENAME
+
+
+# NOTE: bumped whenever the results change, older ones in the catalog are recomputed.
+ANALYSIS_VERSION: int = 1
+
+
+def directions(volume:np.ndarray, previous_volume:float=None, previous_direction:int=0) -> np.ndarray:
+    """
+    Direction of the last piston move at every sample: +1 loading, -1
+    unloading, `previous_direction` before the first move of `volume`.
+    """
+    start = volume[0] if previous_volume is None else previous_volume
+    sign = np.sign(np.diff(volume, prepend=start)).astype(np.int8)
+    index = np.where(sign != 0, np.arange(len(volume)), -1)
+    np.maximum.accumulate(index, out=index)
+    return np.where(index >= 0, sign[np.maximum(index, 0)], np.int8(previous_direction)).astype(np.int8)
+
+
+class HoldAccumulator:
+    """
+    Least squares pressure decay of every hold (run of samples with the piston
+    still), fed chunk by chunk. Each run keeps its sums (count, t, p, t², t·p)
+    so a hold split between chunks is merged exactly.
+    """
+    # NOTE: volume, count, t, p, tt, tp, first time, last time
+    Width: int = 8
+
+    def __init__(self, origin:float) -> None:
+        self._origin: float = origin
+        self._closed: List[np.ndarray] = []
+        self._open: np.ndarray = None
+
+    def add(self, time:np.ndarray, pressure:np.ndarray, volume:np.ndarray) -> None:
+        if len(time) == 0:
+            return
+        t = np.asarray(time, dtype=np.float64) - self._origin
+        p = np.asarray(pressure, dtype=np.float64)
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(volume) != 0) + 1])
+        ends = np.concatenate([starts[1:] - 1, [len(t) - 1]])
+        runs = np.empty((len(starts), self.Width))
+        runs[:, 0] = volume[starts]
+        runs[:, 1] = np.diff(np.concatenate([starts, [len(t)]]))
+        runs[:, 2] = np.add.reduceat(t, starts)
+        runs[:, 3] = np.add.reduceat(p, starts)
+        runs[:, 4] = np.add.reduceat(t*t, starts)
+        runs[:, 5] = np.add.reduceat(t*p, starts)
+        runs[:, 6] = t[starts]
+        runs[:, 7] = t[ends]
+        if self._open is not None:
+            if self._open[0] == runs[0, 0]:
+                runs[0, 1:6] += self._open[1:6]
+                runs[0, 6] = self._open[6]
+            else:
+                self._closed.append(self._open[None, :])
+        self._closed.append(runs[:-1])
+        self._open = runs[-1]
+
+    def holds(self, min_duration:float=10.0, min_samples:int=5) -> Dict[str, np.ndarray]:
+        """
+        The holds lasting at least `min_duration` seconds: `duration`, mean
+        `pressure` and pressure `slope` (units/s).
+        """
+        parts = self._closed + ([self._open[None, :]] if self._open is not None else [])
+        runs = np.concatenate(parts) if len(parts) > 0 else np.empty((0, self.Width))
+        n, st, sp, stt, stp = runs[:, 1], runs[:, 2], runs[:, 3], runs[:, 4], runs[:, 5]
+        duration = runs[:, 7] - runs[:, 6]
+        denominator = n*stt - st*st
+        keep = (duration >= min_duration) & (n >= min_samples) & (denominator > 0)
+        return {
+            "duration": duration[keep],
+            "pressure": sp[keep]/n[keep],
+            "slope": (n[keep]*stp[keep] - st[keep]*sp[keep])/denominator[keep],
+        }
+
+
+def _finite(values:np.ndarray) -> list:
+    # NOTE: JSON has no NaN, empty bins are stored as None.
+    return [float(value) if math.isfinite(value) else None for value in values]
+
+
+def analyze_session(folder:str, bins:int=50, min_hold:float=10.0) -> Dict:
+    """
+    Pressure-volume analysis of a recorded session, computed chunk by chunk
+    on the memory mapped columns:
+
+    * `loading`/`unloading`: mean volume per pressure bin (`pressure` holds
+      the bin centers) while the piston was moving forward/backward.
+    * `compliance`: dV/dP along the loading curve, `mean_compliance` the
+      least squares slope of it and `mean_stiffness` its inverse.
+    * `hysteresis`: area between the unloading and loading curves
+      (pressure units × cm3).
+    * `leak_rate`: duration weighted pressure decay (units/s, positive when
+      the pressure drops) over the holds lasting at least `min_hold` seconds,
+      `leak_volume_rate` the same in cm3/s (through the mean compliance).
+    """
+    session = Session(folder)
+    result = {"version": ANALYSIS_VERSION, "rows": len(session), "pressure": [], "loading": [], "unloading": [], "compliance": [],
+              "mean_compliance": None, "mean_stiffness": None, "hysteresis": None, "leak_rate": None, "leak_volume_rate": None, "holds": 0}
+    chunks = sorted(session.manifest["chunks"], key=lambda chunk: chunk.get("row", 0))
+    if "volume" not in session.columns() or len(chunks) == 0:
+        return result
+
+    # NOTE: first pass, pressure range (only the pressure column is touched).
+    low, high = math.inf, -math.inf
+    for chunk in chunks:
+        values = session.chunk(chunk["index"], "value")
+        if len(values) > 0:
+            low, high = min(low, float(np.min(values))), max(high, float(np.max(values)))
+    if not low < high:
+        return result
+    width = (high - low)/bins
+
+    # NOTE: second pass, volume sums per pressure bin and direction, and the holds.
+    sums = np.zeros((2, bins))
+    counts = np.zeros((2, bins))
+    holds = HoldAccumulator(chunks[0]["start"])
+    previous_volume, previous_direction = None, 0
+    for chunk in chunks:
+        index = chunk["index"]
+        time, pressure, volume = session.chunk(index, "time"), session.chunk(index, "value"), session.chunk(index, "volume")
+        if len(time) == 0:
+            continue
+        direction = directions(volume, previous_volume, previous_direction)
+        previous_volume, previous_direction = float(volume[-1]), int(direction[-1])
+        bin_index = np.minimum(((pressure - low)/width).astype(np.int64), bins - 1)
+        for row, sign in enumerate((1, -1)):
+            mask = direction == sign
+            sums[row] += np.bincount(bin_index[mask], weights=volume[mask], minlength=bins)
+            counts[row] += np.bincount(bin_index[mask], minlength=bins)
+        holds.add(time, pressure, volume)
+
+    centers = low + (np.arange(bins) + 0.5)*width
+    with np.errstate(invalid="ignore", divide="ignore"):
+        loading, unloading = sums/counts
+    result["pressure"] = _finite(centers)
+    result["loading"] = _finite(loading)
+    result["unloading"] = _finite(unloading)
+
+    valid = np.isfinite(loading)
+    compliance = np.full(bins, np.nan)
+    if np.count_nonzero(valid) >= 2:
+        compliance[valid] = np.gradient(loading[valid], centers[valid])
+        slope = float(np.polyfit(centers[valid], loading[valid], 1)[0])
+        result["mean_compliance"] = slope
+        result["mean_stiffness"] = 1.0/slope if slope != 0 else None
+    result["compliance"] = _finite(compliance)
+
+    both = valid & np.isfinite(unloading)
+    if np.count_nonzero(both) >= 2:
+        difference, x = unloading[both] - loading[both], centers[both]
+        result["hysteresis"] = float(np.sum((difference[1:] + difference[:-1])*np.diff(x))/2.0)
+
+    found = holds.holds(min_hold)
+    result["holds"] = int(len(found["duration"]))
+    if len(found["duration"]) > 0:
+        leak = float(-np.average(found["slope"], weights=found["duration"]))
+        result["leak_rate"] = leak
+        if result["mean_compliance"] is not None:
+            result["leak_volume_rate"] = leak*result["mean_compliance"]
+    return result
+
+
+def _analyze(arguments:tuple) -> tuple:
+    # NOTE: runs in the pool processes (must be picklable, hence module level).
+    name, folder, options = arguments
+    try:
+        return name, analyze_session(folder, **options), None
+    except (OSError, ValueError, KeyError) as error:
+        return name, None, str(error)
+
+
+def analyze_runs(catalog:RunCatalog, names:List[str]=None, workers:int=None, force:bool=False, **options) -> Dict[str, Dict]:
+    """
+    Analyzes the runs of `catalog` (all by default) that have no up to date
+    analysis yet (all of them with `force`) and stores the results in it.
+    Several runs are spread over a process pool of `workers` processes (CPU
+    count by default). Returns the new results by run name.
+    """
+    runs = catalog.find() if names is None else [run for run in (catalog.get(name) for name in names) if run is not None]
+    todo = [(run["name"], run["folder"], options) for run in runs if force or catalog.analysis(run["name"], ANALYSIS_VERSION) is None]
+    workers = workers if workers is not None else (os.cpu_count() or 1)
+    if workers <= 1 or len(todo) <= 1:
+        outcomes = [_analyze(arguments) for arguments in todo]
+    else:
+        # NOTE: imported here, the process pool machinery is not needed to start the application.
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+            outcomes = list(pool.map(_analyze, todo))
+    results = {}
+    for name, result, error in outcomes:
+        if error is not None:
+            print("analyze_runs : unable to analyze", name, "->", error)
+            continue
+        catalog.addAnalysis(name, result)
+        results[name] = result
+    return results
+
+
+def main(arguments:List[str]=None) -> None:
+    """
+    Batch analysis tool: indexes the sessions folder and analyzes the runs
+    not analyzed yet.
+    """
+    import argparse
+    parser = argparse.ArgumentParser(description="Pressure-volume analysis (compliance, hysteresis, leak rate) of the recorded runs.")
+    parser.add_argument("--folder", default=os.path.join(os.path.expanduser("~"), ".CPV"), help="user folder (with the Sessions folder and the run catalog)")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes (CPU count by default)")
+    parser.add_argument("--bins", type=int, default=50, help="pressure bins of the P-V curves")
+    parser.add_argument("--min-hold", type=float, default=10.0, help="shortest hold used for the leak rate (s)")
+    parser.add_argument("--force", action="store_true", help="recompute runs already analyzed")
+    options = parser.parse_args(arguments)
+
+    catalog = RunCatalog(os.path.join(options.folder, CATALOG_FILENAME))
+    catalog.scan(os.path.join(options.folder, "Sessions"))
+    results = analyze_runs(catalog, workers=options.workers, force=options.force, bins=options.bins, min_hold=options.min_hold)
+    for name, result in sorted(results.items()):
+        print(name, ": compliance =", result["mean_compliance"], "hysteresis =", result["hysteresis"], "leak rate =", result["leak_rate"], "holds =", result["holds"])
+    catalog.close()
@@ -0,0 +1,226 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import json
+import sqlite3
+from threading import Lock
+from typing import Dict, List
+
+# Third party libraries
+import numpy as np
+
+# Local libraries
+from .Session import Session
+
+
+CATALOG_FILENAME: str = "catalog.sqlite"
+
+
+class RunCatalog:
+    """
+    The `RunCatalog` indexes the recorded sessions (runs) in an SQLite data
+    base: one row per session with device, calibration, operator, start/stop
+    time and summary statistics. Queries on those fields use indexes, the
+    sample data itself stays in the session folders.
+    """
+    Fields: List[str] = ["name", "folder", "device", "calibration", "operator", "start", "stop", "rows", "min", "max", "mean", "std", "metadata"]
+
+    def __init__(self, path:str) -> None:
+        self._path: str = path
+        self._lock: Lock = Lock()
+        self._connection: sqlite3.Connection = sqlite3.connect(self._path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        with self._lock, self._connection:
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                folder TEXT NOT NULL,
+                device TEXT,
+                calibration TEXT,
+                operator TEXT,
+                start REAL,
+                stop REAL,
+                rows INTEGER,
+                min REAL,
+                max REAL,
+                mean REAL,
+                std REAL,
+                metadata TEXT
+            )""")
+            for field in ["device", "calibration", "operator", "start", "stop"]:
+                self._connection.execute("CREATE INDEX IF NOT EXISTS runs_%s ON runs (%s)"%(field, field))
+            # NOTE: P-V analysis results (see `analyze_runs`), the scalars as columns so runs can be filtered on them.
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS analysis (
+                name TEXT PRIMARY KEY,
+                version INTEGER,
+                compliance REAL,
+                stiffness REAL,
+                hysteresis REAL,
+                leak_rate REAL,
+                result TEXT
+            )""")
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+    def add(self, name:str, folder:str, summary:dict) -> None:
+        """
+        Adds (or replaces) a run. `summary` is a dictionary like the one given
+        by `SessionLogger.summary` (with an optional `operator`).
+        """
+        metadata = dict(summary.get("metadata", {}))
+        operator = summary.get("operator", metadata.get("operator"))
+        values = [name, folder, summary.get("device"), summary.get("calibration"), operator, summary.get("start"), summary.get("stop"),
+                  summary.get("rows"), summary.get("min"), summary.get("max"), summary.get("mean"), summary.get("std"), json.dumps(metadata)]
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO runs (" + ", ".join(self.Fields) + ") VALUES (" + ", ".join(["?"]*len(self.Fields)) + ")", values)
+
+    def addSession(self, folder:str, operator:str=None) -> None:
+        """
+        Adds a run from an existing session folder (statistics are computed
+        chunk by chunk).
+        """
+        session = Session(folder)
+        manifest = session.manifest
+        count, total, total2 = 0, 0.0, 0.0
+        minimum, maximum = None, None
+        for chunk in session.chunks("value"):
+            if len(chunk) == 0:
+                continue
+            count += len(chunk)
+            total += float(np.sum(chunk))
+            total2 += float(np.dot(chunk, chunk))
+            minimum = float(np.min(chunk)) if minimum is None else min(minimum, float(np.min(chunk)))
+            maximum = float(np.max(chunk)) if maximum is None else max(maximum, float(np.max(chunk)))
+        mean = total/count if count > 0 else None
+        summary = {
+            "device": manifest.get("device"),
+            "calibration": manifest.get("calibration"),
+            "start": manifest.get("start"),
+            "stop": manifest.get("stop") if manifest.get("stop") is not None else (manifest["chunks"][-1]["stop"] if len(manifest["chunks"]) > 0 else manifest.get("start")),
+            "rows": count,
+            "min": minimum,
+            "max": maximum,
+            "mean": mean,
+            "std": max(total2/count - mean*mean, 0.0)**0.5 if count > 0 else None,
+            "metadata": manifest.get("metadata", {}),
+        }
+        if operator is not None:
+            summary["operator"] = operator
+        self.add(os.path.basename(os.path.normpath(folder)), folder, summary)
+
+    def scan(self, folder:str) -> int:
+        """
+        Adds all session folders inside `folder` not yet in the catalog.
+        Returns the number of added runs.
+        """
+        known = set(run["name"] for run in self.find())
+        added = 0
+        if not os.path.exists(folder):
+            return added
+        for name in sorted(os.listdir(folder)):
+            path = os.path.join(folder, name)
+            if name not in known and os.path.isdir(path):
+                try:
+                    self.addSession(path)
+                    added += 1
+                except (OSError, ValueError, KeyError) as error:
+                    print("RunCatalog::scan : unable to index", path, "->", error)
+        return added
+
+    def remove(self, name:str) -> None:
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM runs WHERE name = ?", (name,))
+            self._connection.execute("DELETE FROM analysis WHERE name = ?", (name,))
+
+    def addAnalysis(self, name:str, result:dict) -> None:
+        """
+        Stores (or replaces) the analysis of run `name` (see `analyze_session`).
+        """
+        values = [name, result.get("version"), result.get("mean_compliance"), result.get("mean_stiffness"), result.get("hysteresis"), result.get("leak_rate"), json.dumps(result)]
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO analysis (name, version, compliance, stiffness, hysteresis, leak_rate, result) VALUES (?, ?, ?, ?, ?, ?, ?)", values)
+
+    def analysis(self, name:str, version:int=None) -> Dict:
+        """
+        The stored analysis of run `name`, None if there is none (or it was
+        computed by another `version` of the analysis).
+        """
+        with self._lock:
+            row = self._connection.execute("SELECT version, result FROM analysis WHERE name = ?", (name,)).fetchone()
+        if row is None or (version is not None and row["version"] != version):
+            return None
+        return json.loads(row["result"])
+
+    def get(self, name:str) -> Dict:
+        runs = self._select("name = ?", [name], None)
+        return runs[0] if len(runs) > 0 else None
+
+    def find(self, device:str=None, calibration:str=None, operator:str=None, start:float=None, stop:float=None, limit:int=None) -> List[Dict]:
+        """
+        Runs matching all given filters, most recent first. `start`/`stop`
+        select runs overlapping that time interval.
+        """
+        conditions, values = [], []
+        for field, value in [("device", device), ("calibration", calibration), ("operator", operator)]:
+            if value is not None:
+                conditions.append(field + " = ?")
+                values.append(value)
+        if start is not None:
+            conditions.append("stop >= ?")
+            values.append(start)
+        if stop is not None:
+            conditions.append("start <= ?")
+            values.append(stop)
+        return self._select(" AND ".join(conditions), values, limit)
+
+    def query(self, name:str, start:float=None, stop:float=None, columns:List[str]=None) -> Dict[str, np.ndarray]:
+        """
+        Sample data of run `name` between `start` and `stop` (only the needed
+        chunks are read).
+        """
+        run = self.get(name)
+        if run is None:
+            raise KeyError("RunCatalog::query : unknown run <%s>."%name)
+        return Session(run["folder"]).readRange(start, stop, columns)
+
+    def _select(self, where:str, values:list, limit:int) -> List[Dict]:
+        sql = "SELECT " + ", ".join(self.Fields) + " FROM runs"
+        if where:
+            sql += " WHERE " + where
+        sql += " ORDER BY start DESC"
+        if limit is not None:
+            sql += " LIMIT %d"%int(limit)
+        with self._lock:
+            rows = self._connection.execute(sql, values).fetchall()
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run["metadata"] = json.loads(run["metadata"]) if run["metadata"] else {}
+            runs.append(run)
+        return runs
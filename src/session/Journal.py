@@ -0,0 +1,225 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import mmap
+import zlib
+import struct
+from typing import List, Tuple
+
+
+JOURNAL_FILENAME: str = "journal.bin"
+
+
+class Journal:
+    """
+    Crash safe, append only journal of the samples and commands of a session.
+
+    The journal is a memory mapped ring of fixed size records (so appending is
+    a single `struct.pack_into`, with no system call). The sequence number of
+    each record is stored in its last bytes: a record is valid only if its
+    sequence number matches its position. Periodic checkpoints store the
+    record count plus a CRC32 of the records written since the previous
+    checkpoint in one of two header slots (alternating, so a crash while
+    writing one leaves the other intact) and flush the new records. The CRC
+    only covers the newest `capacity - headroom` records of the segment: the
+    ones that can't be overwritten before the next checkpoint as long as fewer
+    than `headroom` records are appended in between.
+
+    The ring only has to hold what the `SessionLogger` has not yet written to
+    its chunks, hence the fixed capacity.
+    """
+    Magic: bytes = b"CPVJRNL1"
+    Version: int = 2
+    HeaderSize: int = 4096
+
+    Sample: int = 1
+    Command: int = 2
+
+    # NOTE: kind, limits, row, time, raw, value, setpoint, volume, command, sequence
+    Record: struct.Struct = struct.Struct("<BB6xqddddd16sq")
+    # NOTE: magic, version, record size, capacity, count, segment start, segment crc
+    Checkpoint: struct.Struct = struct.Struct("<8sIIqqqI")
+    SlotSize: int = 64
+
+    def __init__(self, path:str, capacity:int=262144, headroom:int=None) -> None:
+        self._path: str = path
+        self._capacity: int = capacity
+        self._headroom: int = min(max(headroom if headroom is not None else capacity//2, 0), capacity - 1)
+        self._size: int = self.HeaderSize + capacity*self.Record.size
+        with open(self._path, "wb") as fid:
+            fid.truncate(self._size)
+        self._file = open(self._path, "r+b")
+        self._map: mmap.mmap = mmap.mmap(self._file.fileno(), self._size)
+        self._count: int = 0
+        self._checkpoint_count: int = 0
+        self._slot: int = 0
+        self.checkpoint()
+
+    def path(self) -> str:
+        return self._path
+
+    def count(self) -> int:
+        return self._count
+
+    def pending(self) -> int:
+        """
+        Number of records appended since the last checkpoint.
+        """
+        return self._count - self._checkpoint_count
+
+    def appendSample(self, row:int, time:float, raw:float, value:float, setpoint:float, limits:int, volume:float=0.0) -> None:
+        seq = self._count
+        self.Record.pack_into(self._map, self.HeaderSize + (seq % self._capacity)*self.Record.size, self.Sample, limits, row, time, raw, value, setpoint, volume, b"", seq + 1)
+        self._count = seq + 1
+
+    def appendCommand(self, row:int, time:float, command:str) -> None:
+        seq = self._count
+        self.Record.pack_into(self._map, self.HeaderSize + (seq % self._capacity)*self.Record.size, self.Command, 0, row, time, 0.0, 0.0, 0.0, 0.0, command.encode()[:16], seq + 1)
+        self._count = seq + 1
+
+    def checkpoint(self, stop:int=None) -> None:
+        """
+        Stores a checksummed checkpoint of the records appended up to `stop`
+        (the count, everything so far by default) and flushes them to disk.
+        Only the records since the previous checkpoint and the slot page are
+        flushed. Appending may go on meanwhile (e.g. from another thread,
+        `stop` taken before) but checkpoints must not overlap.
+        """
+        start = self._checkpoint_count
+        stop = self._count if stop is None else stop
+        dirty = self._spans(start, stop)
+        # NOTE: the stored segment start is where the checksummed window begins.
+        start = max(start, stop - (self._capacity - self._headroom))
+        crc = 0
+        for a, b in self._spans(start, stop):
+            crc = zlib.crc32(self._map[a:b], crc)
+        for a, b in dirty:
+            # NOTE: flushes must start on a page boundary.
+            a -= a % mmap.PAGESIZE
+            self._map.flush(a, b - a)
+        slot = self.Checkpoint.pack(self.Magic, self.Version, self.Record.size, self._capacity, stop, start, crc)
+        slot += struct.pack("<I", zlib.crc32(slot))
+        offset = self._slot*self.SlotSize
+        self._map[offset:offset + len(slot)] = slot
+        self._map.flush(0, mmap.PAGESIZE)
+        self._slot = 1 - self._slot
+        self._checkpoint_count = stop
+
+    def close(self, remove:bool=True) -> None:
+        if self._map is None:
+            return
+        self.checkpoint()
+        self._map.close()
+        self._file.close()
+        self._map = None
+        if remove:
+            os.remove(self._path)
+
+    def _spans(self, start:int, stop:int) -> List[Tuple[int, int]]:
+        """
+        Byte spans (in the map) of the records in [start, stop) (two when the
+        range wraps around the ring).
+        """
+        size = self.Record.size
+        if stop - start >= self._capacity:
+            start = stop - self._capacity
+        spans = []
+        while start < stop:
+            index = start % self._capacity
+            count = min(stop - start, self._capacity - index)
+            spans.append((self.HeaderSize + index*size, self.HeaderSize + (index + count)*size))
+            start += count
+        return spans
+
+    @staticmethod
+    def read(path:str) -> Tuple[list, list, bool]:
+        """
+        Reads a journal left behind. Returns the samples
+        `(row, time, raw, value, setpoint, limits, volume)`, the commands
+        `(row, time, command)` (both in order) and whether the last valid
+        checkpoint was intact.
+        """
+        with open(path, "rb") as fid:
+            data = fid.read()
+        checkpoints = []
+        for i in range(2):
+            slot = data[i*Journal.SlotSize:i*Journal.SlotSize + Journal.Checkpoint.size + 4]
+            if len(slot) < Journal.Checkpoint.size + 4:
+                continue
+            crc, = struct.unpack("<I", slot[-4:])
+            if zlib.crc32(slot[:-4]) != crc:
+                continue
+            magic, version, record_size, capacity, count, start, segment_crc = Journal.Checkpoint.unpack(slot[:-4])
+            if magic == Journal.Magic and version == Journal.Version and record_size == Journal.Record.size:
+                checkpoints.append((count, start, segment_crc, capacity))
+        if len(checkpoints) == 0:
+            return [], [], False
+        checkpoints.sort(reverse=True)
+        size = Journal.Record.size
+
+        def record(seq:int, capacity:int):
+            offset = Journal.HeaderSize + (seq % capacity)*size
+            if offset + size > len(data):
+                return None
+            fields = Journal.Record.unpack_from(data, offset)
+            return fields if fields[-1] == seq + 1 else None
+
+        # NOTE: the newest checkpoint whose segment still matches its checksum wins.
+        intact = False
+        for count, start, segment_crc, capacity in checkpoints:
+            crc = 0
+            for seq in range(max(start, count - capacity), count):
+                offset = Journal.HeaderSize + (seq % capacity)*size
+                crc = zlib.crc32(data[offset:offset + size], crc)
+            if crc == segment_crc:
+                intact = True
+                break
+        if not intact:
+            count, start, segment_crc, capacity = checkpoints[-1]
+
+        # NOTE: records after the checkpoint are kept while they are consistent (a
+        #       record overwritten or not written yet fails the sequence check).
+        end = count
+        last_time = None
+        while end - count < capacity:
+            fields = record(end, capacity)
+            if fields is None or fields[0] not in (Journal.Sample, Journal.Command) or (last_time is not None and fields[3] < last_time):
+                break
+            last_time = fields[3]
+            end += 1
+
+        samples, commands = [], []
+        for seq in range(max(0, end - capacity), end):
+            fields = record(seq, capacity)
+            if fields is None:
+                continue
+            kind, limits, row, t, raw, value, setpoint, volume, command, _ = fields
+            if kind == Journal.Sample:
+                samples.append((row, t, raw, value, setpoint, limits, volume))
+            elif kind == Journal.Command:
+                commands.append((row, t, command.rstrip(b"\x00").decode(errors="replace")))
+        return samples, commands, intact
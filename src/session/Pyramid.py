@@ -0,0 +1,213 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+from typing import Dict, List, Tuple
+
+# Third party libraries
+import numpy as np
+
+
+LOD_DTYPE: np.dtype = np.dtype([("t0", np.float64), ("t1", np.float64), ("min", np.float64), ("max", np.float64), ("mean", np.float64)])
+
+
+def lod_filename(level:int) -> str:
+    return "lod_%02d.bin"%level
+
+
+def aggregate(records:np.ndarray, size:int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Aggregates `records` (LOD_DTYPE) in buckets of `size`. Returns the full
+    buckets and the records left over.
+    """
+    full = (len(records)//size)*size
+    if full == 0:
+        return np.empty(0, dtype=LOD_DTYPE), records
+    block = records[:full].reshape(-1, size)
+    buckets = np.empty(len(block), dtype=LOD_DTYPE)
+    buckets["t0"] = block["t0"][:, 0]
+    buckets["t1"] = block["t1"][:, -1]
+    buckets["min"] = block["min"].min(axis=1)
+    buckets["max"] = block["max"].max(axis=1)
+    buckets["mean"] = block["mean"].mean(axis=1)
+    return buckets, records[full:]
+
+
+def as_records(times:np.ndarray, values:np.ndarray) -> np.ndarray:
+    """
+    Raw samples as (degenerate) LOD records.
+    """
+    records = np.empty(len(times), dtype=LOD_DTYPE)
+    records["t0"] = times
+    records["t1"] = times
+    records["min"] = values
+    records["max"] = values
+    records["mean"] = values
+    return records
+
+
+def lttb(x:np.ndarray, y:np.ndarray, n:int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Largest-Triangle-Three-Buckets downsampling of (x, y) to `n` points.
+    """
+    size = len(x)
+    if n >= size or n < 3:
+        return np.asarray(x), np.asarray(y)
+    edges = np.linspace(1, size - 1, n - 1).astype(int)
+    index = np.empty(n, dtype=np.int64)
+    index[0], index[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], max(edges[i + 1], edges[i] + 1)
+        # NOTE: average point of the next bucket (the last point for the last bucket).
+        nlo, nhi = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else size
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - cx)*(by - y[a]) - (x[a] - bx)*(cy - y[a]))
+        a = lo + int(np.argmax(area))
+        index[i + 1] = a
+    return np.asarray(x)[index], np.asarray(y)[index]
+
+
+class PyramidBuilder:
+    """
+    Builds the min/max level of detail pyramid of a session while it is
+    recorded. Level 0 buckets hold `base` samples and every other level
+    `factor` buckets of the level below. Completed buckets are appended to one
+    binary file per level (so the pyramid can be memory mapped while it grows).
+    """
+    def __init__(self, folder:str, base:int=8, factor:int=8, levels:int=8) -> None:
+        self._folder: str = folder
+        self._base: int = base
+        self._factor: int = factor
+        self._levels: int = levels
+        self._pending: List[np.ndarray] = [np.empty(0, dtype=LOD_DTYPE) for _ in range(levels)]
+        self._counts: List[int] = [0]*levels
+
+    def info(self) -> Dict:
+        return {"base": self._base, "factor": self._factor, "levels": list(self._counts)}
+
+    def append(self, times:np.ndarray, values:np.ndarray) -> None:
+        self._feed(0, as_records(times, values))
+
+    def close(self) -> None:
+        """
+        Flushes the incomplete buckets (the tail of the session).
+        """
+        for level in range(self._levels):
+            pending = self._pending[level]
+            if len(pending) == 0:
+                continue
+            bucket, _ = aggregate(pending, len(pending))
+            self._pending[level] = np.empty(0, dtype=LOD_DTYPE)
+            self._write(level, bucket)
+            if level + 1 < self._levels:
+                self._pending[level + 1] = np.concatenate([self._pending[level + 1], bucket])
+
+    def _feed(self, level:int, records:np.ndarray) -> None:
+        size = self._base if level == 0 else self._factor
+        buckets, self._pending[level] = aggregate(np.concatenate([self._pending[level], records]), size)
+        if len(buckets) == 0:
+            return
+        self._write(level, buckets)
+        if level + 1 < self._levels:
+            self._feed(level + 1, buckets)
+
+    def _write(self, level:int, buckets:np.ndarray) -> None:
+        with open(os.path.join(self._folder, lod_filename(level)), "ab") as fid:
+            fid.write(buckets.tobytes())
+        self._counts[level] += len(buckets)
+
+    @staticmethod
+    def build(folder:str, chunks, **options) -> "PyramidBuilder":
+        """
+        Builds the pyramid of an existing session from its (time, value)
+        chunks, replacing any previous one.
+        """
+        for name in os.listdir(folder):
+            if name.startswith("lod_") and name.endswith(".bin"):
+                os.remove(os.path.join(folder, name))
+        builder = PyramidBuilder(folder, **options)
+        for times, values in chunks:
+            builder.append(times, values)
+        builder.close()
+        return builder
+
+
+class Pyramid:
+    """
+    Read access to the level of detail pyramid of a session (memory mapped).
+    `query` answers in time proportional to the number of pixels, not to the
+    number of samples in the range.
+    """
+    def __init__(self, folder:str, info:Dict) -> None:
+        self._folder: str = folder
+        self._base: int = info["base"]
+        self._factor: int = info["factor"]
+        self._levels: List[np.ndarray] = []
+        for level, count in enumerate(info["levels"]):
+            path = os.path.join(folder, lod_filename(level))
+            if count == 0 or not os.path.exists(path):
+                break
+            self._levels.append(np.memmap(path, dtype=LOD_DTYPE, mode="r", shape=(count,)))
+
+    def levelCount(self) -> int:
+        return len(self._levels)
+
+    def level(self, level:int) -> np.ndarray:
+        return self._levels[level]
+
+    def bucketSize(self, level:int) -> int:
+        return self._base*self._factor**level
+
+    def _range(self, level:int, start:float, stop:float) -> Tuple[int, int]:
+        records = self._levels[level]
+        first = max(int(np.searchsorted(records["t1"], start, side="left")), 0)
+        last = int(np.searchsorted(records["t0"], stop, side="right"))
+        return first, last
+
+    def query(self, start:float, stop:float, pixels:int) -> Tuple[int, np.ndarray]:
+        """
+        Returns the coarsest level with at least `pixels` buckets between
+        `start` and `stop` and those buckets. Level -1 (no records) means the
+        range is small enough to be drawn from the raw samples.
+        """
+        for level in range(len(self._levels) - 1, -1, -1):
+            first, last = self._range(level, start, stop)
+            if last - first >= pixels:
+                return level, np.array(self._levels[level][first:last])
+        return -1, np.empty(0, dtype=LOD_DTYPE)
+
+    def lttb(self, start:float, stop:float, points:int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        About `points` representative points (LTTB over the bucket means of a
+        level with a few buckets per point).
+        """
+        level, records = self.query(start, stop, points*4)
+        if level < 0:
+            level, records = 0, np.array(self._levels[0][slice(*self._range(0, start, stop))]) if len(self._levels) > 0 else np.empty(0, dtype=LOD_DTYPE)
+        x = (records["t0"] + records["t1"])/2
+        return lttb(x, records["mean"], points)
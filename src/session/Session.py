@@ -0,0 +1,126 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import json
+from typing import Dict, List, Iterator, Tuple
+
+# Third party libraries
+import numpy as np
+
+# Local libraries
+from .SessionLogger import MANIFEST_FILENAME, COMMANDS_FILENAME, chunk_filename
+from .Pyramid import Pyramid
+
+
+class Session:
+    """
+    Read access to a session written by the `SessionLogger`. Chunks are
+    memory mapped, so opening a session never loads its data.
+    """
+    def __init__(self, folder:str) -> None:
+        self._folder: str = folder
+        with open(os.path.join(self._folder, MANIFEST_FILENAME), "r") as fid:
+            self.manifest: dict = json.loads(fid.read())
+
+    def __len__(self) -> int:
+        return self.manifest["rows"]
+
+    def folder(self) -> str:
+        return self._folder
+
+    def columns(self) -> List[str]:
+        return list(self.manifest["columns"].keys())
+
+    def commands(self) -> List[Tuple[float, str]]:
+        """
+        Commands sent during the session as (time, command).
+        """
+        path = os.path.join(self._folder, COMMANDS_FILENAME)
+        commands = []
+        if os.path.exists(path):
+            with open(path, "r") as fid:
+                for line in fid.readlines():
+                    s = line.rstrip("\n").split(";")
+                    commands.append((float(s[0]), s[1]))
+        return commands
+
+    def pyramid(self) -> Pyramid:
+        """
+        The level of detail pyramid (None for sessions recorded without one).
+        """
+        if "pyramid" not in self.manifest:
+            return None
+        return Pyramid(self._folder, self.manifest["pyramid"])
+
+    def chunkCount(self) -> int:
+        return len(self.manifest["chunks"])
+
+    def chunk(self, index:int, column:str) -> np.ndarray:
+        """
+        Memory map of one column of one chunk.
+        """
+        return np.load(os.path.join(self._folder, chunk_filename(column, index)), mmap_mode="r")
+
+    def chunks(self, column:str) -> Iterator[np.ndarray]:
+        for chunk in self.manifest["chunks"]:
+            yield self.chunk(chunk["index"], column)
+
+    def column(self, column:str) -> np.ndarray:
+        """
+        The whole column (this one does load the data).
+        """
+        if self.chunkCount() == 0:
+            return np.empty(0, dtype=self.manifest["columns"][column])
+        return np.concatenate(list(self.chunks(column)))
+
+    def read(self, columns:List[str]=None) -> Dict[str, np.ndarray]:
+        columns = self.columns() if columns is None else columns
+        return {name: self.column(name) for name in columns}
+
+    def readRange(self, start:float=None, stop:float=None, columns:List[str]=None) -> Dict[str, np.ndarray]:
+        """
+        Samples with `start <= time <= stop`. Only the chunks overlapping the
+        range are touched (the manifest keeps the time span of every chunk)
+        and inside those only the needed rows are copied.
+        """
+        columns = self.columns() if columns is None else columns
+        start = float("-inf") if start is None else start
+        stop = float("inf") if stop is None else stop
+        parts: Dict[str, list] = {name: [] for name in columns}
+        for chunk in self.manifest["chunks"]:
+            if chunk["stop"] < start or chunk["start"] > stop:
+                continue
+            index = chunk["index"]
+            times = self.chunk(index, "time")
+            first = np.searchsorted(times, start, side="left")
+            last = np.searchsorted(times, stop, side="right")
+            if last <= first:
+                continue
+            for name in columns:
+                column = times if name == "time" else self.chunk(index, name)
+                parts[name].append(np.array(column[first:last]))
+        return {name: np.concatenate(values) if len(values) > 0 else np.empty(0, dtype=self.manifest["columns"][name]) for name, values in parts.items()}
@@ -0,0 +1,449 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import re
+import bisect
+import json
+import time
+import logging
+from queue import Queue, Full
+from threading import Thread, Lock
+from typing import Dict, List, Tuple
+
+# Third party libraries
+import numpy as np
+
+# Local libraries
+from src.device import Device, Sample, SampleBuffer
+from src.utils import Counters
+from .Journal import Journal, JOURNAL_FILENAME
+from .Pyramid import PyramidBuilder
+
+
+MANIFEST_FILENAME: str = "manifest.json"
+MANIFEST_VERSION: int = 1
+COMMANDS_FILENAME: str = "commands.csv"
+
+_log: logging.Logger = logging.getLogger(__name__)
+
+# NOTE: optional library, None if not installed (False until the first `pyarrow_module`).
+_pyarrow = False
+
+
+def pyarrow_module():
+    """
+    `pyarrow` with its parquet writer (optional, imported the first time it is
+    asked for since it is slow to import), None if it is not installed.
+    """
+    global _pyarrow
+    if _pyarrow is False:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            _pyarrow = pyarrow
+        except ImportError:
+            _pyarrow = None
+    return _pyarrow
+
+
+def chunk_filename(column:str, index:int, extension:str="npy") -> str:
+    return "%s_%06d.%s"%(column, index, extension)
+
+
+def write_json(path:str, data:dict) -> None:
+    """
+    Writes `data` to `path` atomically (a crash never leaves half a file).
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as fid:
+        fid.write(json.dumps(data, indent=1))
+    os.replace(tmp, path)
+
+
+def write_chunk(folder:str, index:int, row:int, block:Dict[str, np.ndarray], parquet:bool=False) -> dict:
+    """
+    Writes one chunk (every column) to `folder` and returns its manifest entry.
+    `row` is the index of the first sample of the chunk within the session.
+    """
+    for name, column in block.items():
+        np.save(os.path.join(folder, chunk_filename(name, index)), column)
+    pyarrow = pyarrow_module() if parquet else None
+    if pyarrow is not None:
+        table = pyarrow.table(block)
+        pyarrow.parquet.write_table(table, os.path.join(folder, chunk_filename("chunk", index, "parquet")))
+    return {"index": index, "row": row, "rows": len(block["time"]), "start": float(block["time"][0]), "stop": float(block["time"][-1])}
+
+
+def append_commands(folder:str, commands:List[Tuple[float, str]]) -> None:
+    with open(os.path.join(folder, COMMANDS_FILENAME), "a") as fid:
+        for t, command in commands:
+            fid.write(f"{t};{command}\n")
+
+
+class ChunkWriter:
+    """
+    Background thread writing the chunks (and manifests) of one or more
+    session loggers. The queue is bounded so memory stays bounded even if the
+    disk falls behind.
+    """
+    def __init__(self, max_chunks:int=16) -> None:
+        self._queue: Queue = Queue(maxsize=max_chunks)
+        self._thread: Thread = Thread(target=self._run, name="ChunkWriter", daemon=True)
+        self._thread.start()
+
+    def submit(self, job, timeout:float=1.0) -> bool:
+        """
+        Queues a job (a callable). Returns False if the queue stayed full for
+        `timeout` seconds (the job is then dropped).
+        """
+        try:
+            self._queue.put(job, timeout=timeout)
+            return True
+        except Full:
+            return False
+
+    def pending(self) -> int:
+        """
+        Jobs (chunks, manifests, ...) waiting to be written.
+        """
+        return self._queue.qsize()
+
+    def flush(self) -> None:
+        """
+        Blocks until all queued jobs are written.
+        """
+        self._queue.join()
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                job()
+            except Exception:
+                # NOTE: the thread is shared by every logger, one bad job must not end it.
+                _log.exception("ChunkWriter::_run : job failed")
+            finally:
+                self._queue.task_done()
+
+
+class SessionLogger:
+    """
+    Streams the samples of one device to a session folder: every column is
+    stored in NumPy chunks (`<column>_<index>.npy`) described by a JSON
+    manifest. Parquet chunks are written as well when pyarrow is installed and
+    requested.
+
+    `push` only copies the sample into a preallocated block, full (or old)
+    blocks are handed to the `ChunkWriter`. Until a block reaches the disk its
+    samples (and every command sent) live in the session `Journal`, which
+    `recover_session` uses after a crash. The writer also extends the level
+    of detail pyramid (see `PyramidBuilder`) with every chunk.
+    """
+    Columns: Dict[str, type] = SampleBuffer.Columns
+
+    def __init__(self, folder:str, device:Device=None, writer:ChunkWriter=None, chunk_size:int=65536, flush_interval:float=60.0, parquet:bool=False, metadata:dict=None, journal:bool=True, checkpoint_interval:float=1.0) -> None:
+        self._folder: str = folder
+        if not os.path.exists(self._folder):
+            os.makedirs(self._folder)
+
+        self._own_writer: bool = writer is None
+        self._writer: ChunkWriter = writer if writer is not None else ChunkWriter()
+        self._chunk_size: int = chunk_size
+        self._flush_interval: float = flush_interval
+        self._parquet: bool = parquet and pyarrow_module() is not None
+        self._lock: Lock = Lock()
+        self._closed: bool = False
+
+        self._block: Dict[str, np.ndarray] = self._newBlock()
+        self._rows: int = 0
+        self._block_start: float = None
+        self._chunk_index: int = 0
+        self._dropped: int = 0
+        self._dropped_commands: int = 0
+        self._counters: Counters = device.counters if device is not None else Counters()
+
+        # NOTE: crash journal (checkpointed by the writer thread)
+        self._journal: Journal = Journal(os.path.join(self._folder, JOURNAL_FILENAME)) if journal else None
+        self._checkpoint_interval: float = checkpoint_interval
+        self._last_checkpoint: float = time.time()
+
+        # NOTE: level of detail pyramid (only touched by the writer thread)
+        self._pyramid: PyramidBuilder = PyramidBuilder(self._folder)
+
+        # NOTE: running statistics of the calibrated value (for the run catalog)
+        self._count: int = 0
+        self._sum: float = 0.0
+        self._sum2: float = 0.0
+        self._min: float = float("inf")
+        self._max: float = float("-inf")
+
+        self._manifest: dict = {
+            "version": MANIFEST_VERSION,
+            "device": device.port if device is not None else None,
+            "calibration": device.calibration.name if device is not None else None,
+            "start": time.time(),
+            "stop": None,
+            "complete": False,
+            "rows": 0,
+            "columns": {name: np.dtype(dtype).name for name, dtype in self.Columns.items()},
+            "formats": ["npy", "parquet"] if self._parquet else ["npy"],
+            "chunks": [],
+            "pyramid": self._pyramid.info(),
+            "metadata": metadata if metadata is not None else {},
+        }
+        write_json(os.path.join(self._folder, MANIFEST_FILENAME), self._manifest)
+
+    @staticmethod
+    def sessionName(port:str, start:float=None) -> str:
+        """
+        A (file system safe) name for a new session of the device on `port`.
+        """
+        start = time.time() if start is None else start
+        return time.strftime("%Y%m%d-%H%M%S", time.localtime(start)) + "_" + re.sub(r"[^A-Za-z0-9]+", "_", port).strip("_")
+
+    def folder(self) -> str:
+        return self._folder
+
+    def dropped(self) -> int:
+        """
+        Number of samples lost because the writer could not keep up.
+        """
+        return self._dropped
+
+    def droppedCommands(self) -> int:
+        """
+        Number of commands not written to the commands file because the writer
+        could not keep up (they are still in the journal).
+        """
+        return self._dropped_commands
+
+    def summary(self) -> dict:
+        """
+        Summary of the session so far (start, stop, rows and statistics of
+        the calibrated value).
+        """
+        with self._lock:
+            count = self._count
+            mean = self._sum/count if count > 0 else None
+            std = max(self._sum2/count - mean*mean, 0.0)**0.5 if count > 0 else None
+            return {
+                "device": self._manifest["device"],
+                "calibration": self._manifest["calibration"],
+                "start": self._manifest["start"],
+                "stop": self._manifest["stop"] if self._manifest["stop"] is not None else time.time(),
+                "rows": count,
+                "min": self._min if count > 0 else None,
+                "max": self._max if count > 0 else None,
+                "mean": mean,
+                "std": std,
+                "metadata": dict(self._manifest["metadata"]),
+            }
+
+    def push(self, device:Device, sample:Sample) -> None:
+        """
+        Sample callback (see `Device.addSampleCallback`).
+        """
+        with self._lock:
+            if self._closed:
+                return
+            i = self._rows
+            block = self._block
+            block["time"][i] = sample.time
+            block["raw"][i] = sample.raw
+            block["value"][i] = sample.value
+            block["setpoint"][i] = sample.setpoint
+            block["limits"][i] = sample.limits
+            block["volume"][i] = sample.volume
+            self._rows = i + 1
+            if self._journal is not None:
+                self._journal.appendSample(self._count, *sample)
+                if sample.time - self._last_checkpoint >= self._checkpoint_interval:
+                    self._last_checkpoint = sample.time
+                    self._writer.submit(self._checkpoint, timeout=0)
+            value = sample.value
+            self._count += 1
+            self._sum += value
+            self._sum2 += value*value
+            if value < self._min:
+                self._min = value
+            if value > self._max:
+                self._max = value
+            if self._block_start is None:
+                self._block_start = sample.time
+            if self._rows == self._chunk_size or sample.time - self._block_start >= self._flush_interval:
+                self._submitBlock()
+
+    def pushCommand(self, device:Device, t:float, command:str) -> None:
+        """
+        Command callback (see `Device.addCommandCallback`).
+        """
+        with self._lock:
+            if self._closed:
+                return
+            if self._journal is not None:
+                self._journal.appendCommand(self._count, t, command)
+            # NOTE: called from the I/O worker, never wait for the writer.
+            if not self._writer.submit(lambda: append_commands(self._folder, [(t, command)]), timeout=0):
+                self._dropped_commands += 1
+                self._counters.add(Counters.CommandsDropped)
+                _log.warning("SessionLogger::pushCommand : writer is late, dropped command %s.", command)
+
+    def close(self) -> None:
+        """
+        Writes what is left and marks the session as complete (the journal is
+        then removed).
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            if self._rows > 0:
+                self._submitBlock(timeout=None)
+            self._writer.submit(self._finalize, timeout=None)
+        if self._own_writer:
+            self._writer.stop()
+
+    def _newBlock(self) -> Dict[str, np.ndarray]:
+        return {name: np.empty(self._chunk_size, dtype=dtype) for name, dtype in self.Columns.items()}
+
+    def _submitBlock(self, timeout:float=0) -> None:
+        # NOTE: `push` (the I/O worker) never waits for the writer, only `close` does.
+        rows, index = self._rows, self._chunk_index
+        row = self._count - rows
+        block = {name: column[:rows] for name, column in self._block.items()}
+        if self._writer.submit(lambda: self._writeChunk(index, row, block), timeout=timeout):
+            self._chunk_index += 1
+        else:
+            self._dropped += rows
+            self._counters.add(Counters.SamplesDropped, rows)
+            _log.warning("SessionLogger::_submitBlock : writer is late, dropped %d samples.", rows)
+        self._block = self._newBlock()
+        self._rows = 0
+        self._block_start = None
+
+    def _writeChunk(self, index:int, row:int, block:Dict[str, np.ndarray]) -> None:
+        chunk = write_chunk(self._folder, index, row, block, self._parquet)
+        self._pyramid.append(block["time"], block["value"])
+        self._manifest["chunks"].append(chunk)
+        self._manifest["rows"] += chunk["rows"]
+        self._manifest["pyramid"] = self._pyramid.info()
+        write_json(os.path.join(self._folder, MANIFEST_FILENAME), self._manifest)
+
+    def _checkpoint(self) -> None:
+        # NOTE: only the count is taken under the lock, the CRC and the flush don't block the I/O worker.
+        with self._lock:
+            journal = self._journal
+            if journal is None or journal.pending() == 0:
+                return
+            stop = journal.count()
+        journal.checkpoint(stop)
+
+    def _finalize(self) -> None:
+        self._pyramid.close()
+        self._manifest["pyramid"] = self._pyramid.info()
+        self._manifest["stop"] = time.time()
+        self._manifest["complete"] = True
+        write_json(os.path.join(self._folder, MANIFEST_FILENAME), self._manifest)
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close(remove=True)
+                self._journal = None
+
+
+def recover_session(folder:str) -> bool:
+    """
+    Turns a session left unfinished (crash) into a normal, complete session:
+    the journal samples not yet in the chunks are written as a new chunk, the
+    missing commands are appended and the manifest is closed. Returns True if
+    the session was recovered.
+    """
+    manifest_path = os.path.join(folder, MANIFEST_FILENAME)
+    journal_path = os.path.join(folder, JOURNAL_FILENAME)
+    if not os.path.exists(manifest_path):
+        return False
+    with open(manifest_path, "r") as fid:
+        manifest = json.loads(fid.read())
+    if manifest.get("complete", False):
+        if os.path.exists(journal_path):
+            os.remove(journal_path)
+        return False
+
+    samples, commands, intact = [], [], True
+    if os.path.exists(journal_path):
+        samples, commands, intact = Journal.read(journal_path)
+
+    # NOTE: rows already on disk (chunks are only listed once fully written).
+    spans = sorted((chunk.get("row", 0), chunk.get("row", 0) + chunk["rows"]) for chunk in manifest["chunks"])
+    starts = [span[0] for span in spans]
+
+    def covered(row:int) -> bool:
+        i = bisect.bisect_right(starts, row) - 1
+        return i >= 0 and row < spans[i][1]
+
+    missing = [sample for sample in samples if not covered(sample[0])]
+    if len(missing) > 0:
+        block = {
+            "time": np.array([s[1] for s in missing], dtype=SessionLogger.Columns["time"]),
+            "raw": np.array([s[2] for s in missing], dtype=SessionLogger.Columns["raw"]),
+            "value": np.array([s[3] for s in missing], dtype=SessionLogger.Columns["value"]),
+            "setpoint": np.array([s[4] for s in missing], dtype=SessionLogger.Columns["setpoint"]),
+            "limits": np.array([s[5] for s in missing], dtype=SessionLogger.Columns["limits"]),
+            "volume": np.array([s[6] for s in missing], dtype=SessionLogger.Columns["volume"]),
+        }
+        index = max([chunk["index"] for chunk in manifest["chunks"]], default=-1) + 1
+        chunk = write_chunk(folder, index, missing[0][0], block, "parquet" in manifest.get("formats", []))
+        manifest["chunks"].append(chunk)
+        manifest["rows"] += chunk["rows"]
+
+    # NOTE: commands already written are skipped (by time).
+    written = set()
+    commands_path = os.path.join(folder, COMMANDS_FILENAME)
+    if os.path.exists(commands_path):
+        with open(commands_path, "r") as fid:
+            for line in fid.readlines():
+                written.add(float(line.split(";")[0]))
+    append_commands(folder, [(t, command) for _, t, command in commands if t not in written])
+
+    stops = [chunk["stop"] for chunk in manifest["chunks"]] + [t for _, t, _ in commands]
+    manifest["stop"] = max(stops) if len(stops) > 0 else manifest["start"]
+
+    # NOTE: the pyramid tail was never flushed, rebuilding it from the chunks.
+    chunks = ((np.load(os.path.join(folder, chunk_filename("time", chunk["index"])), mmap_mode="r"),
+               np.load(os.path.join(folder, chunk_filename("value", chunk["index"])), mmap_mode="r")) for chunk in sorted(manifest["chunks"], key=lambda c: c.get("row", 0)))
+    manifest["pyramid"] = PyramidBuilder.build(folder, chunks).info()
+    manifest["complete"] = True
+    manifest["recovered"] = {"time": time.time(), "samples": len(missing), "intact": intact}
+    write_json(manifest_path, manifest)
+    if os.path.exists(journal_path):
+        os.remove(journal_path)
+    return True
@@ -0,0 +1,118 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+from typing import Callable, Dict, List
+
+# Local libraries
+from src.device import DeviceManager
+from .SessionLogger import SessionLogger, ChunkWriter, recover_session
+from .Catalog import RunCatalog
+
+
+class SessionRecorder:
+    """
+    Records a session for every device of a `DeviceManager` while it is
+    connected (a new session each time the device connects). All sessions
+    share the same `ChunkWriter` thread. Finished sessions are added to the
+    `RunCatalog` (if given).
+    """
+    def __init__(self, devices:DeviceManager, folder:str, catalog:RunCatalog=None, metadata:Callable[[], dict]=None, **options) -> None:
+        self._devices: DeviceManager = devices
+        self._devices.Signal.DeviceStateChanged.connect(self._onDeviceStateChanged)
+        self._folder: str = folder
+        self._catalog: RunCatalog = catalog
+        self._metadata: Callable[[], dict] = metadata
+        self._options: dict = options
+        self._writer: ChunkWriter = ChunkWriter()
+        self._loggers: Dict[str, SessionLogger] = {}
+
+    def logger(self, port:str) -> SessionLogger:
+        return self._loggers.get(port)
+
+    def pending(self) -> int:
+        """
+        Jobs waiting for the shared writer thread.
+        """
+        return self._writer.pending()
+
+    def start(self, port:str) -> SessionLogger:
+        self.stop(port)
+        device = self._devices.device(port)
+        folder = os.path.join(self._folder, SessionLogger.sessionName(port))
+        metadata = self._metadata() if self._metadata is not None else {}
+        logger = SessionLogger(folder, device=device, writer=self._writer, metadata=metadata, **self._options)
+        device.addSampleCallback(logger.push)
+        device.addCommandCallback(logger.pushCommand)
+        self._loggers[port] = logger
+        print("SessionRecorder::start : recording", port, "to", folder)
+        return logger
+
+    def stop(self, port:str) -> None:
+        logger = self._loggers.pop(port, None)
+        if logger is not None:
+            device = self._devices.device(port)
+            if device is not None:
+                device.removeSampleCallback(logger.push)
+                device.removeCommandCallback(logger.pushCommand)
+            logger.close()
+            if self._catalog is not None:
+                self._catalog.add(os.path.basename(logger.folder()), logger.folder(), logger.summary())
+
+    def stopAll(self) -> None:
+        for port in list(self._loggers.keys()):
+            self.stop(port)
+        self._writer.flush()
+
+    def recover(self) -> List[str]:
+        """
+        Recovers the sessions left unfinished by a crash (see `recover_session`)
+        and adds them to the catalog. Returns the recovered session folders.
+        """
+        recovered = []
+        if not os.path.exists(self._folder):
+            return recovered
+        for name in sorted(os.listdir(self._folder)):
+            folder = os.path.join(self._folder, name)
+            if not os.path.isdir(folder) or name in self._activeNames():
+                continue
+            try:
+                if recover_session(folder):
+                    recovered.append(folder)
+                    if self._catalog is not None:
+                        self._catalog.addSession(folder)
+            except (OSError, ValueError, KeyError) as error:
+                print("SessionRecorder::recover : unable to recover", folder, "->", error)
+        return recovered
+
+    def _activeNames(self) -> List[str]:
+        return [os.path.basename(logger.folder()) for logger in self._loggers.values()]
+
+    def _onDeviceStateChanged(self, port:str, flag:bool) -> None:
+        if flag:
+            self.start(port)
+        else:
+            self.stop(port)
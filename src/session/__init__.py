@@ -0,0 +1,7 @@
+from .SessionLogger import SessionLogger, ChunkWriter, recover_session
+from .Journal import Journal
+from .SessionRecorder import SessionRecorder
+from .Session import Session
+from .Catalog import RunCatalog, CATALOG_FILENAME
+from .Pyramid import Pyramid, PyramidBuilder, lttb
+from .Analysis import analyze_session, analyze_runs, ANALYSIS_VERSION
@@ -36,10 +36,15 @@ from src.utils import SingletonMetaClass
 class ObserverSignal(QtCore.QObject):
     Connect: QtCore.pyqtSignal = QtCore.pyqtSignal()
     ValuePressureChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(float)
+    ValueVolumeChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(float)
     NewTargetPressure: QtCore.pyqtSignal = QtCore.pyqtSignal(float)
     EmptyTank: QtCore.pyqtSignal = QtCore.pyqtSignal()
     FillTank: QtCore.pyqtSignal = QtCore.pyqtSignal()
     SendInfo: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    # NOTE: a `SettlingResult` (emitted from the I/O workers, see `SettlingMonitor`)
+    Settled: QtCore.pyqtSignal = QtCore.pyqtSignal(object)
+    # NOTE: an `AlarmEvent` (emitted from the I/O workers, see `AlarmEngine`)
+    Alarm: QtCore.pyqtSignal = QtCore.pyqtSignal(object)
     def __init__(self):
         QtCore.QObject.__init__(self)
 
@@ -25,6 +25,7 @@ SOFTWARE.
 # Python libraries
 import os
 import json
+import getpass
 import warnings
 from typing import Any, List, Tuple
 
@@ -44,6 +45,15 @@ class SettingsSignal(QtCore.QObject):
     UnitVolumeChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
     PrecisionPressureChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(int)
     PrecisionVolumeChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(int)
+    OperatorChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    FilterChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    HostControlChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(bool)
+    ControllerGainsChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    ControllerRateChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(float)
+    PistonGeometryChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    ProfilersChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(str)
+    MetricsPortChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(int)
+    StallThresholdChanged: QtCore.pyqtSignal = QtCore.pyqtSignal(int)
 
     def __init__(self):
         QtCore.QObject.__init__(self)
@@ -66,6 +76,16 @@ class Settings(metaclass=SingletonMetaClass):
     PrecisionPressure: str = "Precision Pressure"
     PrecisionVolume: str = "Precision Volume"
 
+    Operator: str = "Operator"
+    Filter: str = "Filter"
+    HostControl: str = "Host Control"
+    ControllerGains: str = "Controller Gains"
+    ControllerRate: str = "Controller Rate"
+    PistonGeometry: str = "Piston Geometry"
+    Profilers: str = "Profilers"
+    MetricsPort: str = "Metrics Port"
+    StallThreshold: str = "Stall Threshold"
+
     NullString: str = "None"
     def __init__(self, user_folder:str=None, name:str=None, version:str=None) -> None:
         # NOTE: signal class (emitted when some relevant property has changed)
@@ -76,6 +96,8 @@ class Settings(metaclass=SingletonMetaClass):
         self._user_file: str = os.path.join(self._user_folder, "configuration.json")
         self._calibration_folder: str = os.path.join(self._user_folder, "Calibration")
         self._calibration_extension: str = "csv"
+        self._sessions_folder: str = os.path.join(self._user_folder, "Sessions")
+        self._alarms_file: str = os.path.join(self._user_folder, "alarms.json")
 
         # NOTE: default properties (properties will be initialized from these if not already existing)
         self._defaults: dict = {}
@@ -87,6 +109,16 @@ class Settings(metaclass=SingletonMetaClass):
         self._defaults[self.UnitVolume] = "cm<sup>3<\sup>"
         self._defaults[self.PrecisionPressure] = 2
         self._defaults[self.PrecisionVolume] = 2
+        self._defaults[self.Operator] = getpass.getuser()
+        self._defaults[self.Filter] = ""
+        self._defaults[self.HostControl] = False
+        self._defaults[self.ControllerGains] = "-0.2, 0, 0.5, 1"
+        self._defaults[self.ControllerRate] = 2.0
+        self._defaults[self.PistonGeometry] = "50.0, 2.0, 3200"
+        self._defaults[self.Profilers] = ""
+        self._defaults[self.MetricsPort] = 0
+        # NOTE: milliseconds the interface may freeze before its stack is logged (0 is off).
+        self._defaults[self.StallThreshold] = 250
 
         # NOTE: associated signals
         self._signals: dict = {}
@@ -98,6 +130,15 @@ class Settings(metaclass=SingletonMetaClass):
         self._signals[self.UnitVolume] = self.Signal.UnitVolumeChanged
         self._signals[self.PrecisionPressure] = self.Signal.PrecisionPressureChanged
         self._signals[self.PrecisionVolume] = self.Signal.PrecisionVolumeChanged
+        self._signals[self.Operator] = self.Signal.OperatorChanged
+        self._signals[self.Filter] = self.Signal.FilterChanged
+        self._signals[self.HostControl] = self.Signal.HostControlChanged
+        self._signals[self.ControllerGains] = self.Signal.ControllerGainsChanged
+        self._signals[self.ControllerRate] = self.Signal.ControllerRateChanged
+        self._signals[self.PistonGeometry] = self.Signal.PistonGeometryChanged
+        self._signals[self.Profilers] = self.Signal.ProfilersChanged
+        self._signals[self.MetricsPort] = self.Signal.MetricsPortChanged
+        self._signals[self.StallThreshold] = self.Signal.StallThresholdChanged
         
         # NOTE: properties dictionary (the real settings)
         self._properties: dict = {}
@@ -139,6 +180,8 @@ class Settings(metaclass=SingletonMetaClass):
         """
         if not os.path.exists(self._calibration_folder):
             os.mkdir(self._calibration_folder)
+        if not os.path.exists(self._sessions_folder):
+            os.mkdir(self._sessions_folder)
         if not os.path.exists(self._user_file):
             self._propertyCheck()
             self.save()
@@ -149,6 +192,8 @@ class Settings(metaclass=SingletonMetaClass):
         self._properties = json.loads(file_str)
         self._properties[self.Name] = self._defaults[self.Name]
         self._properties[self.Version] = self._defaults[self.Version]
+        # NOTE: profilers never start on their own (see the --profile option).
+        self._properties[self.Profilers] = self._defaults[self.Profilers]
         if self._propertyCheck():
             self.save()
         return True
@@ -159,6 +204,15 @@ class Settings(metaclass=SingletonMetaClass):
         """
         return [key for key in self._properties.keys()]
 
+    def userFolder(self) -> str:
+        return self._user_folder
+
+    def sessionsFolder(self) -> str:
+        return self._sessions_folder
+
+    def alarmsFile(self) -> str:
+        return self._alarms_file
+
     def calibrationCurves(self) -> List[str]:
         return self._loadFiles(self._calibration_folder)
 
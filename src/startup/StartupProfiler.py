@@ -0,0 +1,124 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries (standard library only, this module is imported before everything else)
+import os
+import sys
+import time
+import builtins
+import threading
+import importlib.util
+from typing import List, Tuple
+
+
+class StartupProfiler:
+    """
+    Measures the startup: the wall-clock time of every init phase (marked
+    with `phase`) and, when `imports` is True, the time spent importing each
+    module (self and cumulative, like `python -X importtime`), timed by
+    wrapping `builtins.__import__` until `stop` is called.
+
+    It must be created before the imports to measure (first thing in the
+    entry point).
+    """
+    def __init__(self, imports:bool=False) -> None:
+        self._start: float = time.perf_counter()
+        self._last: float = self._start
+        self._phases: List[Tuple[str, float]] = []
+        # NOTE: (depth, module, self, cumulative) in the order the imports finish.
+        self._imports: List[Tuple[int, str, float, float]] = []
+        # NOTE: [start, time of the nested imports] of the imports in progress.
+        self._stack: List[list] = []
+        self._original = builtins.__import__
+        # NOTE: only the imports of the starting thread are timed (the nesting is per thread).
+        self._thread: int = threading.get_ident()
+        self._active: bool = imports
+        if imports:
+            builtins.__import__ = self._import
+
+    def isProfiling(self) -> bool:
+        return self._active
+
+    def phase(self, name:str) -> None:
+        """
+        Ends the current phase (`name` is what was done in it).
+        """
+        now = time.perf_counter()
+        self._phases.append((name, now - self._last))
+        self._last = now
+
+    def stop(self) -> None:
+        if self._active:
+            self._active = False
+            if builtins.__import__ == self._import:
+                builtins.__import__ = self._original
+
+    def report(self, top:int=20) -> str:
+        lines = ["phase                                  ms     total ms"]
+        total = 0.0
+        for name, duration in self._phases:
+            total += duration
+            lines.append("{:<32} {:>8.1f} {:>12.1f}".format(name, duration*1000.0, total*1000.0))
+        if self._imports:
+            lines += ["", "slowest imports (self ms | cumulative ms | module)"]
+            for depth, name, own, cumulative in sorted(self._imports, key=lambda entry: -entry[2])[:top]:
+                lines.append("{:>8.1f} | {:>8.1f} | {}".format(own*1000.0, cumulative*1000.0, name))
+            lines += ["", "all imports (self ms | cumulative ms | module)"]
+            for depth, name, own, cumulative in self._imports:
+                lines.append("{:>8.1f} | {:>8.1f} | {}{}".format(own*1000.0, cumulative*1000.0, "  "*depth, name))
+        return "\n".join(lines) + "\n"
+
+    def save(self, folder:str, name:str="startup") -> str:
+        """
+        Writes the report to `folder` and returns its path.
+        """
+        self.stop()
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        path = os.path.join(folder, time.strftime("%Y%m%d-%H%M%S") + "_" + name + ".txt")
+        with open(path, "w") as fid:
+            fid.write(self.report())
+        print("StartupProfiler::save : startup report ->", path)
+        return path
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        module = name
+        if level:
+            try:
+                module = importlib.util.resolve_name("."*level + name, (globals or {}).get("__package__"))
+            except (ImportError, ValueError):
+                pass
+        # NOTE: imports of modules already loaded are nearly free, they are not timed.
+        if module in sys.modules or not module or threading.get_ident() != self._thread:
+            return self._original(name, globals, locals, fromlist, level)
+        self._stack.append([time.perf_counter(), 0.0])
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            start, nested = self._stack.pop()
+            cumulative = time.perf_counter() - start
+            if self._stack:
+                self._stack[-1][1] += cumulative
+            self._imports.append((len(self._stack), module, cumulative - nested, cumulative))
@@ -0,0 +1 @@
+from .StartupProfiler import StartupProfiler
\ No newline at end of file
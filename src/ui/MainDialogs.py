@@ -24,6 +24,7 @@ SOFTWARE.
 
 
 # Python libraries
+import os
 from typing import List
 
 # Qt libraries
@@ -34,6 +35,11 @@ from src.settings import Settings, Observer
 from src.language import Language
 from src.unit     import Unit
 from src.assets   import Assets
+from src.session  import Session
+from src.device   import FilterPipeline, PistonGeometry, DeviceManager, LatencyTracker
+from src.control  import parse_gains
+from src.utils    import Counters, Profiler
+from .PlotWidgets import SessionPlotWidget
 
 
 class HTMLStyle(QtWidgets.QProxyStyle):
@@ -290,6 +296,8 @@ class UnitsDialog(QtWidgets.QDialog):
 
 
 class PreferencesDialog(QtWidgets.QDialog):
+    FilterPresets: List[str] = ["None", "median:5", "average:10", "ema:0.2", "median:5, ema:0.2", "kalman:0.01:1"]
+
     def __init__(self, parent=None, settings:Settings=None, language:Language=None, unit:Unit=None, observer:Observer=None, assets:Assets=None):
         QtWidgets.QDialog.__init__(self, parent)
 
@@ -309,6 +317,64 @@ class PreferencesDialog(QtWidgets.QDialog):
         self._language_option.addItems(self._language.options())
         self._language_option.setCurrentText(self._settings.getProperty(self._settings.Language))
 
+        self._operator_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.Operator) + ":", self)
+        self._operator_value: QtWidgets.QLineEdit = QtWidgets.QLineEdit(self._settings.getProperty(self._settings.Operator), self)
+
+        self._filter_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.Filter) + ":", self)
+        self._filter_option: QtWidgets.QComboBox = QtWidgets.QComboBox(self)
+        self._filter_option.setEditable(True)
+        self._filter_option.addItems(self.FilterPresets)
+        self._filter_option.setCurrentText(self._settings.getProperty(self._settings.Filter) or self._settings.NullString)
+        self._filter_option.setToolTip(self._language.get(self._language.FilterTooltip))
+
+        self._host_control_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.HostControl) + ":", self)
+        self._host_control_check: QtWidgets.QCheckBox = QtWidgets.QCheckBox(self)
+        self._host_control_check.setChecked(self._settings.getProperty(self._settings.HostControl))
+        self._host_control_check.setToolTip(self._language.get(self._language.HostControlTooltip))
+
+        self._gains_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.ControllerGains) + ":", self)
+        self._gains_value: QtWidgets.QLineEdit = QtWidgets.QLineEdit(self._settings.getProperty(self._settings.ControllerGains), self)
+        self._gains_value.setToolTip(self._language.get(self._language.ControllerGainsTooltip))
+
+        self._rate_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.ControllerRate) + ":", self)
+        self._rate_value: QtWidgets.QDoubleSpinBox = QtWidgets.QDoubleSpinBox(self)
+        self._rate_value.setRange(0.1, 50.0)
+        self._rate_value.setSingleStep(0.5)
+        self._rate_value.setValue(self._settings.getProperty(self._settings.ControllerRate))
+
+        self._geometry_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.PistonGeometry) + ":", self)
+        self._geometry_value: QtWidgets.QLineEdit = QtWidgets.QLineEdit(self._settings.getProperty(self._settings.PistonGeometry), self)
+        self._geometry_value.setToolTip(self._language.get(self._language.PistonGeometryTooltip))
+
+        self._profilers_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.Profiling) + ":", self)
+        try:
+            active = Profiler.parse(self._settings.getProperty(self._settings.Profilers))
+        except ValueError as error:
+            print("PreferencesDialog::__init__ : ignoring profilers setting ->", error)
+            active = []
+        self._profiler_checks: List[QtWidgets.QCheckBox] = []
+        for name in Profiler.Names:
+            check = QtWidgets.QCheckBox(name, self)
+            check.setChecked(name in active)
+            check.setToolTip(self._language.get(self._language.ProfilingTooltip))
+            self._profiler_checks.append(check)
+
+        self._metrics_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.MetricsPort) + ":", self)
+        self._metrics_value: QtWidgets.QSpinBox = QtWidgets.QSpinBox(self)
+        self._metrics_value.setRange(0, 65535)
+        self._metrics_value.setSpecialValueText(self._language.get(self._language.Off))
+        self._metrics_value.setValue(self._settings.getProperty(self._settings.MetricsPort))
+        self._metrics_value.setToolTip(self._language.get(self._language.MetricsPortTooltip))
+
+        self._stall_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.StallThreshold) + ":", self)
+        self._stall_value: QtWidgets.QSpinBox = QtWidgets.QSpinBox(self)
+        self._stall_value.setRange(0, 60000)
+        self._stall_value.setSingleStep(50)
+        self._stall_value.setSuffix(" ms")
+        self._stall_value.setSpecialValueText(self._language.get(self._language.Off))
+        self._stall_value.setValue(self._settings.getProperty(self._settings.StallThreshold))
+        self._stall_value.setToolTip(self._language.get(self._language.StallThresholdTooltip))
+
         self._asterisk_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.AsteriskRestartNeeded), self)
 
         self._cancel_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._language.get(self._language.Cancel), self)
@@ -322,6 +388,36 @@ class PreferencesDialog(QtWidgets.QDialog):
         top_layout.addWidget(self._language_label, i, 0)
         top_layout.addWidget(self._language_option, i, 1)
         i += 1
+        top_layout.addWidget(self._operator_label, i, 0)
+        top_layout.addWidget(self._operator_value, i, 1)
+        i += 1
+        top_layout.addWidget(self._filter_label, i, 0)
+        top_layout.addWidget(self._filter_option, i, 1)
+        i += 1
+        top_layout.addWidget(self._host_control_label, i, 0)
+        top_layout.addWidget(self._host_control_check, i, 1)
+        i += 1
+        top_layout.addWidget(self._gains_label, i, 0)
+        top_layout.addWidget(self._gains_value, i, 1)
+        i += 1
+        top_layout.addWidget(self._rate_label, i, 0)
+        top_layout.addWidget(self._rate_value, i, 1)
+        i += 1
+        top_layout.addWidget(self._geometry_label, i, 0)
+        top_layout.addWidget(self._geometry_value, i, 1)
+        i += 1
+        profilers_hbox: QtWidgets.QHBoxLayout = QtWidgets.QHBoxLayout()
+        for check in self._profiler_checks:
+            profilers_hbox.addWidget(check)
+        top_layout.addWidget(self._profilers_label, i, 0)
+        top_layout.addLayout(profilers_hbox, i, 1)
+        i += 1
+        top_layout.addWidget(self._metrics_label, i, 0)
+        top_layout.addWidget(self._metrics_value, i, 1)
+        i += 1
+        top_layout.addWidget(self._stall_label, i, 0)
+        top_layout.addWidget(self._stall_value, i, 1)
+        i += 1
         top_layout.addWidget(self._asterisk_label, i, 0, 1, 2)
 
         layout_bottom: QtWidgets.QHBoxLayout = QtWidgets.QHBoxLayout()
@@ -340,10 +436,42 @@ class PreferencesDialog(QtWidgets.QDialog):
 
     def _onApply(self) -> None:
         language: str = self._language_option.currentText()
+        operator: str = self._operator_value.text()
+        spec: str = self._filter_option.currentText().strip()
+        try:
+            spec = FilterPipeline.fromSpec(spec).spec()
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, self._language.get(self._language.InvalidFilter), str(error))
+            return
+        gains: str = self._gains_value.text().strip()
+        try:
+            parse_gains(gains)
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, self._language.get(self._language.InvalidGains), str(error))
+            return
+        try:
+            geometry: str = PistonGeometry.fromSpec(self._geometry_value.text()).spec()
+        except ValueError as error:
+            QtWidgets.QMessageBox.warning(self, self._language.get(self._language.InvalidGeometry), str(error))
+            return
+        host_control: bool = self._host_control_check.isChecked()
+        rate: float = self._rate_value.value()
+        profilers: str = ", ".join(check.text() for check in self._profiler_checks if check.isChecked())
+        metrics_port: int = self._metrics_value.value()
+        stall_threshold: int = self._stall_value.value()
         
         self._settings.setProperty(self._settings.Language, language)
-
-        print("PreferencesDialog::_onApply : saved preferences data as -> Language=(", language, ")")
+        self._settings.setProperty(self._settings.Operator, operator)
+        self._settings.setProperty(self._settings.Filter, spec)
+        self._settings.setProperty(self._settings.ControllerGains, gains)
+        self._settings.setProperty(self._settings.ControllerRate, rate)
+        self._settings.setProperty(self._settings.HostControl, host_control)
+        self._settings.setProperty(self._settings.PistonGeometry, geometry)
+        self._settings.setProperty(self._settings.Profilers, profilers)
+        self._settings.setProperty(self._settings.MetricsPort, metrics_port)
+        self._settings.setProperty(self._settings.StallThreshold, stall_threshold)
+
+        print("PreferencesDialog::_onApply : saved preferences data as -> Language=(", language, "), Operator=(", operator, "), Filter=(", spec, "), HostControl=(", host_control, gains, rate, "), PistonGeometry=(", geometry, "), Profilers=(", profilers, "), MetricsPort=(", metrics_port, "), StallThreshold=(", stall_threshold, ")")
 
         self._onClose()
 
@@ -385,6 +513,149 @@ class InfoDialog(QtWidgets.QDialog):
         self.close()
 
 
+class SessionDialog(QtWidgets.QDialog):
+    def __init__(self, parent=None, session:Session=None, title:str=None, unit:Unit=None, close_text:str=None, counters:Counters=None):
+        QtWidgets.QDialog.__init__(self, parent)
+
+        self.setWindowTitle(title)
+
+        self._plot_widget: SessionPlotWidget = SessionPlotWidget(self, session=session, unit=unit, counters=counters)
+
+        self._close_button: QtWidgets.QPushButton = QtWidgets.QPushButton(close_text, self)
+        self._close_button.clicked.connect(self._onClose)
+
+        hbox_bottom: QtWidgets.QHBoxLayout = QtWidgets.QHBoxLayout()
+        hbox_bottom.addStretch()
+        hbox_bottom.addWidget(self._close_button)
+
+        layout: QtWidgets.QVBoxLayout = QtWidgets.QVBoxLayout()
+        layout.addWidget(self._plot_widget)
+        layout.addLayout(hbox_bottom)
+        self.setLayout(layout)
+        self.resize(900, 500)
+
+    def _onClose(self) -> None:
+        self.close()
+
+
+class DiagnosticsDialog(QtWidgets.QDialog):
+    """
+    Per stage latencies (see `LatencyTracker`) of the samples of one device,
+    from the port read to the widgets, and its command response times,
+    refreshed every second.
+    """
+    Percents: List[float] = [50.0, 90.0, 99.0, 99.9]
+
+    def __init__(self, parent=None, devices:DeviceManager=None, language:Language=None, folder:str=None, port:str=None, counters:Counters=None):
+        QtWidgets.QDialog.__init__(self, parent)
+
+        self._devices: DeviceManager = devices
+        # NOTE: interface counters, shown after the ones of the device
+        self._counters: Counters = counters if counters is not None else Counters()
+        self._language: Language = language
+        self._folder: str = folder
+
+        self.setWindowTitle(self._language.get(self._language.Diagnostics))
+
+        self._port_combo: QtWidgets.QComboBox = QtWidgets.QComboBox(self)
+        self._port_combo.addItems(self._devices.ports())
+        if port in self._devices.ports():
+            self._port_combo.setCurrentText(port)
+        self._port_combo.currentTextChanged.connect(self._refresh)
+
+        headers = [self._language.get(self._language.LatencyCount), self._language.get(self._language.LatencyMean)] + ["p" + format(percent, "g") for percent in self.Percents] + [self._language.get(self._language.LatencyMax)]
+        self._rows: List[str] = list(LatencyTracker.Stages + LatencyTracker.Responses)
+        self._table: QtWidgets.QTableWidget = QtWidgets.QTableWidget(len(self._rows), len(headers), self)
+        self._table.setHorizontalHeaderLabels(headers)
+        self._table.setVerticalHeaderLabels(self._rows)
+        self._table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self._table.horizontalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Stretch)
+
+        self._age_label: QtWidgets.QLabel = QtWidgets.QLabel("", self)
+        self._counters_label: QtWidgets.QLabel = QtWidgets.QLabel("", self)
+        self._counters_label.setWordWrap(True)
+
+        self._reset_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._language.get(self._language.LatencyReset), self)
+        self._reset_button.clicked.connect(self._onReset)
+        self._save_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._language.get(self._language.LatencySave), self)
+        self._save_button.clicked.connect(self._onSave)
+        self._close_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._language.get(self._language.Close), self)
+        self._close_button.clicked.connect(self._onClose)
+
+        hbox_top: QtWidgets.QHBoxLayout = QtWidgets.QHBoxLayout()
+        hbox_top.addWidget(QtWidgets.QLabel(self._language.get(self._language.ComPort), self))
+        hbox_top.addWidget(self._port_combo)
+        hbox_top.addStretch()
+
+        hbox_bottom: QtWidgets.QHBoxLayout = QtWidgets.QHBoxLayout()
+        hbox_bottom.addWidget(self._reset_button)
+        hbox_bottom.addWidget(self._save_button)
+        hbox_bottom.addStretch()
+        hbox_bottom.addWidget(self._close_button)
+
+        layout: QtWidgets.QVBoxLayout = QtWidgets.QVBoxLayout()
+        layout.addLayout(hbox_top)
+        layout.addWidget(QtWidgets.QLabel(self._language.get(self._language.LatencyUnits), self))
+        layout.addWidget(self._table)
+        layout.addWidget(self._age_label)
+        layout.addWidget(self._counters_label)
+        layout.addLayout(hbox_bottom)
+        self.setLayout(layout)
+        self.resize(700, 400)
+
+        self._timer: QtCore.QTimer = QtCore.QTimer(self)
+        self._timer.timeout.connect(self._refresh)
+        self._timer.start(1000)
+        self._refresh()
+
+    def _tracker(self) -> LatencyTracker:
+        device = self._devices.device(self._port_combo.currentText())
+        return device.latency if device is not None else None
+
+    def _refresh(self) -> None:
+        device = self._devices.device(self._port_combo.currentText())
+        counters = dict(device.counters.values()) if device is not None else {}
+        counters.update(self._counters.values())
+        self._counters_label.setText(", ".join(name + ": " + str(count) for name, count in sorted(counters.items())))
+        tracker = self._tracker()
+        if tracker is None:
+            self._table.clearContents()
+            self._age_label.setText("")
+            return
+        for row, name in enumerate(self._rows):
+            histogram = tracker.histograms[name]
+            values = [histogram.mean()] + histogram.percentiles(self.Percents) + [histogram.maximum()]
+            texts = [str(len(histogram))] + ["{:.2f}".format(value*1000.0) for value in values]
+            for column, text in enumerate(texts):
+                self._table.setItem(row, column, QtWidgets.QTableWidgetItem(text))
+        self._age_label.setText(self._language.get(self._language.ShownValueAge).format(tracker.staleness()*1000.0))
+
+    def _onReset(self) -> None:
+        tracker = self._tracker()
+        if tracker is not None:
+            tracker.reset()
+            self._refresh()
+
+    def _onSave(self) -> None:
+        tracker = self._tracker()
+        if tracker is None:
+            return
+        path, _ = QtWidgets.QFileDialog.getSaveFileName(self, self._language.get(self._language.LatencySave), os.path.join(self._folder or "", "latency.json"), "JSON (*.json)")
+        if path:
+            try:
+                tracker.dump(path, self._port_combo.currentText())
+            except OSError as error:
+                print("DiagnosticsDialog::_onSave :", path, error)
+                QtWidgets.QMessageBox.warning(self, self._language.get(self._language.FileProblem), str(error))
+
+    def _onClose(self) -> None:
+        self.close()
+
+    def closeEvent(self, event) -> None:
+        self._timer.stop()
+        QtWidgets.QDialog.closeEvent(self, event)
+
+
 class NumericDelegate(QtWidgets.QStyledItemDelegate):
     """
     SEE: https://stackoverflow.com/questions/63149168/how-to-accept-only-numeric-values-as-input-for-the-qtablewidget-disable-the-al
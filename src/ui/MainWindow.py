@@ -24,8 +24,6 @@ SOFTWARE.
 
 # Python libraries
 import time
-import serial
-from threading import Thread, Event
 
 # Qt libraries
 from PyQt5 import QtCore, QtGui, QtWidgets
@@ -34,21 +32,29 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 from src.settings import Settings, Observer
 from src.language import Language
 from src.unit     import Unit
-from src.utils    import COMUtils
+from src.utils    import COMUtils, Counters, Profiler, LagWatchdog
 from src.assets   import Assets
-from .MainDialogs import InfoDialog, UnitsDialog, HorizontalLine, PreferencesDialog
+from src.context  import Context
+from src.control  import HostController, ProfileRunner, HoldTest
+from src.session  import SessionRecorder, RunCatalog, Session
+from src.device   import DeviceManager, Device, SettlingMonitor, SettlingResult, AlarmEngine, AlarmEvent, LineParser, MetricsServer
+from .MainDialogs import InfoDialog, UnitsDialog, HorizontalLine, PreferencesDialog, DiagnosticsDialog, SessionDialog
 from .SideWidgets import CalibrationToolbar, RunWidget
+from .PlotWidgets import TrendPlotWidget, PVPlotWidget
 
 
 class RunDockWidget(QtWidgets.QDockWidget):
-    def __init__(self, parent=None, settings:Settings=None, language:Language=None, unit:Unit=None, observer:Observer=None, assets:Assets=None):
+    def __init__(self, parent=None, settings:Settings=None, language:Language=None, unit:Unit=None, observer:Observer=None, assets:Assets=None, devices:DeviceManager=None, profiles:ProfileRunner=None, holdtest:HoldTest=None):
         self._settings: Settings = settings
         self._language: Language = language
         self._unit: Unit = unit
         self._observer: Observer = observer
         self._assets: Assets = assets
+        self._devices: DeviceManager = devices
+        self._profiles: ProfileRunner = profiles
+        self._holdtest: HoldTest = holdtest
 
-        self._object_widget: RunWidget = RunWidget(parent, settings=self._settings, language=self._language, unit=self._unit, observer=self._observer, assets=self._assets)
+        self._object_widget: RunWidget = RunWidget(parent, settings=self._settings, language=self._language, unit=self._unit, observer=self._observer, assets=self._assets, devices=self._devices, profiles=self._profiles, holdtest=self._holdtest)
 
         QtWidgets.QDockWidget.__init__(self, self._language.get(self._language.RunManager), parent)
 
@@ -57,18 +63,31 @@ class RunDockWidget(QtWidgets.QDockWidget):
 
 
 class CentralWidget(QtWidgets.QWidget):
-    def __init__(self, parent):
+    def __init__(self, parent, unit:Unit=None, counters:Counters=None):
         QtWidgets.QWidget.__init__(self, parent)
 
         self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
 
+        # NOTE: live pressure/setpoint plot and pressure-volume curve of the active device
+        self._trend_plot: TrendPlotWidget = TrendPlotWidget(self, unit=unit, counters=counters)
+        self._pv_plot: PVPlotWidget = PVPlotWidget(self, unit=unit, counters=counters)
+
+        layout: QtWidgets.QHBoxLayout = QtWidgets.QHBoxLayout()
+        layout.addWidget(self._trend_plot, 2)
+        layout.addWidget(self._pv_plot, 1)
+        self.setLayout(layout)
+
+    def setDevice(self, device:Device) -> None:
+        self._trend_plot.setDevice(device)
+        self._pv_plot.setDevice(device)
+
 
 class MainWindow(QtWidgets.QMainWindow):
     """
     This is the Main Window for Prime. It stores the permanent data and
     initializes all the manager objects.
     """
-    def __init__(self, name:str, version:str, user_folder:str):
+    def __init__(self, name:str, version:str, user_folder:str, context:Context=None):
         QtWidgets.QMainWindow.__init__(self)
 
         # NOTE: General properties
@@ -77,38 +96,75 @@ class MainWindow(QtWidgets.QMainWindow):
         self._user_folder: str = user_folder
         self.setWindowTitle(self._name + " " + self._version)
 
+        # NOTE: context (owns settings, language, units, observer, assets and devices)
+        self._context: Context = context if context is not None else Context(self._user_folder, name=self._name, version=self._version)
+
         # NOTE: settings (for preferences and configurations)
-        self._settings: Settings = Settings(user_folder=self._user_folder, name=self._name, version=self._version)
+        self._settings: Settings = self._context.settings
 
         # NOTE: language object (for translations)
-        self._language: Language = Language(settings=self._settings)
+        self._language: Language = self._context.language
 
         # NOTE: units object (for conversion)
-        self._unit: Unit = Unit(settings=self._settings)
+        self._unit: Unit = self._context.unit
 
         # NOTE: the observer class warns when a real time value has changed
-        self._observer: Observer = Observer()
+        self._observer: Observer = self._context.observer
         self._observer.Signal.Connect.connect(self._onConnection)
+        self._observer.Signal.NewTargetPressure.connect(self._onNewTargetPressure)
+        self._observer.Signal.FillTank.connect(self._fillTank)
+        self._observer.Signal.EmptyTank.connect(self._emptyTank)
+
+        # NOTE: device manager (one device per COM port, all sharing the same I/O workers)
+        self._devices: DeviceManager = self._context.devices
+        self._devices.Signal.ValuePressureChanged.connect(self._onDeviceValuePressureChanged)
+        self._devices.Signal.ValueVolumeChanged.connect(self._onDeviceValueVolumeChanged)
+        self._devices.Signal.LimitsChanged.connect(self._onDeviceLimitsChanged)
+
+        # NOTE: every connected device is recorded to the sessions folder
+        self._recorder: SessionRecorder = self._context.recorder
+
+        # NOTE: reports when the pressure has stabilized after a new target
+        self._settling: SettlingMonitor = self._context.settling
+        self._observer.Signal.Settled.connect(self._onSettled)
+
+        # NOTE: over/under pressure, rate, stalled sensor and limit switch alarms (rules in the user folder)
+        self._alarms: AlarmEngine = self._context.alarms
+        self._observer.Signal.Alarm.connect(self._onAlarm)
+
+        # NOTE: optional host side closed loop control (see Preferences)
+        self._controller: HostController = self._context.controller
+
+        # NOTE: setpoint profiles (played on their own thread, see the Run Manager)
+        self._profiles: ProfileRunner = self._context.profiles
+        self._holdtest: HoldTest = self._context.holdtest
+        self._catalog: RunCatalog = self._context.catalog
+
+        # NOTE: runtime profilers (see Preferences and the --profile option)
+        self._profiler: Profiler = self._context.profiler
+
+        # NOTE: optional Prometheus endpoint (see Preferences)
+        self._metrics: MetricsServer = self._context.metrics
+        # NOTE: logs the stack of the interface when it freezes (see Preferences)
+        self._watchdog: LagWatchdog = self._context.watchdog
 
         # NOTE: assets object
-        self._assets: Assets = Assets()
+        self._assets: Assets = self._context.assets
 
         # NOTE: setting up window icon
         self.setWindowIcon(self._assets.get("logo"))
 
         # NOTE: dock widgets
-        self._dock_runs_widget: RunDockWidget = RunDockWidget(self, settings=self._settings, language=self._language, unit=self._unit, observer=self._observer, assets=self._assets)
+        self._dock_runs_widget: RunDockWidget = RunDockWidget(self, settings=self._settings, language=self._language, unit=self._unit, observer=self._observer, assets=self._assets, devices=self._devices, profiles=self._profiles, holdtest=self._holdtest)
         self.addDockWidget(QtCore.Qt.LeftDockWidgetArea, self._dock_runs_widget)
 
         # NOTE: central widget
-        self._central_widget: CentralWidget = CentralWidget(self)
+        self._central_widget: CentralWidget = CentralWidget(self, unit=self._unit, counters=self._context.counters)
         self.setCentralWidget(self._central_widget)
-
-        self._serial: serial.Serial = None
-        self._connection_thread: Thread = None
-        self._connection_thread_event: Event = None
-        self._connection_thread_flag: bool = False
-        self._connection_flag: bool = False
+        # NOTE: the plots follow the device on the selected port, however it was opened (e.g. the Run Manager).
+        self._devices.Signal.DeviceStateChanged.connect(self._onDeviceStateChanged)
+        self._settings.Signal.ComPortChanged.connect(self._onComPortChanged)
+        self._onComPortChanged(self._settings.getProperty(self._settings.ComPort))
 
         # NOTE: building menu.
         self._buildMenuBar()
@@ -116,52 +172,78 @@ class MainWindow(QtWidgets.QMainWindow):
         # NOTE: Maximizing on startup
         self.showMaximized()
 
+    def _activeDevice(self) -> Device:
+        return self._devices.device(self._settings.getProperty(self._settings.ComPort))
+
     def _onConnection(self) -> None:
-        if not self._connection_thread_flag:
+        port = self._settings.getProperty(self._settings.ComPort)
+        device = self._devices.addDevice(port)
+        if not device.isOpen():
             try:
-                port = self._settings.getProperty(self._settings.ComPort)
-                self._serial: serial.Serial = serial.Serial(port, 9600)
-                self._thread_flag: bool = True
-                self._connection_thread_event = Event()
-                self._connection_thread = Thread(target=self._onReadPressureThread)
-                self._connection_thread.start()
-                self._connection_thread_flag = True
+                self._devices.open(port)
                 self._dock_runs_widget.widget().setConnectionButtonState(False)
             except OSError as err:
                 self._dock_runs_widget.widget().setConnectionButtonState(True)
                 QtWidgets.QMessageBox.warning(self, self._language.get(self._language.UnableToConnect), self._language.get(self._language.UnableToOpenPort))
         else:
-            self._connection_thread_flag = False
-            self._connection_thread_event.set()
-            self._connection_thread.join()
-            self._connection_thread_flag = False
+            self._devices.close(port)
             self._dock_runs_widget.widget().setConnectionButtonState(True)
 
-    def _onReadPressureThread(self) -> None:
-        while self._connection_thread_flag:
-            value = self._serial.readline()
-            try:
-                val = str(value).replace("\\r","").replace("\\n","").replace("''","").replace("b","").replace("'","").replace("'","")
-                if val == "IC_H":
-                    pass
-                    # self.label_9.setText("Atingiu o início do curso")
-                elif val == "FC_H":
-                    pass
-                    # self.label_9.setText("Atingiu o fim do curso")
-                elif val == "FC_L":
-                    pass
-                elif val == "IC_L":
-                    pass
-                else:
-                    self._observer.Signal.ValuePressureChanged.emit(float(val))
-                    # if self._p is not None:
-                    #     self._observer.Signal.ValuePressureChanged.emit(float(val)) #self._p(float(val))
-                    # else:
-                    #     self.Pressao.setText(val)
-            except ValueError as error:
-                print(error)
-            self._connection_thread_event.wait(0.2)
+    def _onDeviceStateChanged(self, port:str, flag:bool) -> None:
+        # NOTE: a closed device stays plotted (its last samples), until another one is opened or selected.
+        if flag and port == self._settings.getProperty(self._settings.ComPort):
+            self._central_widget.setDevice(self._devices.device(port))
+
+    def _onComPortChanged(self, port:str) -> None:
+        device = self._devices.device(port)
+        self._central_widget.setDevice(device if device is not None and device.isOpen() else None)
+
+    def _onDeviceValuePressureChanged(self, port:str, value:float) -> None:
+        # NOTE: only the device on the configured COM port feeds the real time widgets.
+        if port == self._settings.getProperty(self._settings.ComPort):
+            self._observer.Signal.ValuePressureChanged.emit(value)
+
+    def _onDeviceValueVolumeChanged(self, port:str, value:float) -> None:
+        if port == self._settings.getProperty(self._settings.ComPort):
+            self._observer.Signal.ValueVolumeChanged.emit(value)
+
+    def _onSettled(self, result:SettlingResult) -> None:
+        if result.port != self._settings.getProperty(self._settings.ComPort):
+            return
+        text = self._language.get(self._language.SettledMessage).format(result.settling_time, result.overshoot, self._unit.getAsString(result.error, self._unit.UnitPressure))
+        self._observer.Signal.SendInfo.emit(text)
+        print("MainWindow::_onSettled :", result)
+
+    def _onAlarm(self, event:AlarmEvent) -> None:
+        key = self._language.AlarmRaised if event.active else self._language.AlarmCleared
+        self._observer.Signal.SendInfo.emit(self._language.get(key).format(event.rule, event.port, self._unit.getAsString(event.value, self._unit.UnitPressure)))
+
+    def _onDeviceLimitsChanged(self, port:str, limits:int) -> None:
+        if port == self._settings.getProperty(self._settings.ComPort):
+            if limits & LineParser.LimitBeginning:
+                self._observer.Signal.SendInfo.emit(self._language.get(self._language.ReachedBeginning))
+            elif limits & LineParser.LimitEnd:
+                self._observer.Signal.SendInfo.emit(self._language.get(self._language.ReachedEnd))
+
+    def _onNewTargetPressure(self, value:float) -> None:
+        device = self._activeDevice()
+        if device is not None and device.isOpen():
+            device.sendTarget(value)
+            print("MainWindow::_onNewTargetPressure : new target pressure ->", str(value))
+
+    def _emptyTank(self) -> None:
+        device = self._activeDevice()
+        if device is not None and device.isOpen():
+            device.emptyTank()
+        else:
+            QtWidgets.QMessageBox.warning(self, self._language.get(self._language.NoConnection), self._language.get(self._language.YouMustOpenAConnection))
 
+    def _fillTank(self) -> None:
+        device = self._activeDevice()
+        if device is not None and device.isOpen():
+            device.fillTank()
+        else:
+            QtWidgets.QMessageBox.warning(self, self._language.get(self._language.NoConnection), self._language.get(self._language.YouMustOpenAConnection))
 
     def _buildMenuBar(self):
         self._file_menu:QtWidgets.QMenu = self.menuBar().addMenu(self._language.get(self._language.File))
@@ -173,6 +255,10 @@ class MainWindow(QtWidgets.QMainWindow):
         self._quit_action: QtWidgets.QAction = QtWidgets.QAction(self._assets.get("close"), self._language.get(self._language.Quit), self)
         self._quit_action.triggered.connect(self._onExit)
 
+        self._open_run_action: QtWidgets.QAction = QtWidgets.QAction(self._assets.get("import"), self._language.get(self._language.OpenRun), self)
+        self._open_run_action.triggered.connect(self._onOpenRun)
+
+        self._file_menu.addAction(self._open_run_action)
         self._file_menu.addSeparator()
         self._file_menu.addAction(self._quit_action)
 
@@ -197,11 +283,34 @@ class MainWindow(QtWidgets.QMainWindow):
         self._help_action: QtWidgets.QAction = QtWidgets.QAction(self._assets.get("help"), self._language.get(self._language.Help), self)
         self._help_action.triggered.connect(self._onHelp)
 
+        self._diagnostics_action: QtWidgets.QAction = QtWidgets.QAction(self._assets.get("gear"), self._language.get(self._language.Diagnostics), self)
+        self._diagnostics_action.triggered.connect(self._onDiagnostics)
+
         self._about_menu.addAction(self._information_action)
         self._about_menu.addAction(self._license_action)
         self._about_menu.addSeparator()
+        self._about_menu.addAction(self._diagnostics_action)
         self._about_menu.addAction(self._help_action)
 
+    def _onOpenRun(self) -> None:
+        runs = self._catalog.find(limit=500)
+        if len(runs) == 0:
+            QtWidgets.QMessageBox.information(self, self._language.get(self._language.OpenRun), self._language.get(self._language.NoRuns))
+            return
+        labels = [run["name"] + " (" + time.strftime("%Y-%m-%d %H:%M", time.localtime(run["start"] or 0)) + ")" for run in runs]
+        label, ok = QtWidgets.QInputDialog.getItem(self, self._language.get(self._language.OpenRun), self._language.get(self._language.Run), labels, 0, False)
+        if not ok:
+            return
+        run = runs[labels.index(label)]
+        try:
+            session = Session(run["folder"])
+        except (OSError, ValueError, KeyError) as error:
+            print("MainWindow::_onOpenRun :", run["folder"], error)
+            QtWidgets.QMessageBox.warning(self, self._language.get(self._language.FileProblem), self._language.get(self._language.UnableToOpenFile))
+            return
+        session_dialog = SessionDialog(self, session=session, title=run["name"], unit=self._unit, close_text=self._language.get(self._language.Close), counters=self._context.counters)
+        session_dialog.show()
+
     def _onUnits(self) -> None:
         units_dialog = UnitsDialog(self, settings=self._settings, language=self._language, unit=self._unit, observer=self._observer, assets=self._assets)
         units_dialog.show()
@@ -218,6 +327,10 @@ class MainWindow(QtWidgets.QMainWindow):
         info_dialog = InfoDialog(self, self._assets.get("license"), text=self._language.get(self._language.LicenseMessage), title=self._language.get(self._language.License), close_text=self._language.get(self._language.Close))
         info_dialog.show()
 
+    def _onDiagnostics(self) -> None:
+        diagnostics_dialog = DiagnosticsDialog(self, devices=self._devices, language=self._language, folder=self._user_folder, port=self._settings.getProperty(self._settings.ComPort), counters=self._context.counters)
+        diagnostics_dialog.show()
+
     def _onHelp(self) -> None:
         info_dialog = InfoDialog(self, self._assets.get("help"), text=self._language.get(self._language.HelpMessage), title=self._language.get(self._language.Help), close_text=self._language.get(self._language.Close))
         info_dialog.show()
@@ -229,5 +342,12 @@ class MainWindow(QtWidgets.QMainWindow):
         reply = QtWidgets.QMessageBox.question(self, 'Quit ' + self._name + "?", 'Are you sure you want to quit?', QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No)
         if reply == QtWidgets.QMessageBox.Yes:
             self._settings.save()
+            self._profiles.stop()
+            self._holdtest.stop()
+            self._devices.closeAll()
+            self._recorder.stopAll()
+            self._profiler.stopAll()
+            self._metrics.stop()
+            self._watchdog.stop()
             print("MainWindow::closeEvent : quitting software at: ", time.asctime())
             QtWidgets.QApplication.instance().quit()
\ No newline at end of file
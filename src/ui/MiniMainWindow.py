@@ -24,8 +24,6 @@ SOFTWARE.
 
 # Python libraries
 import time
-import serial
-from threading import Thread, Event
 
 # Qt libraries
 from PyQt5 import QtCore, QtGui, QtWidgets
@@ -33,10 +31,14 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 # Local libraries
 from src.settings import Settings, Observer
 from src.unit     import Unit
-from src.utils    import COMUtils
+from src.utils    import COMUtils, Counters, Profiler, LagWatchdog
 from src.language import Language
 from src.assets   import Assets
-from .MainDialogs import InfoDialog, UnitsDialog, HorizontalLine, PreferencesDialog, EditDialog
+from src.context  import Context
+from src.control  import HostController
+from src.session  import SessionRecorder
+from src.device   import DeviceManager, Device, SettlingMonitor, SettlingResult, AlarmEngine, AlarmEvent, Calibration, LineParser, MetricsServer
+from .MainDialogs import InfoDialog, UnitsDialog, HorizontalLine, PreferencesDialog, DiagnosticsDialog, EditDialog
 
 
 BIG_FONT: QtGui.QFont = QtGui.QFont()
@@ -53,9 +55,10 @@ MEDIUM_SIZE: int = 32
 CALIBRATION_FILENAME: str = "Calibration"
 
 class CentralWidget(QtWidgets.QWidget):
-    def __init__(self, parent=None, settings:Settings=None, language:Language=None, unit:Unit=None, observer:Observer=None, assets:Assets=None):
+    def __init__(self, parent=None, settings:Settings=None, language:Language=None, unit:Unit=None, observer:Observer=None, assets:Assets=None, counters:Counters=None):
         QtWidgets.QWidget.__init__(self, parent)
 
+        self._counters: Counters = counters if counters is not None else Counters()
         self._settings: Settings = settings
         self._language: Language = language
         self._assets: Assets = assets
@@ -106,8 +109,8 @@ class CentralWidget(QtWidgets.QWidget):
         self._line1: HorizontalLine = HorizontalLine()
 
         self._calibration_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.CalibrationTitle) + ": ", self)
-        self._calibration_import_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("import"), self._language.get(self._language.Import))
-        self._calibration_edit_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("edit"), self._language.get(self._language.Edit))
+        self._calibration_import_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("import", MEDIUM_SIZE), self._language.get(self._language.Import))
+        self._calibration_edit_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("edit", MEDIUM_SIZE), self._language.get(self._language.Edit))
 
         self._calibration_label.setFont(MEDIUM_FONT)
         self._calibration_import_button.setFont(MEDIUM_FONT)
@@ -132,7 +135,7 @@ class CentralWidget(QtWidgets.QWidget):
         self._target_value.setSuffix(self._unit.getSuffix(self._unit.UnitPressure, add_space=True))
         self._target_value.setRange(*self._unit.getRange(self._unit.UnitPressure))
         self._target_value.setDecimals(self._unit.getPrecision(self._unit.UnitPressure))
-        self._target_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("check"), self._language.get(self._language.Validate), self)
+        self._target_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("check", MEDIUM_SIZE), self._language.get(self._language.Validate), self)
         self._target_button.clicked.connect(self._onTargetPressure)
 
         self._target_label.setFont(MEDIUM_FONT)
@@ -167,7 +170,7 @@ class CentralWidget(QtWidgets.QWidget):
         self._comport_value.currentTextChanged.connect(self._onComPortChanged)
 
         # NOTE: start button
-        self._connect_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("play"), self._language.get(self._language.Connect), self)
+        self._connect_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("play", BIG_SIZE), self._language.get(self._language.Connect), self)
         self._connect_button.clicked.connect(self._onConnect)
         self._connect_button.setFont(BIG_FONT)
         self._connect_button.setIconSize(QtCore.QSize(BIG_SIZE, BIG_SIZE))
@@ -226,13 +229,14 @@ class CentralWidget(QtWidgets.QWidget):
 
     def _onPressureChange(self, pressure:float) -> None:
         self._pressure_edit.setText("{:.2f} kPa".format(pressure))
+        self._counters.add(Counters.WidgetRepaints)
 
     def setConnectionButtonState(self, flag:bool) -> None:
         if not flag:
-            self._connect_button.setIcon(self._assets.get("play"))
+            self._connect_button.setIcon(self._assets.get("play", BIG_SIZE))
             self._connect_button.setText(self._language.get(self._language.Connect))
         else:
-            self._connect_button.setIcon(self._assets.get("stop"))
+            self._connect_button.setIcon(self._assets.get("stop", BIG_SIZE))
             self._connect_button.setText(self._language.get(self._language.Disconnect))
 
     def _onConnect(self) -> None:
@@ -244,7 +248,7 @@ class MiniMainWindow(QtWidgets.QMainWindow):
     This is the Main Window for Prime. It stores the permanent data and
     initializes all the manager objects.
     """
-    def __init__(self, name:str, version:str, user_folder:str):
+    def __init__(self, name:str, version:str, user_folder:str, context:Context=None):
         QtWidgets.QMainWindow.__init__(self)
 
         self._name: str = name
@@ -252,29 +256,54 @@ class MiniMainWindow(QtWidgets.QMainWindow):
         self._user_folder: str = user_folder
         self.setWindowTitle(self._name + " " + self._version)
 
-        self._settings: Settings = Settings(user_folder=user_folder, name=name, version=version)
-        self._language: Language = Language(settings=self._settings)
-        self._observer: Observer = Observer()
+        # NOTE: context (owns settings, language, units, observer, assets and devices)
+        self._context: Context = context if context is not None else Context(self._user_folder, name=self._name, version=self._version)
+
+        self._settings: Settings = self._context.settings
+        self._language: Language = self._context.language
+        self._observer: Observer = self._context.observer
         self._observer.Signal.Connect.connect(self._onConnection)
         self._observer.Signal.NewTargetPressure.connect(self._onNewTargetPressure)
         self._observer.Signal.FillTank.connect(self._fillTank)
         self._observer.Signal.EmptyTank.connect(self._emptyTank)
 
         # NOTE: units object (for conversion)
-        self._unit: Unit = Unit(settings=self._settings)
+        self._unit: Unit = self._context.unit
 
         # NOTE: assets object
-        self._assets: Assets = Assets()
-
-        # NOTE: units object (for conversion)
-        self._unit: Unit = Unit(settings=self._settings)
+        self._assets: Assets = self._context.assets
 
-        self._central_widget: CentralWidget = CentralWidget(self, settings=self._settings, language=self._language, unit=self._unit, observer=self._observer, assets=self._assets)
+        self._central_widget: CentralWidget = CentralWidget(self, settings=self._settings, language=self._language, unit=self._unit, observer=self._observer, assets=self._assets, counters=self._context.counters)
         self.setCentralWidget(self._central_widget)
 
-        self._connection_thread_flag: bool = False
-        self._connection_thread_event: Event = None
-        self._connection_thread: Thread = None
+        # NOTE: device manager (the mini window drives a single device)
+        self._devices: DeviceManager = self._context.devices
+        self._devices.Signal.ValuePressureChanged.connect(self._onDeviceValuePressureChanged)
+        self._devices.Signal.ValueVolumeChanged.connect(self._onDeviceValueVolumeChanged)
+        self._devices.Signal.LimitsChanged.connect(self._onDeviceLimitsChanged)
+        self._device: Device = None
+
+        # NOTE: every connected device is recorded to the sessions folder
+        self._recorder: SessionRecorder = self._context.recorder
+
+        # NOTE: reports when the pressure has stabilized after a new target
+        self._settling: SettlingMonitor = self._context.settling
+        self._observer.Signal.Settled.connect(self._onSettled)
+
+        # NOTE: over/under pressure, rate, stalled sensor and limit switch alarms (rules in the user folder)
+        self._alarms: AlarmEngine = self._context.alarms
+        self._observer.Signal.Alarm.connect(self._onAlarm)
+
+        # NOTE: optional host side closed loop control (see Preferences)
+        self._controller: HostController = self._context.controller
+
+        # NOTE: runtime profilers (see Preferences and the --profile option)
+        self._profiler: Profiler = self._context.profiler
+
+        # NOTE: optional Prometheus endpoint (see Preferences)
+        self._metrics: MetricsServer = self._context.metrics
+        # NOTE: logs the stack of the interface when it freezes (see Preferences)
+        self._watchdog: LagWatchdog = self._context.watchdog
 
         # NOTE: setting up window icon
         self.setWindowIcon(self._assets.get("logo"))
@@ -313,9 +342,13 @@ class MiniMainWindow(QtWidgets.QMainWindow):
         self._help_action: QtWidgets.QAction = QtWidgets.QAction(self._assets.get("help"), self._language.get(self._language.Help), self)
         self._help_action.triggered.connect(self._onHelp)
 
+        self._diagnostics_action: QtWidgets.QAction = QtWidgets.QAction(self._assets.get("gear"), self._language.get(self._language.Diagnostics), self)
+        self._diagnostics_action.triggered.connect(self._onDiagnostics)
+
         self._about_menu.addAction(self._information_action)
         self._about_menu.addAction(self._license_action)
         self._about_menu.addSeparator()
+        self._about_menu.addAction(self._diagnostics_action)
         self._about_menu.addAction(self._help_action)
 
     def _onPreferences(self) -> None:
@@ -330,29 +363,33 @@ class MiniMainWindow(QtWidgets.QMainWindow):
         info_dialog = InfoDialog(self, self._assets.get("license"), text=self._language.get(self._language.LicenseMessage), title=self._language.get(self._language.License), close_text=self._language.get(self._language.Close))
         info_dialog.show()
 
+    def _onDiagnostics(self) -> None:
+        diagnostics_dialog = DiagnosticsDialog(self, devices=self._devices, language=self._language, folder=self._user_folder, port=self._settings.getProperty(self._settings.ComPort), counters=self._context.counters)
+        diagnostics_dialog.show()
+
     def _onHelp(self) -> None:
         info_dialog = InfoDialog(self, self._assets.get("help"), text=self._language.get(self._language.HelpMessage), title=self._language.get(self._language.Help), close_text=self._language.get(self._language.Close))
         info_dialog.show()
 
     def _emptyTank(self):
-        if self._serial != None:
+        if self._device is not None and self._device.isOpen():
             self._observer.Signal.SendInfo.emit(self._language.get(self._language.EmptyingTank))
-            self._serial.write(str("X").encode())
+            self._device.emptyTank()
             print("MiniMainWindow::_emptyTank :", str("Ok"))
         else:
             QtWidgets.QMessageBox.warning(self, self._language.get(self._language.NoConnection), self._language.get(self._language.YouMustOpenAConnection))
         
     def _fillTank(self):
-        if self._serial != None:
-            self._observer.Signal.SendInfo.emit(self._language.get(self._language.FillingTank))
-            self._serial.write(str("Y").encode())
+        if self._device is not None and self._device.isOpen():
+            self._observer.Signal.SendInfo.emit(self._language.get(self._language.FillinTank))
+            self._device.fillTank()
             print("MiniMainWindow::_fillTank :", str("Ok"))
         else:
             QtWidgets.QMessageBox.warning(self, self._language.get(self._language.NoConnection), self._language.get(self._language.YouMustOpenAConnection))
 
     def _onNewTargetPressure(self, value:float) -> None:
-        if self._serial is not None:
-            self._serial.write(str(int(value)).encode())
+        if self._device is not None and self._device.isOpen():
+            self._device.sendTarget(value)
             print("MiniMainWindow::_onNewTargetPressure : new target pressure ->", str(value))
 
     def _onExit(self) -> None:
@@ -362,61 +399,53 @@ class MiniMainWindow(QtWidgets.QMainWindow):
         reply = QtWidgets.QMessageBox.question(self, self._language.get(self._language.Quit) + " " + self._name + "?", 'Are you sure you want to quit?', QtWidgets.QMessageBox.Yes | QtWidgets.QMessageBox.No, QtWidgets.QMessageBox.No)
         if reply == QtWidgets.QMessageBox.Yes:
             self._settings.save()
+            self._devices.closeAll()
+            self._recorder.stopAll()
+            self._profiler.stopAll()
+            self._metrics.stop()
+            self._watchdog.stop()
             print("MiniMainWindow::closeEvent : quitting software at: ", time.asctime())
             QtWidgets.QApplication.instance().quit()
         else:
             event.ignore()
 
     def _onConnection(self) -> None:
-        if not self._connection_thread_flag:
+        if self._device is None or not self._device.isOpen():
             try:
                 x, y = self._settings.loadCurve(CALIBRATION_FILENAME)
-                if len(x) > 2:
-                    z = np.polyfit(x, y, 2)
-                    self._p = np.poly1d(z)
-                else:
-                    self._p = None
-
                 port = self._settings.getProperty(self._settings.ComPort)
-                self._serial: serial.Serial = serial.Serial(port, 9600)
-                self._thread_flag: bool = True
-                self._connection_thread_event = Event()
-                self._connection_thread = Thread(target=self._onReadPressureThread)
-                self._connection_thread.start()
-                self._connection_thread_flag = True
+                # NOTE: a new device every time so that calibration changes are picked up.
+                for old_port in self._devices.ports():
+                    self._devices.removeDevice(old_port)
+                self._device = self._devices.addDevice(port, calibration=Calibration(x, y, name=CALIBRATION_FILENAME))
+                self._devices.open(port)
                 self._central_widget.setConnectionButtonState(True)
             except OSError as err:
                 self._central_widget.setConnectionButtonState(False)
                 QtWidgets.QMessageBox.warning(self, self._language.get(self._language.UnableToConnect), self._language.get(self._language.UnableToOpenPort))
         else:
-            self._serial.close()
-            self._serial = None
-            self._connection_thread_flag = False
-            self._connection_thread_event.set()
-            self._connection_thread.join()
-            self._connection_thread_flag = False
+            self._devices.close(self._device.port)
             self._central_widget.setConnectionButtonState(False)
 
-    def _onReadPressureThread(self) -> None:
-        while self._connection_thread_flag:
-            value = self._serial.readline()
-            try:
-                val = str(value).replace("\\r","").replace("\\n","").replace("''","").replace("b","").replace("'","").replace("'","")
-                if val == "IC_H":
-                    self._observer.Signal.SendInfo(self._language.get(self._language.ReachedBeginning))
-                elif val == "FC_H":
-                    self._observer.Signal.SendInfo(self._language.get(self._language.ReachedEnd))
-                elif val == "FC_L":
-                    pass
-                elif val == "IC_L":
-                    pass
-                else:
-                    if self._p is not None:
-                        self._observer.Signal.ValuePressureChanged.emit(self._p(float(val)))
-                    else:
-                        self._observer.Signal.ValuePressureChanged.emit(float(val))
-                        print(2)
-            except ValueError as error:
-                print(error)
-            self._connection_thread_event.wait(0.2)
+    def _onDeviceValuePressureChanged(self, port:str, value:float) -> None:
+        self._observer.Signal.ValuePressureChanged.emit(value)
+
+    def _onDeviceValueVolumeChanged(self, port:str, value:float) -> None:
+        self._observer.Signal.ValueVolumeChanged.emit(value)
+
+    def _onSettled(self, result:SettlingResult) -> None:
+        if result.port != self._settings.getProperty(self._settings.ComPort):
+            return
+        text = self._language.get(self._language.SettledMessage).format(result.settling_time, result.overshoot, self._unit.getAsString(result.error, self._unit.UnitPressure))
+        self._observer.Signal.SendInfo.emit(text)
+        print("MiniMainWindow::_onSettled :", result)
+
+    def _onAlarm(self, event:AlarmEvent) -> None:
+        key = self._language.AlarmRaised if event.active else self._language.AlarmCleared
+        self._observer.Signal.SendInfo.emit(self._language.get(key).format(event.rule, event.port, self._unit.getAsString(event.value, self._unit.UnitPressure)))
 
+    def _onDeviceLimitsChanged(self, port:str, limits:int) -> None:
+        if limits & LineParser.LimitBeginning:
+            self._observer.Signal.SendInfo.emit(self._language.get(self._language.ReachedBeginning))
+        elif limits & LineParser.LimitEnd:
+            self._observer.Signal.SendInfo.emit(self._language.get(self._language.ReachedEnd))
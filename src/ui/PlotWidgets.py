@@ -0,0 +1,498 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import time
+
+# Third party libraries
+import numpy as np
+
+# Qt libraries
+from PyQt5 import QtCore, QtGui, QtWidgets
+
+# Local libraries
+from src.unit     import Unit
+from src.device   import Device
+from src.session  import Session, Pyramid
+from src.utils    import Counters
+
+
+class TrendPlotWidget(QtWidgets.QWidget):
+    """
+    Live plot of the pressure (and setpoint) history of a device.
+
+    The curves are drawn into a cached pixmap: on every frame the pixmap is
+    scrolled by the elapsed time (a blit) and only the samples that arrived
+    since the previous frame are drawn. The whole series is only redrawn when
+    the widget is resized or the vertical range has to grow.
+    """
+    Background: QtGui.QColor = QtGui.QColor(255, 255, 255)
+    Grid: QtGui.QColor = QtGui.QColor(225, 225, 225)
+    PressureColor: QtGui.QColor = QtGui.QColor(31, 119, 180)
+    SetpointColor: QtGui.QColor = QtGui.QColor(214, 39, 40)
+
+    def __init__(self, parent=None, unit:Unit=None, window:float=120.0, fps:int=60, counters:Counters=None):
+        QtWidgets.QWidget.__init__(self, parent)
+
+        self._unit: Unit = unit
+        self._counters: Counters = counters if counters is not None else Counters()
+        self._device: Device = None
+        self._window: float = window
+
+        self._pixmap: QtGui.QPixmap = None
+        self._right: float = 0.0
+        self._drawn: int = 0
+        self._last: tuple = None
+        self._y_min: float = 0.0
+        self._y_max: float = 10.0
+
+        self._pressure_pen: QtGui.QPen = QtGui.QPen(self.PressureColor, 2)
+        self._setpoint_pen: QtGui.QPen = QtGui.QPen(self.SetpointColor, 1, QtCore.Qt.DashLine)
+
+        self._timer: QtCore.QTimer = QtCore.QTimer(self)
+        self._timer.setInterval(int(1000/fps))
+        self._timer.timeout.connect(self._onFrame)
+
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+        self.setMinimumHeight(100)
+
+    def setDevice(self, device:Device) -> None:
+        self._device = device
+        self._redraw()
+        if device is not None:
+            self._timer.start()
+        else:
+            self._timer.stop()
+
+    def setWindow(self, seconds:float) -> None:
+        self._window = seconds
+        self._redraw()
+
+    def _pixelsPerSecond(self) -> float:
+        return self._pixmap.width()/self._window
+
+    def _toY(self, value:float) -> float:
+        height = self._pixmap.height()
+        return height - 1 - (value - self._y_min)/(self._y_max - self._y_min)*(height - 1)
+
+    def _fitRange(self, values:np.ndarray) -> bool:
+        """
+        Grows the vertical range to hold `values`. Returns True if it changed.
+        """
+        if len(values) == 0:
+            return False
+        low, high = float(np.min(values)), float(np.max(values))
+        if low >= self._y_min and high <= self._y_max:
+            return False
+        margin = max((high - low)*0.1, 1.0)
+        self._y_min = min(self._y_min, low - margin)
+        self._y_max = max(self._y_max, high + margin)
+        return True
+
+    def _clear(self) -> None:
+        self._pixmap.fill(self.Background)
+        painter = QtGui.QPainter(self._pixmap)
+        painter.setPen(self.Grid)
+        for i in range(1, 5):
+            y = int(self._pixmap.height()*i/5)
+            painter.drawLine(0, y, self._pixmap.width(), y)
+        painter.end()
+
+    def _redraw(self) -> None:
+        """
+        Full redraw of the visible window (resize, range change or new device).
+        """
+        if self.width() <= 0 or self.height() <= 0:
+            return
+        self._pixmap = QtGui.QPixmap(self.size())
+        self._clear()
+        self._right = time.time()
+        self._last = None
+        self._drawn = 0
+        if self._device is None:
+            self.update()
+            return
+        data = self._device.buffer.latest()
+        self._drawn = self._device.buffer.total()
+        visible = data["time"] >= self._right - self._window
+        self._fitRange(np.concatenate([data["value"][visible], data["setpoint"][visible]]))
+        self._clear()
+        self._drawSegments(data["time"][visible], data["value"][visible], data["setpoint"][visible])
+        self.update()
+
+    def _drawSegments(self, times:np.ndarray, values:np.ndarray, setpoints:np.ndarray) -> None:
+        if len(times) == 0:
+            return
+        pps = self._pixelsPerSecond()
+        width = self._pixmap.width()
+        xs = width - 1 - (self._right - times)*pps
+        ys = self._toY(values)
+        ss = self._toY(setpoints)
+        pressure = QtGui.QPolygonF()
+        setpoint = QtGui.QPolygonF()
+        if self._last is not None:
+            x0 = width - 1 - (self._right - self._last[0])*pps
+            pressure.append(QtCore.QPointF(x0, self._toY(self._last[1])))
+            setpoint.append(QtCore.QPointF(x0, self._toY(self._last[2])))
+        for x, y, s in zip(xs, ys, ss):
+            pressure.append(QtCore.QPointF(x, y))
+            setpoint.append(QtCore.QPointF(x, s))
+        painter = QtGui.QPainter(self._pixmap)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        painter.setPen(self._setpoint_pen)
+        painter.drawPolyline(setpoint)
+        painter.setPen(self._pressure_pen)
+        painter.drawPolyline(pressure)
+        painter.end()
+        self._last = (float(times[-1]), float(values[-1]), float(setpoints[-1]))
+
+    def _onFrame(self) -> None:
+        if self._pixmap is None or self._device is None or not self.isVisible():
+            return
+        buffer = self._device.buffer
+        total = buffer.total()
+        new = total - self._drawn
+        if new > buffer.capacity():
+            self._redraw()
+            return
+
+        # NOTE: scrolling (blit) by the whole pixels elapsed since the last frame.
+        now = time.time()
+        shift = int((now - self._right)*self._pixelsPerSecond())
+        if shift > 0:
+            width, height = self._pixmap.width(), self._pixmap.height()
+            self._pixmap.scroll(-shift, 0, self._pixmap.rect())
+            painter = QtGui.QPainter(self._pixmap)
+            painter.fillRect(max(width - shift, 0), 0, shift, height, self.Background)
+            painter.setPen(self.Grid)
+            for i in range(1, 5):
+                y = int(height*i/5)
+                painter.drawLine(max(width - shift, 0), y, width, y)
+            painter.end()
+            self._right += shift/self._pixelsPerSecond()
+
+        # NOTE: drawing only the new samples.
+        if new > 0:
+            data = buffer.latest(new)
+            self._drawn = total
+            if self._fitRange(np.concatenate([data["value"], data["setpoint"]])):
+                self._redraw()
+                return
+            self._drawSegments(data["time"], data["value"], data["setpoint"])
+        if shift > 0 or new > 0:
+            self.update()
+
+    def paintEvent(self, event) -> None:
+        self._counters.add(Counters.WidgetRepaints)
+        painter = QtGui.QPainter(self)
+        if self._pixmap is not None:
+            painter.drawPixmap(0, 0, self._pixmap)
+        if self._unit is not None:
+            painter.setPen(QtCore.Qt.black)
+            painter.drawText(4, 14, self._unit.getAsString(self._y_max, self._unit.UnitPressure))
+            painter.drawText(4, self.height() - 4, self._unit.getAsString(self._y_min, self._unit.UnitPressure))
+        painter.end()
+
+    def resizeEvent(self, event) -> None:
+        QtWidgets.QWidget.resizeEvent(self, event)
+        self._redraw()
+
+
+class PVPlotWidget(QtWidgets.QWidget):
+    """
+    Live pressure-volume curve of a device (see `PVCurve`).
+
+    Like the trend plot, the curve is drawn into a cached pixmap: every frame
+    only adds the points closed since the previous one (the last, still
+    changing point is drawn on top when painting). Loading and unloading
+    segments get different colors. The whole curve is only redrawn when the
+    widget is resized or the ranges have to grow.
+    """
+    Background: QtGui.QColor = TrendPlotWidget.Background
+    Grid: QtGui.QColor = TrendPlotWidget.Grid
+    LoadingColor: QtGui.QColor = TrendPlotWidget.PressureColor
+    UnloadingColor: QtGui.QColor = QtGui.QColor(255, 127, 14)
+
+    def __init__(self, parent=None, unit:Unit=None, fps:int=10, counters:Counters=None):
+        QtWidgets.QWidget.__init__(self, parent)
+
+        self._unit: Unit = unit
+        self._counters: Counters = counters if counters is not None else Counters()
+        self._device: Device = None
+
+        self._pixmap: QtGui.QPixmap = None
+        self._drawn: int = 0
+        self._tail: tuple = None
+        self._last: tuple = None
+        self._x_min: float = 0.0
+        self._x_max: float = 1.0
+        self._y_min: float = 0.0
+        self._y_max: float = 10.0
+
+        self._pens: dict = {1: QtGui.QPen(self.LoadingColor, 2), -1: QtGui.QPen(self.UnloadingColor, 2), 0: QtGui.QPen(self.LoadingColor, 2)}
+
+        self._timer: QtCore.QTimer = QtCore.QTimer(self)
+        self._timer.setInterval(int(1000/fps))
+        self._timer.timeout.connect(self._onFrame)
+
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+        self.setMinimumSize(100, 100)
+
+    def setDevice(self, device:Device) -> None:
+        self._device = device
+        self._redraw()
+        if device is not None:
+            self._timer.start()
+        else:
+            self._timer.stop()
+
+    def _toPoint(self, volume:float, pressure:float) -> QtCore.QPointF:
+        width, height = self._pixmap.width(), self._pixmap.height()
+        x = (volume - self._x_min)/(self._x_max - self._x_min)*(width - 1)
+        y = height - 1 - (pressure - self._y_min)/(self._y_max - self._y_min)*(height - 1)
+        return QtCore.QPointF(x, y)
+
+    def _fitRange(self, volumes:np.ndarray, pressures:np.ndarray) -> bool:
+        """
+        Grows the ranges to hold the points. Returns True if they changed.
+        """
+        if len(volumes) == 0:
+            return False
+        changed = False
+        low, high = float(np.min(volumes)), float(np.max(volumes))
+        if low < self._x_min or high > self._x_max:
+            margin = max((high - low)*0.1, 1.0)
+            self._x_min, self._x_max = min(self._x_min, low - margin), max(self._x_max, high + margin)
+            changed = True
+        low, high = float(np.min(pressures)), float(np.max(pressures))
+        if low < self._y_min or high > self._y_max:
+            margin = max((high - low)*0.1, 1.0)
+            self._y_min, self._y_max = min(self._y_min, low - margin), max(self._y_max, high + margin)
+            changed = True
+        return changed
+
+    def _clear(self) -> None:
+        self._pixmap.fill(self.Background)
+        painter = QtGui.QPainter(self._pixmap)
+        painter.setPen(self.Grid)
+        for i in range(1, 5):
+            x = int(self._pixmap.width()*i/5)
+            y = int(self._pixmap.height()*i/5)
+            painter.drawLine(x, 0, x, self._pixmap.height())
+            painter.drawLine(0, y, self._pixmap.width(), y)
+        painter.end()
+
+    def _redraw(self) -> None:
+        if self.width() <= 0 or self.height() <= 0:
+            return
+        self._pixmap = QtGui.QPixmap(self.size())
+        self._drawn = 0
+        self._tail = None
+        self._last = None
+        if self._device is not None:
+            points = self._device.curve.points()
+            self._fitRange(points["volume"], points["pressure"])
+            self._clear()
+            self._drawPoints(points)
+        else:
+            self._clear()
+        self.update()
+
+    def _drawPoints(self, points:dict) -> None:
+        """
+        Draws the closed points of `points` (all but the last, which is kept
+        in `_last` and drawn when painting).
+        """
+        count = len(points["volume"]) - 1
+        if count < 0:
+            return
+        if count > 0:
+            painter = QtGui.QPainter(self._pixmap)
+            painter.setRenderHint(QtGui.QPainter.Antialiasing)
+            previous = self._tail
+            for volume, pressure, direction in zip(points["volume"][:count], points["pressure"][:count], points["direction"][:count]):
+                point = (float(volume), float(pressure))
+                if previous is not None:
+                    painter.setPen(self._pens[int(direction)])
+                    painter.drawLine(self._toPoint(*previous), self._toPoint(*point))
+                previous = point
+            painter.end()
+            self._tail = previous
+            self._drawn += count
+        self._last = (float(points["volume"][-1]), float(points["pressure"][-1]), int(points["direction"][-1]))
+
+    def _onFrame(self) -> None:
+        if self._pixmap is None or self._device is None or not self.isVisible():
+            return
+        curve = self._device.curve
+        if len(curve) < self._drawn:
+            # NOTE: the curve was cleared.
+            self._redraw()
+            return
+        points = curve.points(self._drawn)
+        if len(points["volume"]) == 0:
+            return
+        if len(points["volume"]) == 1 and self._last == (float(points["volume"][0]), float(points["pressure"][0]), int(points["direction"][0])):
+            return
+        if self._fitRange(points["volume"], points["pressure"]):
+            self._redraw()
+            return
+        self._drawPoints(points)
+        self.update()
+
+    def paintEvent(self, event) -> None:
+        self._counters.add(Counters.WidgetRepaints)
+        painter = QtGui.QPainter(self)
+        if self._pixmap is not None:
+            painter.drawPixmap(0, 0, self._pixmap)
+            if self._last is not None:
+                painter.setRenderHint(QtGui.QPainter.Antialiasing)
+                pen = self._pens[self._last[2]]
+                point = self._toPoint(*self._last[:2])
+                painter.setPen(pen)
+                if self._tail is not None:
+                    painter.drawLine(self._toPoint(*self._tail), point)
+                painter.setBrush(pen.color())
+                painter.drawEllipse(point, 3, 3)
+        if self._unit is not None:
+            painter.setPen(QtCore.Qt.black)
+            painter.drawText(4, 14, self._unit.getAsString(self._y_max, self._unit.UnitPressure))
+            painter.drawText(4, self.height() - 22, self._unit.getAsString(self._y_min, self._unit.UnitPressure))
+            # NOTE: volume units are rich text (e.g. cm<sup>3</sup>).
+            text = QtGui.QStaticText(self._unit.getAsString(self._x_max, self._unit.UnitVolume))
+            text.setTextFormat(QtCore.Qt.RichText)
+            painter.drawStaticText(int(self.width() - 4 - text.size().width()), int(self.height() - 4 - text.size().height()), text)
+        painter.end()
+
+    def resizeEvent(self, event) -> None:
+        QtWidgets.QWidget.resizeEvent(self, event)
+        self._redraw()
+
+
+class SessionPlotWidget(QtWidgets.QWidget):
+    """
+    Zoomable plot of a recorded session. Every paint asks the session level of
+    detail pyramid for about one min/max bucket per pixel (raw samples when
+    zoomed in far enough), so the cost depends on the widget width and not on
+    the length of the run. Mouse wheel zooms, dragging pans.
+    """
+    Background: QtGui.QColor = TrendPlotWidget.Background
+    PressureColor: QtGui.QColor = TrendPlotWidget.PressureColor
+
+    def __init__(self, parent=None, session:Session=None, unit:Unit=None, counters:Counters=None):
+        QtWidgets.QWidget.__init__(self, parent)
+
+        self._session: Session = session
+        self._pyramid: Pyramid = session.pyramid()
+        self._unit: Unit = unit
+        self._counters: Counters = counters if counters is not None else Counters()
+
+        manifest = session.manifest
+        chunks = manifest["chunks"]
+        self._t_min: float = chunks[0]["start"] if len(chunks) > 0 else manifest["start"]
+        self._t_max: float = max(chunk["stop"] for chunk in chunks) if len(chunks) > 0 else self._t_min + 1.0
+        if self._t_max <= self._t_min:
+            self._t_max = self._t_min + 1.0
+        self._start: float = self._t_min
+        self._stop: float = self._t_max
+        self._y_min, self._y_max = self._valueRange()
+
+        self._drag: float = None
+
+        self.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
+        self.setMinimumSize(400, 200)
+
+    def _valueRange(self) -> tuple:
+        if self._pyramid is not None and self._pyramid.levelCount() > 0:
+            top = self._pyramid.level(self._pyramid.levelCount() - 1)
+            low, high = float(np.min(top["min"])), float(np.max(top["max"]))
+        else:
+            values = self._session.column("value")
+            low, high = (float(np.min(values)), float(np.max(values))) if len(values) > 0 else (0.0, 1.0)
+        margin = max((high - low)*0.05, 1.0)
+        return low - margin, high + margin
+
+    def _data(self, pixels:int) -> tuple:
+        """
+        Returns (x, low, high) arrays to draw, low == high for raw samples.
+        """
+        level = -1
+        if self._pyramid is not None:
+            level, records = self._pyramid.query(self._start, self._stop, pixels)
+        if level >= 0:
+            return (records["t0"] + records["t1"])/2, records["min"], records["max"]
+        data = self._session.readRange(self._start, self._stop, ["time", "value"])
+        return data["time"], data["value"], data["value"]
+
+    def paintEvent(self, event) -> None:
+        self._counters.add(Counters.WidgetRepaints)
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), self.Background)
+        width, height = self.width(), self.height()
+        x, low, high = self._data(width)
+        if len(x) > 0:
+            xs = (x - self._start)/(self._stop - self._start)*(width - 1)
+            scale = (height - 1)/(self._y_max - self._y_min)
+            lows = height - 1 - (low - self._y_min)*scale
+            highs = height - 1 - (high - self._y_min)*scale
+            polygon = QtGui.QPolygonF()
+            for px, a, b in zip(xs, lows, highs):
+                polygon.append(QtCore.QPointF(px, a))
+                if a != b:
+                    polygon.append(QtCore.QPointF(px, b))
+            painter.setPen(QtGui.QPen(self.PressureColor, 1))
+            painter.drawPolyline(polygon)
+        painter.setPen(QtCore.Qt.black)
+        if self._unit is not None:
+            painter.drawText(4, 14, self._unit.getAsString(self._y_max, self._unit.UnitPressure))
+            painter.drawText(4, height - 4, self._unit.getAsString(self._y_min, self._unit.UnitPressure))
+        painter.drawText(width - 200, height - 4, time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self._start)))
+        painter.end()
+
+    def wheelEvent(self, event) -> None:
+        # NOTE: zooming around the time under the cursor.
+        factor = 0.8 if event.angleDelta().y() > 0 else 1.25
+        anchor = self._start + event.pos().x()/max(self.width(), 1)*(self._stop - self._start)
+        span = min(max((self._stop - self._start)*factor, 1e-3), self._t_max - self._t_min)
+        ratio = (anchor - self._start)/(self._stop - self._start)
+        self._setRange(anchor - ratio*span, anchor - ratio*span + span)
+
+    def mousePressEvent(self, event) -> None:
+        self._drag = event.pos().x()
+
+    def mouseMoveEvent(self, event) -> None:
+        if self._drag is not None:
+            dt = (self._drag - event.pos().x())/max(self.width(), 1)*(self._stop - self._start)
+            self._drag = event.pos().x()
+            self._setRange(self._start + dt, self._stop + dt)
+
+    def mouseReleaseEvent(self, event) -> None:
+        self._drag = None
+
+    def _setRange(self, start:float, stop:float) -> None:
+        span = stop - start
+        start = min(max(start, self._t_min), self._t_max - span)
+        self._start, self._stop = start, start + span
+        self.update()
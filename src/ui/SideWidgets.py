@@ -23,6 +23,7 @@ SOFTWARE.
 """
 
 # Python libraries
+import os
 from typing import List
 
 # Qt libraries
@@ -34,6 +35,8 @@ from src.language import Language
 from src.unit     import Unit
 from src.utils    import COMUtils
 from src.assets   import Assets
+from src.device   import DeviceManager, Device, Calibration
+from src.control  import Profile, ProfileRunner, HoldTest, HoldTestResult
 from .MainDialogs import InfoDialog, UnitsDialog, HorizontalLine, PreferencesDialog, EditDialog
 
 
@@ -104,12 +107,43 @@ class CalibrationToolbar(QtWidgets.QToolBar):
         self.Export.emit()
 
 
+class DeviceToolbar(QtWidgets.QToolBar):
+    Create: QtCore.pyqtSignal = QtCore.pyqtSignal()
+    Delete: QtCore.pyqtSignal = QtCore.pyqtSignal()
+    Connect: QtCore.pyqtSignal = QtCore.pyqtSignal()
+
+    def __init__(self, parent=None, language:Language=None, assets:Assets=None):
+        QtWidgets.QToolBar.__init__(self, parent)
+
+        self._language: Language = language
+        self._assets: Assets = assets
+
+        self._create_action = self.addAction(self._assets.get('plus'),"")
+        self._create_action.setToolTip(self._language.get(self._language.AddDeviceTooltip))
+
+        self._delete_action = self.addAction(self._assets.get('delete'),"")
+        self._delete_action.setToolTip(self._language.get(self._language.RemoveDeviceTooltip))
+
+        self._connect_action = self.addAction(self._assets.get('play'),"")
+        self._connect_action.setToolTip(self._language.get(self._language.ConnectDeviceTooltip))
+
+        self._create_action.triggered.connect(self.Create.emit)
+        self._delete_action.triggered.connect(self.Delete.emit)
+        self._connect_action.triggered.connect(self.Connect.emit)
+
+        self.setHasSelection(False)
+
+    def setHasSelection(self, flag:bool) -> None:
+        self._delete_action.setEnabled(flag)
+        self._connect_action.setEnabled(flag)
+
+
 class RunWidget(QtWidgets.QWidget):
     """
     This is the Objects managing widget for Golab. It has an object tree plus a 
     few other widgets for object inspection and manipulation.
     """
-    def __init__(self, parent=None, settings:Settings=None, language:Language=None, unit:Unit=None, observer:Observer=None, assets:Assets=None):
+    def __init__(self, parent=None, settings:Settings=None, language:Language=None, unit:Unit=None, observer:Observer=None, assets:Assets=None, devices:DeviceManager=None, profiles:ProfileRunner=None, holdtest:HoldTest=None):
         QtWidgets.QWidget.__init__(self, parent)
 
         self._settings: Settings = settings
@@ -124,9 +158,25 @@ class RunWidget(QtWidgets.QWidget):
 
         self._observer: Observer = observer
         self._observer.Signal.ValuePressureChanged.connect(self._onValuePressureChanged)
+        self._observer.Signal.ValueVolumeChanged.connect(self._onValuevolumeChanged)
 
         self._assets: Assets = assets
 
+        self._devices: DeviceManager = devices
+        self._devices.Signal.DeviceAdded.connect(self._populateDeviceList)
+        self._devices.Signal.DeviceRemoved.connect(self._populateDeviceList)
+        self._devices.Signal.DeviceStateChanged.connect(self._populateDeviceList)
+
+        self._profiles: ProfileRunner = profiles if profiles is not None else ProfileRunner()
+        self._profiles.Signal.Progress.connect(self._onProfileProgress)
+        self._profiles.Signal.Finished.connect(self._onProfileFinished)
+        self._profile: Profile = None
+
+        self._holdtest: HoldTest = holdtest if holdtest is not None else HoldTest()
+        self._holdtest.Signal.Phase.connect(self._onHoldPhase)
+        self._holdtest.Signal.Progress.connect(self._onHoldProgress)
+        self._holdtest.Signal.Finished.connect(self._onHoldFinished)
+
         # NOTE: local variables
         self._current_pressure: float = 0.0
         self._current_volume: float = 0.0
@@ -152,6 +202,21 @@ class RunWidget(QtWidgets.QWidget):
         self._calibration_list.itemSelectionChanged.connect(self._onCurveSelectionChanged)
         self._calibration_list.itemDoubleClicked.connect(self._onEditCurve)
 
+        # NOTE: device widgets
+        self._devices_title: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.DevicesTitle), self)
+        self._devices_title.setFont(title_font)
+        self._line0: HorizontalLine = HorizontalLine()
+
+        self._device_toolbar: DeviceToolbar = DeviceToolbar(self, language=self._language, assets=self._assets)
+        self._device_toolbar.Create.connect(self._onCreateDevice)
+        self._device_toolbar.Delete.connect(self._onDeleteDevice)
+        self._device_toolbar.Connect.connect(self._onConnectDevice)
+
+        self._device_list: QtWidgets.QListWidget = QtWidgets.QListWidget(self)
+        self._device_list.itemSelectionChanged.connect(self._onDeviceSelectionChanged)
+        self._device_list.itemDoubleClicked.connect(self._onConnectDevice)
+        self._populateDeviceList()
+
         # NOTE: real time data widgets
         self._realtime_title: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.RealTimeTitle), self)
         self._realtime_title.setFont(title_font)
@@ -174,6 +239,43 @@ class RunWidget(QtWidgets.QWidget):
         self._target_value.setRange(*self._unit.getRange(self._unit.UnitPressure))
         self._target_value.setDecimals(self._unit.getPrecision(self._unit.UnitPressure))
         self._target_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("check"), self._language.get(self._language.Validate), self)
+        self._target_button.clicked.connect(self._onTargetPressure)
+
+        # NOTE: setpoint profile widgets
+        self._profile_title: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.ProfileTitle), self)
+        self._profile_title.setFont(title_font)
+        self._line5: HorizontalLine = HorizontalLine()
+
+        self._profile_label: QtWidgets.QLabel = QtWidgets.QLabel(self._settings.NullString, self)
+        self._profile_load_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("import"), "", self)
+        self._profile_load_button.setToolTip(self._language.get(self._language.LoadProfileTooltip))
+        self._profile_load_button.clicked.connect(self._onLoadProfile)
+        self._profile_run_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("play"), "", self)
+        self._profile_run_button.setToolTip(self._language.get(self._language.RunProfileTooltip))
+        self._profile_run_button.setEnabled(False)
+        self._profile_run_button.clicked.connect(self._onRunProfile)
+        self._profile_progress: QtWidgets.QProgressBar = QtWidgets.QProgressBar(self)
+        self._profile_progress.setRange(0, 1000)
+        self._profile_progress.setValue(0)
+        self._profile_progress.setTextVisible(False)
+
+        # NOTE: hold (leak) test widgets
+        self._hold_title: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.HoldTestTitle), self)
+        self._hold_title.setFont(title_font)
+        self._line6: HorizontalLine = HorizontalLine()
+
+        self._hold_label: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.LeakPrecision) + ":", self)
+        self._hold_precision: QtWidgets.QDoubleSpinBox = QtWidgets.QDoubleSpinBox(self)
+        self._hold_precision.setDecimals(4)
+        self._hold_precision.setRange(0.0001, 100.0)
+        self._hold_precision.setSingleStep(0.005)
+        self._hold_precision.setValue(self._unit.get(self._holdtest.precision, self._unit.UnitPressure))
+        self._hold_precision.setSuffix(self._unit.getSuffix(self._unit.UnitPressure, add_space=True) + "/s")
+        self._hold_precision.setToolTip(self._language.get(self._language.LeakPrecisionTooltip))
+        self._hold_button: QtWidgets.QPushButton = QtWidgets.QPushButton(self._assets.get("play"), "", self)
+        self._hold_button.setToolTip(self._language.get(self._language.HoldTestTooltip))
+        self._hold_button.clicked.connect(self._onHoldTest)
+        self._hold_status: QtWidgets.QLabel = QtWidgets.QLabel("", self)
 
         # NOTE: configuration widgets
         self._configuration_title: QtWidgets.QLabel = QtWidgets.QLabel(self._language.get(self._language.ConfigurationTitle), self)
@@ -200,6 +302,13 @@ class RunWidget(QtWidgets.QWidget):
         grid_layout: QtWidgets.QGridLayout = QtWidgets.QGridLayout()
         i: int = -1
         i += 1
+        grid_layout.addWidget(self._devices_title, i, 0)
+        grid_layout.addWidget(self._line0, i, 1, 1, 2)
+        i += 1
+        grid_layout.addWidget(self._device_toolbar, i, 0, 1, 3)
+        i += 1
+        grid_layout.addWidget(self._device_list, i, 0, 1, 3)
+        i += 1
         grid_layout.addWidget(self._calibration_title, i, 0)
         grid_layout.addWidget(self._line1, i, 1, 1, 2)
         i += 1
@@ -223,6 +332,26 @@ class RunWidget(QtWidgets.QWidget):
         grid_layout.addWidget(self._target_value, i, 1)
         grid_layout.addWidget(self._target_button, i, 2)
         i += 1
+        grid_layout.addWidget(self._profile_title, i, 0)
+        grid_layout.addWidget(self._line5, i, 1, 1, 2)
+        i += 1
+        profile_layout: QtWidgets.QHBoxLayout = QtWidgets.QHBoxLayout()
+        profile_layout.addWidget(self._profile_label, 1)
+        profile_layout.addWidget(self._profile_load_button)
+        profile_layout.addWidget(self._profile_run_button)
+        grid_layout.addLayout(profile_layout, i, 0, 1, 3)
+        i += 1
+        grid_layout.addWidget(self._profile_progress, i, 0, 1, 3)
+        i += 1
+        grid_layout.addWidget(self._hold_title, i, 0)
+        grid_layout.addWidget(self._line6, i, 1, 1, 2)
+        i += 1
+        grid_layout.addWidget(self._hold_label, i, 0)
+        grid_layout.addWidget(self._hold_precision, i, 1)
+        grid_layout.addWidget(self._hold_button, i, 2)
+        i += 1
+        grid_layout.addWidget(self._hold_status, i, 0, 1, 3)
+        i += 1
         grid_layout.addWidget(self._configuration_title, i, 0)
         grid_layout.addWidget(self._line4, i, 1, 1, 2)
         i += 1
@@ -247,6 +376,90 @@ class RunWidget(QtWidgets.QWidget):
     def _onConnect(self) -> None:
         self._observer.Signal.Connect.emit()
 
+    def _onTargetPressure(self) -> None:
+        # NOTE: the controller works in kPa, the spin box in the chosen unit.
+        value = self._target_value.value() / self._unit.get(1.0, self._unit.UnitPressure)
+        self._observer.Signal.NewTargetPressure.emit(value)
+
+    def _onLoadProfile(self) -> None:
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(self.parent(), self._language.get(self._language.LoadProfileTooltip), self._settings.userFolder(), "JSON (*.json)")
+        if path == "":
+            return
+        try:
+            self._profile = Profile.load(path)
+        except (OSError, ValueError) as error:
+            print("RunWidget::_onLoadProfile :", path, error)
+            QtWidgets.QMessageBox.warning(self.parent(), self._language.get(self._language.FileProblem), self._language.get(self._language.UnableToOpenFile))
+            return
+        name = self._profile.name if self._profile.name else os.path.splitext(os.path.basename(path))[0]
+        self._profile_label.setText(name + " (" + str(round(self._profile.duration(), 1)) + " s)")
+        self._profile_run_button.setEnabled(True)
+        self._profile_progress.setValue(0)
+
+    def _onRunProfile(self) -> None:
+        if self._profiles.isRunning():
+            self._profiles.stop()
+            return
+        device = self._devices.device(self._settings.getProperty(self._settings.ComPort))
+        if device is None or not device.isOpen():
+            QtWidgets.QMessageBox.warning(self.parent(), self._language.get(self._language.NoConnection), self._language.get(self._language.YouMustOpenAConnection))
+            return
+        # NOTE: the runner thread sends the targets straight to the device (the GUI thread is never on the timing path).
+        if not self._profiles.start(self._profile, device):
+            self._warnBusy(device)
+            return
+        self._profile_run_button.setIcon(self._assets.get("stop"))
+        self._profile_load_button.setEnabled(False)
+
+    def _onProfileProgress(self, elapsed:float, duration:float) -> None:
+        self._profile_progress.setValue(int(1000*elapsed/duration) if duration > 0 else 1000)
+
+    def _onProfileFinished(self, completed:bool) -> None:
+        self._profile_run_button.setIcon(self._assets.get("play"))
+        self._profile_load_button.setEnabled(True)
+        jitter = self._profiles.jitter()
+        print("RunWidget::_onProfileFinished : completed =", completed, "events =", jitter["count"], "max lateness (ms) =", round(jitter["max"]*1000.0, 3))
+
+    def _onHoldTest(self) -> None:
+        if self._holdtest.isRunning():
+            self._holdtest.stop()
+            return
+        device = self._devices.device(self._settings.getProperty(self._settings.ComPort))
+        if device is None or not device.isOpen():
+            QtWidgets.QMessageBox.warning(self.parent(), self._language.get(self._language.NoConnection), self._language.get(self._language.YouMustOpenAConnection))
+            return
+        # NOTE: the controller works in kPa, the spin boxes in the chosen unit.
+        scale = self._unit.get(1.0, self._unit.UnitPressure)
+        self._holdtest.precision = self._hold_precision.value()/scale
+        if not self._holdtest.start(device, self._target_value.value()/scale):
+            self._warnBusy(device)
+
+    def _warnBusy(self, device:Device) -> None:
+        QtWidgets.QMessageBox.warning(self.parent(), self._language.get(self._language.DeviceBusy), self._language.get(self._language.DeviceDrivenBy).format(device.driver()))
+
+    def _onHoldPhase(self, phase:str) -> None:
+        running = phase != HoldTest.Idle
+        self._hold_button.setIcon(self._assets.get("stop" if running else "play"))
+        self._hold_precision.setEnabled(not running)
+        if phase == HoldTest.Settling:
+            self._hold_status.setText(self._language.get(self._language.HoldSettling))
+
+    def _onHoldProgress(self, elapsed:float, rate:float, half_width:float) -> None:
+        self._hold_status.setText(self._language.get(self._language.HoldProgress).format(elapsed, self._leakRateAsString(rate), self._leakRateAsString(half_width)))
+
+    def _onHoldFinished(self, result:HoldTestResult) -> None:
+        if result is None:
+            self._hold_status.setText(self._language.get(self._language.HoldAborted))
+            return
+        key = self._language.HoldConverged if result.converged else self._language.HoldNotConverged
+        text = self._language.get(key).format(self._leakRateAsString(result.leak_rate), self._leakRateAsString(result.half_width), result.duration)
+        self._hold_status.setText(text)
+        self._observer.Signal.SendInfo.emit(text)
+        print("RunWidget::_onHoldFinished :", result)
+
+    def _leakRateAsString(self, rate:float) -> str:
+        return self._unit.getAsString(rate, self._unit.UnitPressure) + "/s"
+
     def _languageChanged(self) -> None:
         # self._pressure_label.setText(self._language.get(self._language.Pressure) + ":")
         # self._volume_label.setText(self._language.get(self._language.Volume) + ":")
@@ -322,4 +535,49 @@ class RunWidget(QtWidgets.QWidget):
         if len(items) > 0:
             self._calibration_toolbar.setHasSelection(True)
         else:
-            self._calibration_toolbar.setHasSelection(False)
\ No newline at end of file
+            self._calibration_toolbar.setHasSelection(False)
+
+    def _populateDeviceList(self) -> None:
+        self._device_list.clear()
+        for device in self._devices.devices():
+            state = self._language.get(self._language.Connected) if device.isOpen() else self._language.get(self._language.Disconnected)
+            name = device.calibration.name if device.calibration.name is not None else self._settings.NullString
+            item = QtWidgets.QListWidgetItem(device.port + " (" + name + ") : " + state)
+            item.setData(QtCore.Qt.UserRole, device.port)
+            self._device_list.addItem(item)
+        self._device_toolbar.setHasSelection(False)
+
+    def _deviceSelection(self) -> List[str]:
+        return [item.data(QtCore.Qt.UserRole) for item in self._device_list.selectedItems()]
+
+    def _onDeviceSelectionChanged(self) -> None:
+        self._device_toolbar.setHasSelection(len(self._deviceSelection()) > 0)
+
+    def _onCreateDevice(self) -> None:
+        port, ok = QtWidgets.QInputDialog.getItem(self.parent(), self._language.get(self._language.AddDevice), self._language.get(self._language.ComPort) + ":", COMUtils.getAllCOMPortDevices(), 0, True)
+        if not ok or port == "":
+            return
+        curves = [self._settings.NullString] + self._settings.calibrationCurves()
+        name, ok = QtWidgets.QInputDialog.getItem(self.parent(), self._language.get(self._language.AddDevice), self._language.get(self._language.CalibrationTitle) + ":", curves, 0, False)
+        if not ok:
+            return
+        calibration = Calibration(name=None)
+        if name != self._settings.NullString:
+            x, y = self._settings.loadCurve(name)
+            calibration = Calibration(x, y, name=name)
+        self._devices.addDevice(port, calibration=calibration)
+
+    def _onDeleteDevice(self) -> None:
+        for port in self._deviceSelection():
+            self._devices.removeDevice(port)
+
+    def _onConnectDevice(self) -> None:
+        for port in self._deviceSelection():
+            device = self._devices.device(port)
+            if device.isOpen():
+                self._devices.close(port)
+            else:
+                try:
+                    self._devices.open(port)
+                except OSError as err:
+                    QtWidgets.QMessageBox.warning(self.parent(), self._language.get(self._language.UnableToConnect), self._language.get(self._language.UnableToOpenPort))
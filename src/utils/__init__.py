@@ -1,2 +1,5 @@
 from .singleton import SingletonMetaClass
-from .comports import COMUtils
\ No newline at end of file
+from .comports import COMUtils
+from .profiler import Counters, Profiler, StackSampler
+from .watchdog import LagWatchdog
+from .logger import start_logging, stop_logging
\ No newline at end of file
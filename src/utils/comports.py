@@ -25,11 +25,17 @@ SOFTWARE.
 # Python libraries
 from typing import List
 
-# COM port communication library
-import serial.tools.list_ports
+# NOTE: the ports are scanned on first use (not at import, the scan is slow on some systems).
+_ports: list = None
 
 
-PORTS: list = list(serial.tools.list_ports.comports())
+def ports() -> list:
+    global _ports
+    if _ports is None:
+        # NOTE: COM port communication library (imported with the scan).
+        import serial.tools.list_ports
+        _ports = list(serial.tools.list_ports.comports())
+    return _ports
 
 
 class COMUtils:
@@ -38,21 +44,21 @@ class COMUtils:
     """
     @staticmethod
     def getAllCOMPorts() -> List[str]:
-        return [(port_.device, port_.description) for port_ in PORTS]
+        return [(port_.device, port_.description) for port_ in ports()]
 
     @staticmethod
     def getAllCOMPortDevices() -> List[str]:
-        return [port_.device for port_ in PORTS]
+        return [port_.device for port_ in ports()]
 
     @staticmethod
     def getDescription(device:str) -> str:
-        for port_ in PORTS:
+        for port_ in ports():
             if port_.device == device:
                 return port_.description
     
     @staticmethod
     def getDevice(description:str) -> str:
-        for port_ in PORTS:
+        for port_ in ports():
             if port_.description == description:
                 return port_.device
 
@@ -0,0 +1,221 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import sys
+import gzip
+import json
+import time
+import queue
+import shutil
+import logging
+import threading
+import logging.handlers
+from typing import Dict, Tuple
+
+
+# NOTE: lines printed as "Class::method : message" (the convention of this code base) keep the source apart.
+_separator: str = " : "
+
+
+def split_source(text:str) -> Tuple[str, str]:
+    """
+    Splits a "Class::method : message" line into its source and message
+    (the source is empty for lines without one).
+    """
+    head, separator, tail = text.partition(_separator)
+    if separator and head and " " not in head.strip():
+        return head.strip(), tail
+    return "", text
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line: time, level, thread, source, message (plus
+    `repeats` when similar records were suppressed before this one).
+    """
+    def format(self, record:logging.LogRecord) -> str:
+        source, message = split_source(record.getMessage())
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + ".{:03d}".format(int(record.msecs)),
+            "level": record.levelname,
+            "thread": record.threadName,
+            "source": source or record.name,
+            "message": message,
+        }
+        repeats = getattr(record, "repeats", 0)
+        if repeats:
+            entry["repeats"] = repeats
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets through the first of the similar records (same level, logger and
+    message template) at or above `level` in every `window` seconds and
+    counts the others, the count is attached (`repeats`) to the next one let
+    through. A device sending garbage logs once per window, not per line.
+    """
+    def __init__(self, window:float=10.0, level:int=logging.WARNING) -> None:
+        logging.Filter.__init__(self)
+        self._window: float = window
+        self._level: int = level
+        # NOTE: key -> [window start, suppressed]
+        self._seen: Dict[tuple, list] = {}
+
+    def filter(self, record:logging.LogRecord) -> bool:
+        if record.levelno < self._level:
+            return True
+        key = (record.levelno, record.name, str(record.msg))
+        seen = self._seen.get(key)
+        if seen is not None and record.created - seen[0] < self._window:
+            seen[1] += 1
+            return False
+        if seen is not None and seen[1]:
+            record.repeats = seen[1]
+        self._seen[key] = [record.created, 0]
+        # NOTE: keys of distinct messages (e.g. with a port or a value in them) must not pile up.
+        if len(self._seen) > 1000:
+            self._seen = {key: value for key, value in self._seen.items() if record.created - value[0] < self._window}
+        return True
+
+
+class CompressedRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """
+    Rotates when the file passes `max_bytes` or is `interval` seconds old,
+    keeping `backups` gzip compressed files (`log.jsonl.1.gz` is the newest).
+    """
+    def __init__(self, path:str, max_bytes:int=10*1024*1024, interval:float=24*3600.0, backups:int=10) -> None:
+        logging.handlers.RotatingFileHandler.__init__(self, path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8", delay=True)
+        self.namer = lambda name: name + ".gz"
+        self.rotator = self._compress
+        self._interval: float = interval
+        self._rollover: float = (os.path.getmtime(path) if os.path.exists(path) else time.time()) + interval
+
+    def shouldRollover(self, record:logging.LogRecord) -> bool:
+        if self._interval > 0 and record.created >= self._rollover and os.path.exists(self.baseFilename):
+            return True
+        return bool(logging.handlers.RotatingFileHandler.shouldRollover(self, record))
+
+    def doRollover(self) -> None:
+        logging.handlers.RotatingFileHandler.doRollover(self)
+        self._rollover = time.time() + self._interval
+
+    @staticmethod
+    def _compress(source:str, destination:str) -> None:
+        with open(source, "rb") as incoming, gzip.open(destination, "wb") as outgoing:
+            shutil.copyfileobj(incoming, outgoing)
+        os.remove(source)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues the records as they are: the message is only formatted by the
+    writer thread (so logging costs the callers one queue put), and the rate
+    limit still sees the message templates.
+    """
+    def prepare(self, record:logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class LogStream:
+    """
+    File like object replacing `sys.stdout`/`sys.stderr`: every printed line
+    becomes a record of `logger` at `level` (queued, so a print never waits
+    for the disk).
+    """
+    def __init__(self, logger:logging.Logger, level:int) -> None:
+        self._logger: logging.Logger = logger
+        self._level: int = level
+        # NOTE: print writes the text and the end of line separately, each thread builds its own line.
+        self._local: threading.local = threading.local()
+
+    def write(self, text:str) -> int:
+        pending = getattr(self._local, "pending", "") + text
+        *lines, pending = pending.split("\n")
+        self._local.pending = pending
+        for line in lines:
+            if line.strip():
+                self._logger.log(self._level, line)
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def isatty(self) -> bool:
+        return False
+
+
+_listener: logging.handlers.QueueListener = None
+
+
+def start_logging(folder:str, level:str="INFO", to_file:bool=True, max_bytes:int=10*1024*1024, interval:float=24*3600.0, backups:int=10, window:float=10.0) -> None:
+    """
+    Sends all the logging (and what is printed, see `LogStream`) through a
+    queue to a writer thread, which filters it by `level`, rate limits the
+    repeated warnings and errors (see `RateLimitFilter`) and writes JSON lines
+    either to the rotating `log.jsonl` of `folder` or to the console. Raises
+    `ValueError` for an unknown level.
+    """
+    global _listener
+    stop_logging()
+    if not isinstance(logging.getLevelName(level.upper()), int):
+        raise ValueError("unknown log level <" + level + "> (available: DEBUG, INFO, WARNING, ERROR, CRITICAL)")
+    if to_file:
+        handler = CompressedRotatingFileHandler(os.path.join(folder, "log.jsonl"), max_bytes=max_bytes, interval=interval, backups=backups)
+    else:
+        handler = logging.StreamHandler(sys.__stdout__)
+    handler.setFormatter(JsonFormatter())
+    handler.setLevel(level.upper())
+    handler.addFilter(RateLimitFilter(window))
+
+    messages = queue.SimpleQueue()
+    root = logging.getLogger()
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(LazyQueueHandler(messages))
+    root.setLevel(level.upper())
+    _listener = logging.handlers.QueueListener(messages, handler, respect_handler_level=True)
+    _listener.start()
+
+    sys.stdout = LogStream(logging.getLogger("stdout"), logging.INFO)
+    sys.stderr = LogStream(logging.getLogger("stderr"), logging.ERROR)
+
+
+def stop_logging() -> None:
+    """
+    Writes what is still queued and gives the console back.
+    """
+    global _listener
+    if _listener is not None:
+        sys.stdout = sys.__stdout__
+        sys.stderr = sys.__stderr__
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
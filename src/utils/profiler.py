@@ -0,0 +1,221 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import io
+import sys
+import time
+import threading
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List
+if TYPE_CHECKING:
+    # NOTE: imported when the profiler is turned on.
+    import cProfile
+
+# Local libraries
+from .singleton import SingletonMetaClass
+
+
+class Counters(metaclass=SingletonMetaClass):
+    """
+    The `Counters` is a singleton class (all instances point to the same reference).
+
+    Always on counters of the hot paths (lines read, parse errors, samples
+    dropped, signals emitted, widget repaints, ...). Adding is a dictionary
+    update (no lock), so counts from several threads are approximate.
+
+    Every `Device` has its own (`Counters.create()`, see `Device.counters`)
+    and so does every scoped `Context` for the interface ones (repaints, GUI
+    stalls), the global one is only the fallback of code built without them.
+    """
+    LinesRead: str = "lines read"
+    ParseErrors: str = "parse errors"
+    SamplesPublished: str = "samples published"
+    SamplesDropped: str = "samples dropped"
+    CommandsDropped: str = "commands dropped"
+    SignalEmits: str = "signal emits"
+    WidgetRepaints: str = "widget repaints"
+    GuiStalls: str = "gui stalls"
+
+    def __init__(self) -> None:
+        self._values: Dict[str, int] = {}
+
+    def add(self, name:str, count:int=1) -> None:
+        self._values[name] = self._values.get(name, 0) + count
+
+    def get(self, name:str) -> int:
+        return self._values.get(name, 0)
+
+    def values(self) -> Dict[str, int]:
+        return dict(self._values)
+
+    def reset(self) -> None:
+        self._values = {}
+
+
+class StackSampler:
+    """
+    Sampling profiler: a thread reading the stacks of all the other threads
+    every `interval` seconds and counting them (folded stacks, the format of
+    flame graph tools).
+    """
+    def __init__(self, interval:float=0.005) -> None:
+        self._interval: float = interval
+        self._stacks: Counter = Counter()
+        self._event: threading.Event = threading.Event()
+        self._thread: threading.Thread = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stacks = Counter()
+            self._event = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._event,), name="StackSampler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._event.set()
+            self._thread.join()
+            self._thread = None
+
+    def folded(self) -> List[str]:
+        return [stack + " " + str(count) for stack, count in self._stacks.most_common()]
+
+    def _run(self, event:threading.Event) -> None:
+        own = threading.get_ident()
+        while not event.wait(self._interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(code.co_name + " (" + os.path.basename(code.co_filename) + ":" + str(code.co_firstlineno) + ")")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self._stacks[";".join(reversed(stack))] += 1
+
+
+class Profiler:
+    """
+    Turns the profilers on and off at runtime and saves their results to
+    `folder` when they are turned off:
+
+    * `cprofile`: deterministic profile of the thread turning it on (the GUI
+      one), saved as pstats data (`.prof`) plus the top functions (`.txt`).
+    * `sampling`: stacks of all the threads (see `StackSampler`), saved as
+      folded stacks (`.txt`).
+    * `tracemalloc`: the lines holding the most memory (`.txt`).
+    """
+    Names: List[str] = ["cprofile", "sampling", "tracemalloc"]
+
+    def __init__(self, folder:str, interval:float=0.005, top:int=50) -> None:
+        self._folder: str = folder
+        self._top: int = top
+        self._cprofile: "cProfile.Profile" = None
+        self._sampler: StackSampler = StackSampler(interval)
+        self._active: List[str] = []
+
+    @staticmethod
+    def parse(spec:str) -> List[str]:
+        """
+        Profiler names of a comma separated spec (e.g. "cprofile, sampling").
+        Raises `ValueError` for an unknown one.
+        """
+        names = [name.strip().lower() for name in (spec or "").split(",") if name.strip()]
+        for name in names:
+            if name not in Profiler.Names:
+                raise ValueError("unknown profiler <" + name + "> (available: " + ", ".join(Profiler.Names) + ")")
+        return names
+
+    def active(self) -> List[str]:
+        return list(self._active)
+
+    def setActive(self, names:List[str]) -> List[str]:
+        """
+        Starts the profilers in `names` and stops (saving them) the others.
+        Returns the files written.
+        """
+        paths = []
+        for name in self.active():
+            if name not in names:
+                paths += self.stop(name)
+        for name in names:
+            self.start(name)
+        return paths
+
+    def start(self, name:str) -> None:
+        if name in self._active:
+            return
+        # NOTE: the profiler modules are imported when used (they are off by default).
+        if name == "cprofile":
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        elif name == "sampling":
+            self._sampler.start()
+        elif name == "tracemalloc":
+            import tracemalloc
+            tracemalloc.start(25)
+        self._active.append(name)
+        print("Profiler::start :", name)
+
+    def stop(self, name:str) -> List[str]:
+        """
+        Stops one profiler and returns the files its results were saved to.
+        """
+        if name not in self._active:
+            return []
+        self._active.remove(name)
+        if not os.path.exists(self._folder):
+            os.makedirs(self._folder)
+        base = os.path.join(self._folder, time.strftime("%Y%m%d-%H%M%S") + "_" + name)
+        paths = [base + ".txt"]
+        if name == "cprofile":
+            import pstats
+            self._cprofile.disable()
+            self._cprofile.dump_stats(base + ".prof")
+            text = io.StringIO()
+            pstats.Stats(self._cprofile, stream=text).sort_stats("cumulative").print_stats(self._top)
+            lines = [text.getvalue()]
+            paths.append(base + ".prof")
+            self._cprofile = None
+        elif name == "sampling":
+            self._sampler.stop()
+            lines = self._sampler.folded()
+        else:
+            import tracemalloc
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            lines = [str(statistic) for statistic in snapshot.statistics("lineno")[:self._top]]
+        with open(base + ".txt", "w") as fid:
+            fid.write("\n".join(lines) + "\n")
+        print("Profiler::stop :", name, "->", ", ".join(paths))
+        return paths
+
+    def stopAll(self) -> List[str]:
+        return self.setActive([])
@@ -22,6 +22,10 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 SOFTWARE.
 """
 
+# Python libraries
+import warnings
+from threading import RLock
+
 
 class SingletonMetaClass(type):
     """
@@ -37,6 +41,10 @@ class SingletonMetaClass(type):
     >>> class NewClass(metaclass=SingletonMetaClass):
     ...     pass
 
+    Creation is thread safe. Arguments given once the instance exists are
+    ignored (with a warning). Use `NewClass.create(...)` to build an instance
+    outside of the global registry (see `src.context.Context`).
+
     See Also
     --------
 
@@ -44,7 +52,21 @@ class SingletonMetaClass(type):
 
     """
     _instances = {}
+    _lock = RLock()
     def __call__(cls, *args, **kwargs):
-        if cls not in cls._instances:
-            cls._instances[cls] = super(SingletonMetaClass, cls).__call__(*args, **kwargs)
-        return cls._instances[cls]
\ No newline at end of file
+        instance = cls._instances.get(cls)
+        if instance is None:
+            # NOTE: reentrant because some singletons build others on construction.
+            with SingletonMetaClass._lock:
+                if cls not in cls._instances:
+                    cls._instances[cls] = super(SingletonMetaClass, cls).__call__(*args, **kwargs)
+                return cls._instances[cls]
+        if args or kwargs:
+            warnings.warn("SingletonMetaClass::__call__ : <%s> already exists, the given arguments are ignored."%cls.__name__, UserWarning)
+        return instance
+
+    def create(cls, *args, **kwargs):
+        """
+        Builds a new (non shared) instance, the global one is left untouched.
+        """
+        return super(SingletonMetaClass, cls).__call__(*args, **kwargs)
\ No newline at end of file
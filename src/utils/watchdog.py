@@ -0,0 +1,144 @@
+"""
+MIT License
+
+Copyright (c) 2021 Pedro Correia
+
+Permission is hereby granted, free of charge, to any person obtaining a copy
+of this software and associated documentation files (the "Software"), to deal
+in the Software without restriction, including without limitation the rights
+to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+copies of the Software, and to permit persons to whom the Software is
+furnished to do so, subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+SOFTWARE.
+"""
+
+
+# Python libraries
+import os
+import sys
+import time
+import threading
+import traceback
+
+# Qt libraries
+from PyQt5 import QtCore
+
+# Local libraries
+from .profiler import Counters
+
+
+class LagWatchdog:
+    """
+    Event loop watchdog: a `QTimer` in the GUI thread beats every `interval`
+    seconds and a thread checks the beats. When the loop hasn't beaten for
+    `threshold` seconds (a long dialog apply, a blocking call, ...) the stack
+    of the GUI thread is captured and appended, with the timing, to `path`
+    (again every `threshold` seconds while it stays frozen, so the log shows
+    where the time goes). The total length of the stall is logged when the
+    loop is back.
+
+    `start` and `stop` must be called from the GUI thread.
+    """
+    def __init__(self, path:str, interval:float=0.02, counters:Counters=None) -> None:
+        self._path: str = path
+        self._interval: float = interval
+        self._threshold: float = 0.0
+        self._timer: QtCore.QTimer = None
+        self._gui: int = None
+        self._beat: float = 0.0
+        self._lag: float = 0.0
+        # NOTE: beat the stall started at (None while the loop runs).
+        self._stall: float = None
+        self._event: threading.Event = threading.Event()
+        self._thread: threading.Thread = None
+        self._counters: Counters = counters if counters is not None else Counters()
+
+    def threshold(self) -> float:
+        return self._threshold
+
+    def lag(self) -> float:
+        """
+        Lateness (seconds) of the last heartbeat, the event loop latency.
+        """
+        return self._lag
+
+    def start(self, threshold:float) -> None:
+        """
+        (Re)starts the watchdog with a new threshold (seconds, 0 turns it off).
+        """
+        self.stop()
+        self._threshold = max(0.0, threshold)
+        if self._threshold == 0.0:
+            return
+        self._gui = threading.get_ident()
+        self._beat = time.perf_counter()
+        self._lag = 0.0
+        self._stall = None
+        self._timer = QtCore.QTimer()
+        self._timer.setTimerType(QtCore.Qt.PreciseTimer)
+        self._timer.timeout.connect(self._onBeat)
+        self._timer.start(max(1, int(self._interval*1000)))
+        self._event = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(self._event,), name="LagWatchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._event.set()
+            self._thread.join()
+            self._thread = None
+        if self._timer is not None:
+            self._timer.stop()
+            self._timer = None
+
+    def _onBeat(self) -> None:
+        now = time.perf_counter()
+        beat = self._beat
+        self._lag = max(0.0, now - beat - self._interval)
+        self._beat = now
+        # NOTE: only a stall of the previous beat is over (the thread may have flagged an older one late).
+        if self._stall is not None and self._stall == beat:
+            self._stall = None
+            self._log("event loop back after {:.0f} ms".format((now - beat)*1000.0), [])
+
+    def _run(self, event:threading.Event) -> None:
+        reported = 0
+        while not event.wait(self._interval):
+            beat = self._beat
+            late = time.perf_counter() - beat
+            if late < self._threshold:
+                reported = 0
+                continue
+            # NOTE: one stack per threshold frozen (the first one when it is crossed).
+            count = int(late/self._threshold)
+            if self._stall != beat:
+                self._stall = beat
+                reported = 0
+                self._counters.add(Counters.GuiStalls)
+            if count > reported:
+                reported = count
+                frame = sys._current_frames().get(self._gui)
+                stack = traceback.format_stack(frame) if frame is not None else []
+                self._log("event loop frozen for {:.0f} ms, GUI thread at:".format(late*1000.0), stack)
+
+    def _log(self, text:str, stack:list) -> None:
+        line = time.strftime("%Y-%m-%d %H:%M:%S") + " " + text
+        print("LagWatchdog :", text)
+        try:
+            folder = os.path.dirname(self._path)
+            if folder and not os.path.exists(folder):
+                os.makedirs(folder)
+            with open(self._path, "a") as fid:
+                fid.write(line + "\n" + "".join(stack))
+        except OSError as error:
+            print("LagWatchdog::_log :", self._path, error)
@@ -0,0 +1,20 @@
+# Python libraries
+import os
+
+# Local libraries
+from src.session.Journal import Journal
+
+
+def test_read_recovers_records_after_a_wrap(tmp_path):
+    path = os.path.join(str(tmp_path), "journal.bin")
+    journal = Journal(path, capacity=8)
+    for i in range(10):
+        journal.appendSample(i, float(i), float(i), float(i), 0.0, 0)
+    journal.checkpoint()
+    for i in range(10, 13):
+        journal.appendSample(i, float(i), float(i), float(i), 0.0, 0)
+
+    samples, commands, intact = Journal.read(path)
+    assert intact
+    assert commands == []
+    assert [sample[0] for sample in samples] == list(range(5, 13))